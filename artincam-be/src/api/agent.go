@@ -302,6 +302,16 @@ func (s *Server) agentWsMessage(w http.ResponseWriter, r *http.Request) {
 
 			err = conn.Conn.WriteJSON(initMessage)
 
+			if err != nil {
+				render.Status(r, http.StatusInternalServerError)
+				render.JSON(w, r, CreateErrorResponse("Failed to send message to agent."))
+				return
+			}
+		}
+	case "capture-trigger":
+		{
+			err := conn.Conn.WriteJSON(dto.AgentActionMessage{Type: "capture-trigger"})
+
 			if err != nil {
 				render.Status(r, http.StatusInternalServerError)
 				render.JSON(w, r, CreateErrorResponse("Failed to send message to agent."))
@@ -3,8 +3,11 @@ package api
 import (
 	"encoding/json"
 	"io"
+	"log"
 	"net/http"
 	"os"
+	"path/filepath"
+	"regexp"
 	"strconv"
 	"strings"
 
@@ -17,14 +20,21 @@ import (
 	"artincam-be/src/api/serializers"
 	"artincam-be/src/db/qx"
 	"artincam-be/src/db/repositories"
+	"artincam-be/src/tools"
 )
 
+// agent ids and asset unique ids end up in upload file paths, only allow plain identifiers
+var uploadSegment = regexp.MustCompile(`^[A-Za-z0-9-]+$`)
+
 func (s *Server) assetFileRouter() http.Handler {
 	r := chi.NewRouter()
 	r.Get("/", s.assetFileListHandler)
 	r.Get("/{id}/content", s.GetAgentContent)
 	r.Post("/", s.createAssetFileHandler)
+	r.Post("/bulk", s.bulkCreateAssetFileHandler)
 	r.Patch("/{id}", s.PatchAssetFileHandler)
+	r.Head("/uploads/{agentID}/{uniqueID}", s.uploadOffsetHandler)
+	r.Patch("/uploads/{agentID}/{uniqueID}", s.uploadChunkHandler)
 
 	return r
 }
@@ -118,6 +128,42 @@ func (s *Server) createAssetFileHandler(w http.ResponseWriter, r *http.Request)
 	render.JSON(w, r, CreateResponse(serializers.SerializeAssetFile(af)))
 }
 
+// Agent godoc
+// @Summary      Create assetFiles in bulk
+// @Description  Create many assetFiles in one request. Records that fail to be created (for example a duplicated
+// @Description  unique_id) are left out of the response, callers can match the created ones by unique_id.
+// @Tags         asset-file
+// @Accept       json
+// @Produce      json
+// @Param        assetFiles  body      []qx.CreateAssetFileParams  true  "AssetFilesCreate"
+// @Success      201 {array} dto.AssetFileResponse
+// @Router       /api/v1/asset-files/bulk [post]
+func (s *Server) bulkCreateAssetFileHandler(w http.ResponseWriter, r *http.Request) {
+	assetFiles := []qx.CreateAssetFileParams{}
+
+	repo := repositories.NewAssetFileRepository(r.Context(), s.DbConn)
+
+	if err := DecodeRequestBody(w, r, &assetFiles); err != nil {
+		return
+	}
+
+	created := make([]qx.AssetFile, 0, len(assetFiles))
+
+	for _, assetFile := range assetFiles {
+		af, err := repo.CreateAssetFile(assetFile)
+
+		if err != nil {
+			log.Printf("Failed to create assetFile (unique_id=%s): %v\n", assetFile.UniqueID, err)
+			continue
+		}
+
+		created = append(created, *af)
+	}
+
+	render.Status(r, http.StatusCreated)
+	render.JSON(w, r, CreateResponse(serializers.SerializeAssetFiles(created)))
+}
+
 // Agent godoc
 // @Summary      Update an assetFile
 // @Description  Update an assetFile
@@ -236,3 +282,136 @@ func (s *Server) GetAgentContent(w http.ResponseWriter, r *http.Request) {
 	w.Header().Set("Cache-Control", "no-store")
 	io.Copy(w, file)
 }
+
+// uploadPaths returns the upload directory of the agent, the path of the partial upload and the path of the
+// completed file (empty when the Upload-Name header is missing).
+func uploadPaths(r *http.Request) (string, string, string, bool) {
+	agentID := chi.URLParam(r, "agentID")
+	uniqueID := chi.URLParam(r, "uniqueID")
+
+	if !uploadSegment.MatchString(agentID) || !uploadSegment.MatchString(uniqueID) {
+		return "", "", "", false
+	}
+
+	dir := filepath.Join(tools.Getenv("UPLOAD_DIR", "uploads", false), agentID)
+	completePath := ""
+
+	if name := filepath.Base(r.Header.Get("Upload-Name")); name != "." && name != "/" && name != ".." {
+		completePath = filepath.Join(dir, name)
+	}
+
+	return dir, filepath.Join(dir, uniqueID+".part"), completePath, true
+}
+
+// Upload offset godoc
+// @Summary      Get the offset of an asset file upload
+// @Description  Returns in the Upload-Offset header how many bytes of the asset file content were received, the
+// @Description  agent resumes the upload from there. A completed upload (Upload-Name header) returns its full size.
+// @Tags         asset-file
+// @Param        agentID   path      string  true   "Agent ID"
+// @Param        uniqueID  path      string  true   "Asset file unique ID"
+// @Param        Upload-Name  header  string  false  "Asset file name"
+// @Success      200
+// @Router       /api/v1/asset-files/uploads/{agentID}/{uniqueID} [head]
+func (s *Server) uploadOffsetHandler(w http.ResponseWriter, r *http.Request) {
+	_, partPath, completePath, ok := uploadPaths(r)
+
+	if !ok {
+		http.Error(w, "Invalid upload path.", http.StatusBadRequest)
+		return
+	}
+
+	offset := int64(0)
+
+	if info, err := os.Stat(partPath); err == nil {
+		offset = info.Size()
+	} else if info, err := os.Stat(completePath); completePath != "" && err == nil {
+		offset = info.Size()
+	}
+
+	w.Header().Set("Upload-Offset", strconv.FormatInt(offset, 10))
+	w.Header().Set("Cache-Control", "no-store")
+	w.WriteHeader(http.StatusOK)
+}
+
+// Upload chunk godoc
+// @Summary      Upload a chunk of an asset file content
+// @Description  Appends the body at Upload-Offset. When the offset doesn't match what was received so far the
+// @Description  chunk is rejected with 409 and the current offset in the Upload-Offset header. Once Upload-Length
+// @Description  bytes are received the file is stored as Upload-Name.
+// @Tags         asset-file
+// @Accept       application/offset+octet-stream
+// @Param        agentID        path    string  true  "Agent ID"
+// @Param        uniqueID       path    string  true  "Asset file unique ID"
+// @Param        Upload-Offset  header  int64   true  "Offset of the chunk"
+// @Param        Upload-Length  header  int64   true  "Size of the whole file"
+// @Param        Upload-Name    header  string  true  "Asset file name"
+// @Success      204
+// @Router       /api/v1/asset-files/uploads/{agentID}/{uniqueID} [patch]
+func (s *Server) uploadChunkHandler(w http.ResponseWriter, r *http.Request) {
+	dir, partPath, completePath, ok := uploadPaths(r)
+	offset, errOffset := strconv.ParseInt(r.Header.Get("Upload-Offset"), 10, 64)
+	length, errLength := strconv.ParseInt(r.Header.Get("Upload-Length"), 10, 64)
+
+	if !ok || completePath == "" || errOffset != nil || errLength != nil || offset < 0 || offset > length {
+		http.Error(w, "Invalid upload request.", http.StatusBadRequest)
+		return
+	}
+
+	if err := os.MkdirAll(dir, 0o755); err != nil {
+		http.Error(w, "Failed to store upload.", http.StatusInternalServerError)
+		return
+	}
+
+	file, err := os.OpenFile(partPath, os.O_CREATE|os.O_WRONLY, 0o644)
+
+	if err != nil {
+		http.Error(w, "Failed to store upload.", http.StatusInternalServerError)
+		return
+	}
+
+	defer file.Close()
+
+	info, err := file.Stat()
+
+	if err != nil {
+		http.Error(w, "Failed to store upload.", http.StatusInternalServerError)
+		return
+	}
+
+	if info.Size() != offset {
+		w.Header().Set("Upload-Offset", strconv.FormatInt(info.Size(), 10))
+		http.Error(w, "Upload offset mismatch.", http.StatusConflict)
+		return
+	}
+
+	if _, err := file.Seek(offset, io.SeekStart); err != nil {
+		http.Error(w, "Failed to store upload.", http.StatusInternalServerError)
+		return
+	}
+
+	// whatever was received is kept on errors, the agent resumes from the offset it gets back
+	written, err := io.Copy(file, io.LimitReader(r.Body, length-offset))
+	offset += written
+	w.Header().Set("Upload-Offset", strconv.FormatInt(offset, 10))
+
+	if err != nil {
+		http.Error(w, "Upload interrupted.", http.StatusInternalServerError)
+		return
+	}
+
+	if offset == length {
+		if err := file.Close(); err != nil {
+			http.Error(w, "Failed to store upload.", http.StatusInternalServerError)
+			return
+		}
+
+		if err := os.Rename(partPath, completePath); err != nil {
+			log.Printf("Failed to complete upload (%s): %v\n", completePath, err)
+			http.Error(w, "Failed to store upload.", http.StatusInternalServerError)
+			return
+		}
+	}
+
+	w.WriteHeader(http.StatusNoContent)
+}
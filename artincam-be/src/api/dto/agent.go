@@ -54,6 +54,7 @@ type Camera struct {
 	Transforms           Transforms  `json:"transforms"`
 	Framerate            int         `json:"framerate,omitempty"`
 	Bitrate              *int        `json:"bitrate,omitempty"`
+	MustLastUntil        string      `json:"must_last_until,omitempty"`
 	RecordingTime        int         `json:"recording_time,omitempty"`
 	RecordingTimeUnit    string      `json:"recording_time_unit,omitempty"`
 	CycleRestTime        int         `json:"cycle_rest_time,omitempty"`
@@ -65,6 +66,17 @@ type Camera struct {
 	ImageCaptureTimeUnit string      `json:"image_capture_time_unit,omitempty"`
 	ImageRestTime        float64     `json:"image_rest_time,omitempty"`
 	ImageRestTimeUnit    string      `json:"image_rest_time_unit,omitempty"`
+	MotionSensitivity    int         `json:"motion_sensitivity,omitempty"`
+	MotionCapture        string      `json:"motion_capture,omitempty"`
+	MotionCooldown       *int        `json:"motion_cooldown,omitempty"`
+	MotionCooldownUnit   string      `json:"motion_cooldown_unit,omitempty"`
+	PreTriggerTime       *int        `json:"pre_trigger_time,omitempty"`
+	PreTriggerTimeUnit   string      `json:"pre_trigger_time_unit,omitempty"`
+	PreTriggerBufferSize int         `json:"pre_trigger_buffer_size,omitempty"`
+	ImageStorage         string      `json:"image_storage,omitempty"`
+	SegmentTime          int         `json:"segment_time,omitempty"`
+	SegmentTimeUnit      string      `json:"segment_time_unit,omitempty"`
+	Previews             bool        `json:"previews,omitempty"`
 }
 
 type Resolution struct {
@@ -3,6 +3,7 @@ package serializers
 import (
 	"artincam-be/src/api/dto"
 	"artincam-be/src/db/qx"
+	"encoding/json"
 	"time"
 )
 
@@ -20,17 +21,25 @@ func SerializeAssetFile(at *qx.AssetFile) *dto.AssetFileResponse {
 		updatedAt = &at.UpdatedAt.Time
 	}
 
+	// stored as the JSON document the agent sent, returned as an object
+	var frameTiming json.RawMessage
+	if at.FrameTiming != "" && json.Valid([]byte(at.FrameTiming)) {
+		frameTiming = json.RawMessage(at.FrameTiming)
+	}
+
 	return &dto.AssetFileResponse{
-		ID:        at.ID,
-		AgentID:   at.AgentID,
-		CameraID:  at.CameraID,
-		Location:  at.Location,
-		Timestamp: at.Timestamp,
-		UniqueID:  at.UniqueID,
-		FileName:  at.FileName,
-		FileSize:  at.FileSize,
-		CreatedAt: createdAt,
-		UpdatedAt: updatedAt,
+		ID:              at.ID,
+		AgentID:         at.AgentID,
+		CameraID:        at.CameraID,
+		Location:        at.Location,
+		Timestamp:       at.Timestamp,
+		UniqueID:        at.UniqueID,
+		FileName:        at.FileName,
+		FileSize:        at.FileSize,
+		PreviewFileName: at.PreviewFileName,
+		FrameTiming:     frameTiming,
+		CreatedAt:       createdAt,
+		UpdatedAt:       updatedAt,
 	}
 }
 
@@ -0,0 +1,10 @@
+-- +goose Up
+-- +goose StatementBegin
+-- thumbnail (images) or low resolution proxy clip (videos) generated by the agent next to the asset file
+ALTER TABLE asset_file ADD COLUMN preview_file_name TEXT NOT NULL DEFAULT '' CHECK (LENGTH(preview_file_name) < 256);
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+ALTER TABLE asset_file DROP COLUMN preview_file_name;
+-- +goose StatementEnd
@@ -0,0 +1,10 @@
+-- +goose Up
+-- +goose StatementBegin
+-- frame rate, dropped frames and callback times measured by the agent while recording a video (JSON document)
+ALTER TABLE asset_file ADD COLUMN frame_timing TEXT NOT NULL DEFAULT '';
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+ALTER TABLE asset_file DROP COLUMN frame_timing;
+-- +goose StatementEnd
@@ -123,8 +123,15 @@ WHERE
 SELECT * FROM asset_file WHERE id = ? LIMIT 1;
 
 -- name: CreateAssetFile :one
-INSERT INTO asset_file (agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+-- unique_id is the agent's idempotency key: re-sending an asset file (e.g. a retry after a lost response) returns
+-- the existing row instead of failing or creating a duplicate
+INSERT INTO asset_file (agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, preview_file_name, frame_timing, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+ON CONFLICT (unique_id) DO UPDATE SET
+  file_size         = excluded.file_size,
+  preview_file_name = CASE WHEN excluded.preview_file_name != '' THEN excluded.preview_file_name ELSE preview_file_name END,
+  frame_timing      = CASE WHEN excluded.frame_timing != '' THEN excluded.frame_timing ELSE frame_timing END,
+  updated_at        = CURRENT_TIMESTAMP
 RETURNING *;
 
 -- name: PatchAssetFile :one
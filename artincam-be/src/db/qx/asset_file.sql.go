@@ -40,22 +40,31 @@ func (q *Queries) CountAssetFiles(ctx context.Context, arg CountAssetFilesParams
 }
 
 const CreateAssetFile = `-- name: CreateAssetFile :one
-INSERT INTO asset_file (agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-RETURNING id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+INSERT INTO asset_file (agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, preview_file_name, frame_timing, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+ON CONFLICT (unique_id) DO UPDATE SET
+  file_size         = excluded.file_size,
+  preview_file_name = CASE WHEN excluded.preview_file_name != '' THEN excluded.preview_file_name ELSE preview_file_name END,
+  frame_timing      = CASE WHEN excluded.frame_timing != '' THEN excluded.frame_timing ELSE frame_timing END,
+  updated_at        = CURRENT_TIMESTAMP
+RETURNING id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 `
 
 type CreateAssetFileParams struct {
-	AgentID   string    `json:"agent_id"`
-	CameraID  string    `json:"camera_id"`
-	Location  string    `json:"location"`
-	Timestamp time.Time `json:"timestamp"`
-	UniqueID  string    `json:"unique_id"`
-	FileName  string    `json:"file_name"`
-	FileSize  int64     `json:"file_size"`
-	FileType  string    `json:"file_type"`
+	AgentID         string    `json:"agent_id"`
+	CameraID        string    `json:"camera_id"`
+	Location        string    `json:"location"`
+	Timestamp       time.Time `json:"timestamp"`
+	UniqueID        string    `json:"unique_id"`
+	FileName        string    `json:"file_name"`
+	FileSize        int64     `json:"file_size"`
+	FileType        string    `json:"file_type"`
+	PreviewFileName string    `json:"preview_file_name"`
+	FrameTiming     string    `json:"frame_timing"`
 }
 
+// unique_id is the agent's idempotency key: re-sending an asset file (e.g. a retry after a lost response) returns
+// the existing row instead of failing or creating a duplicate
 func (q *Queries) CreateAssetFile(ctx context.Context, arg CreateAssetFileParams) (AssetFile, error) {
 	row := q.db.QueryRowContext(ctx, CreateAssetFile,
 		arg.AgentID,
@@ -66,6 +75,8 @@ func (q *Queries) CreateAssetFile(ctx context.Context, arg CreateAssetFileParams
 		arg.FileName,
 		arg.FileSize,
 		arg.FileType,
+		arg.PreviewFileName,
+		arg.FrameTiming,
 	)
 	var i AssetFile
 	err := row.Scan(
@@ -80,6 +91,8 @@ func (q *Queries) CreateAssetFile(ctx context.Context, arg CreateAssetFileParams
 		&i.FileType,
 		&i.CreatedAt,
 		&i.UpdatedAt,
+		&i.PreviewFileName,
+		&i.FrameTiming,
 	)
 	return i, err
 }
@@ -94,7 +107,7 @@ func (q *Queries) DeleteAssetFile(ctx context.Context, id int64) error {
 }
 
 const GetAllAssetFiles = `-- name: GetAllAssetFiles :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -153,6 +166,8 @@ func (q *Queries) GetAllAssetFiles(ctx context.Context, arg GetAllAssetFilesPara
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -168,7 +183,7 @@ func (q *Queries) GetAllAssetFiles(ctx context.Context, arg GetAllAssetFilesPara
 }
 
 const GetAllAssetFilesFileNameAsc = `-- name: GetAllAssetFilesFileNameAsc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -227,6 +242,8 @@ func (q *Queries) GetAllAssetFilesFileNameAsc(ctx context.Context, arg GetAllAss
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -242,7 +259,7 @@ func (q *Queries) GetAllAssetFilesFileNameAsc(ctx context.Context, arg GetAllAss
 }
 
 const GetAllAssetFilesFileNameDesc = `-- name: GetAllAssetFilesFileNameDesc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -301,6 +318,8 @@ func (q *Queries) GetAllAssetFilesFileNameDesc(ctx context.Context, arg GetAllAs
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -316,7 +335,7 @@ func (q *Queries) GetAllAssetFilesFileNameDesc(ctx context.Context, arg GetAllAs
 }
 
 const GetAllAssetFilesFileSizeAsc = `-- name: GetAllAssetFilesFileSizeAsc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -375,6 +394,8 @@ func (q *Queries) GetAllAssetFilesFileSizeAsc(ctx context.Context, arg GetAllAss
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -390,7 +411,7 @@ func (q *Queries) GetAllAssetFilesFileSizeAsc(ctx context.Context, arg GetAllAss
 }
 
 const GetAllAssetFilesFileSizeDesc = `-- name: GetAllAssetFilesFileSizeDesc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -449,6 +470,8 @@ func (q *Queries) GetAllAssetFilesFileSizeDesc(ctx context.Context, arg GetAllAs
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -464,7 +487,7 @@ func (q *Queries) GetAllAssetFilesFileSizeDesc(ctx context.Context, arg GetAllAs
 }
 
 const GetAllAssetFilesTimestampDesc = `-- name: GetAllAssetFilesTimestampDesc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -523,6 +546,8 @@ func (q *Queries) GetAllAssetFilesTimestampDesc(ctx context.Context, arg GetAllA
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -538,7 +563,7 @@ func (q *Queries) GetAllAssetFilesTimestampDesc(ctx context.Context, arg GetAllA
 }
 
 const GetAllAssetFilesUniqueIdAsc = `-- name: GetAllAssetFilesUniqueIdAsc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -597,6 +622,8 @@ func (q *Queries) GetAllAssetFilesUniqueIdAsc(ctx context.Context, arg GetAllAss
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -612,7 +639,7 @@ func (q *Queries) GetAllAssetFilesUniqueIdAsc(ctx context.Context, arg GetAllAss
 }
 
 const GetAllAssetFilesUniqueIdDesc = `-- name: GetAllAssetFilesUniqueIdDesc :many
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 FROM asset_file
 WHERE
     ( ? IS NULL OR agent_id = ? )
@@ -671,6 +698,8 @@ func (q *Queries) GetAllAssetFilesUniqueIdDesc(ctx context.Context, arg GetAllAs
 			&i.FileType,
 			&i.CreatedAt,
 			&i.UpdatedAt,
+			&i.PreviewFileName,
+			&i.FrameTiming,
 		); err != nil {
 			return nil, err
 		}
@@ -686,7 +715,7 @@ func (q *Queries) GetAllAssetFilesUniqueIdDesc(ctx context.Context, arg GetAllAs
 }
 
 const GetAssetFileByID = `-- name: GetAssetFileByID :one
-SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at FROM asset_file WHERE id = ? LIMIT 1
+SELECT id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing FROM asset_file WHERE id = ? LIMIT 1
 `
 
 func (q *Queries) GetAssetFileByID(ctx context.Context, id int64) (AssetFile, error) {
@@ -704,6 +733,8 @@ func (q *Queries) GetAssetFileByID(ctx context.Context, id int64) (AssetFile, er
 		&i.FileType,
 		&i.CreatedAt,
 		&i.UpdatedAt,
+		&i.PreviewFileName,
+		&i.FrameTiming,
 	)
 	return i, err
 }
@@ -719,7 +750,7 @@ SET
   file_size   = COALESCE(?6, file_size),
   updated_at  = CURRENT_TIMESTAMP
 WHERE id = ?7
-RETURNING id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at
+RETURNING id, agent_id, camera_id, location, timestamp, unique_id, file_name, file_size, file_type, created_at, updated_at, preview_file_name, frame_timing
 `
 
 type PatchAssetFileParams struct {
@@ -755,6 +786,8 @@ func (q *Queries) PatchAssetFile(ctx context.Context, arg PatchAssetFileParams)
 		&i.FileType,
 		&i.CreatedAt,
 		&i.UpdatedAt,
+		&i.PreviewFileName,
+		&i.FrameTiming,
 	)
 	return i, err
 }
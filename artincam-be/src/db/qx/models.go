@@ -37,17 +37,19 @@ type AgentType struct {
 }
 
 type AssetFile struct {
-	ID        int64        `json:"id"`
-	AgentID   string       `json:"agent_id"`
-	CameraID  string       `json:"camera_id"`
-	Location  string       `json:"location"`
-	Timestamp time.Time    `json:"timestamp"`
-	UniqueID  string       `json:"unique_id"`
-	FileName  string       `json:"file_name"`
-	FileSize  int64        `json:"file_size"`
-	FileType  string       `json:"file_type"`
-	CreatedAt sql.NullTime `json:"created_at"`
-	UpdatedAt sql.NullTime `json:"updated_at"`
+	ID              int64        `json:"id"`
+	AgentID         string       `json:"agent_id"`
+	CameraID        string       `json:"camera_id"`
+	Location        string       `json:"location"`
+	Timestamp       time.Time    `json:"timestamp"`
+	UniqueID        string       `json:"unique_id"`
+	FileName        string       `json:"file_name"`
+	FileSize        int64        `json:"file_size"`
+	FileType        string       `json:"file_type"`
+	CreatedAt       sql.NullTime `json:"created_at"`
+	UpdatedAt       sql.NullTime `json:"updated_at"`
+	PreviewFileName string       `json:"preview_file_name"`
+	FrameTiming     string       `json:"frame_timing"`
 }
 
 type GooseDbVersion struct {
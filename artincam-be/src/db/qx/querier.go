@@ -14,6 +14,8 @@ type Querier interface {
 	CreateActionLog(ctx context.Context, arg CreateActionLogParams) (ActionLog, error)
 	CreateAgent(ctx context.Context, arg CreateAgentParams) (Agent, error)
 	CreateAgentType(ctx context.Context, arg CreateAgentTypeParams) (AgentType, error)
+	// unique_id is the agent's idempotency key: re-sending an asset file (e.g. a retry after a lost response) returns
+	// the existing row instead of failing or creating a duplicate
 	CreateAssetFile(ctx context.Context, arg CreateAssetFileParams) (AssetFile, error)
 	DeleteActionLog(ctx context.Context, id int64) error
 	DeleteAgent(ctx context.Context, id string) error
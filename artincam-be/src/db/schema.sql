@@ -37,7 +37,7 @@ CREATE TABLE asset_file (
   created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (agent_id) REFERENCES agent(id) ON DELETE CASCADE
-);
+, preview_file_name TEXT NOT NULL DEFAULT '' CHECK (LENGTH(preview_file_name) < 256), frame_timing TEXT NOT NULL DEFAULT '');
 CREATE TABLE action_log (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   agent_id TEXT NOT NULL
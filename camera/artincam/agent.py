@@ -2,8 +2,7 @@ import asyncio
 import json
 import threading
 from queue import Queue
-
-import websockets
+from typing import Callable
 
 from .camera import Camera
 from .constants import BACKEND_HOST, USE_HTTPS, AgentMessage
@@ -11,21 +10,27 @@ from .schemas import CameraMessage, ConfigUpdate
 
 
 class ArtincamAgent:
+    WS_URL = f"ws{'s' if USE_HTTPS else ''}://{BACKEND_HOST}/ws/v1/agent"
+    # seconds between a lost connection and the next attempt
+    RECONNECT_DELAY = 5.0
+
     _actions: Queue
     _stop: threading.Event
     _agent_id: str
     _camera_thread: threading.Thread
 
-    def __init__(self, agent_id: str):
+    def __init__(self, agent_id: str, camera_factory: Callable[..., Camera] = Camera):
         self._actions = Queue()
         self._camera_messages = Queue()
         self._stop = threading.Event()
         self._agent_id = agent_id
 
-        self.camera = Camera(agent_messages=self._camera_messages, stop_event=self._stop)
+        self.camera = camera_factory(agent_messages=self._camera_messages, stop_event=self._stop, agent_id=agent_id)
         self._camera_thread = threading.Thread(target=self.camera.run, daemon=True)
         self._ws_task = None
         self._ws = None
+        # set while the websocket is connected
+        self.connected = asyncio.Event()
 
     def start(self):
         self._ws_task = asyncio.create_task(self._initialize_ws_connection())
@@ -36,7 +41,8 @@ class ArtincamAgent:
         self._stop.set()
 
         # close the websocket connection
-        await self._ws.close()
+        if self._ws is not None:
+            await self._ws.close()
 
         # stop the ws loop
         self._ws_task.cancel()
@@ -45,18 +51,20 @@ class ArtincamAgent:
         self._actions.put_nowait("exit")
         self._camera_messages.put_nowait((AgentMessage.EXIT, None))
 
-        # wait for the camera thread to safely exit
-        self._camera_thread.join()
+        # wait for the camera thread to safely exit, without blocking the event loop meanwhile
+        await asyncio.to_thread(self._camera_thread.join)
 
     async def _initialize_ws_connection(self):
         """Continuously maintain a WebSocket connection with auto-reconnect."""
+        # imported here, in the event loop, while the camera thread is already starting up
+        import websockets
+
         while True:
             try:
                 print("[WS] connecting to backend...")
-                async with websockets.connect(
-                    f"ws{'s' if USE_HTTPS else ''}://{BACKEND_HOST}/ws/v1/agent/{self._agent_id}"
-                ) as ws:
+                async with websockets.connect(f"{self.WS_URL}/{self._agent_id}") as ws:
                     self._ws = ws
+                    self.connected.set()
                     print("[WS] connected.")
 
                     # Listen until closed
@@ -64,15 +72,16 @@ class ArtincamAgent:
                         self._parse_message(msg)
 
             except (websockets.ConnectionClosedError, websockets.ConnectionClosedOK, ConnectionRefusedError) as e:
-                print(f"[WS] connection lost: {e}. Reconnecting in 5s...")
+                print(f"[WS] connection lost: {e}. Reconnecting in {self.RECONNECT_DELAY:g}s...")
 
             except Exception as e:
-                print(f"[WS] unexpected error: {e}. Reconnecting in 5s...")
+                print(f"[WS] unexpected error: {e}. Reconnecting in {self.RECONNECT_DELAY:g}s...")
 
             finally:
                 # Always clear reference and pause before retry
                 self._ws = None
-                await asyncio.sleep(5)
+                self.connected.clear()
+                await asyncio.sleep(self.RECONNECT_DELAY)
                 print("[WS] retrying connection...")
 
     def _parse_message(self, msg: str):
@@ -84,6 +93,8 @@ class ArtincamAgent:
                     self._handle_camera_command(parsed_msg)
                 case "config-update":
                     self._handle_config_update(parsed_msg)
+                case "capture-trigger":
+                    self._camera_messages.put((AgentMessage.TRIGGER, None))
                 case _:
                     print("unknown message type:", parsed_msg.get("type", ""))
 
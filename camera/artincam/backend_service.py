@@ -1,47 +1,270 @@
+import json
 import logging
+import re
+import threading
 import time
-
-import requests
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 
 from .constants import BACKEND_HOST, USE_HTTPS
+from .metrics import registry
 from .schemas import ActionLog, AssetFile
 
+if TYPE_CHECKING:
+    import requests
+
 logger = logging.getLogger(__name__)
 
+# ids in urls (numeric ids, agent uuids, asset unique ids) are replaced so stats are grouped per endpoint and not
+# per record
+ID_SEGMENT = re.compile(r"/(?:\d[\d-]*|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?=/|$)")
+
+REQUEST_SECONDS = registry.histogram(
+    "artincam_backend_request_seconds",
+    "Latency of backend requests, fast failures (circuit open) excluded.",
+    ("endpoint",),
+)
+REQUESTS = registry.counter(
+    "artincam_backend_requests_total", "Backend requests by result (ok, failed, fast_failed).", ("endpoint", "result")
+)
+RETRIES = registry.counter("artincam_backend_retries_total", "Backend requests retried after a failure.", ("endpoint",))
+
+
+class CircuitBreaker:
+    """Stops calling a backend that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and every call fails fast for `reset_timeout`
+    seconds. After that one call is let through (half open), if it succeeds the circuit closes again, otherwise it
+    stays open for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    @property
+    def failures(self) -> int:
+        """Consecutive connection errors/5xx responses, 0 once the backend answers again (even with a 4xx)."""
+        with self._lock:
+            return self._failures
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # let a single probe through, other callers keep failing fast until it comes back
+                self._state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.error("[BackendService] Backend unreachable, failing fast for %ss", self.reset_timeout)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
 
 class BackendService:
     BASE_URL = f"http{'s' if USE_HTTPS else ''}://{BACKEND_HOST}"
 
-    def __init__(self, timeout: int = 10, max_retries: int = 3, backoff: float = 0.5):
+    def __init__(
+        self,
+        timeout: int = 10,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 4,
+        circuit_breaker: CircuitBreaker | None = None,
+    ):
         self.timeout = timeout
         self.max_retries = max_retries
         self.backoff = backoff
+        # flipped off the first time the backend answers the bulk endpoint with 404/405 (older backends)
+        self.bulk_asset_files_supported = True
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        self._pool_size = pool_size
+        self._session: "requests.Session | None" = None
+        self._session_lock = threading.Lock()
+
+        self._stats: dict[str, dict] = {}
+        self._stats_lock = threading.Lock()
+
+    def _get_session(self) -> "requests.Session":
+        """One persistent session so connections (and TLS) are reused between calls.
 
-    def _request_with_retries(self, method: str, url: str, **kwargs) -> requests.Response:
+        Created on the first request: importing requests takes a while on a Pi Zero and the camera doesn't need the
+        backend to start capturing.
+        """
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+
+            return self._session
+
+    def _request(self, method: str, url: str, **kwargs) -> "requests.Response | None":
+        """Single request through the pooled session and the circuit breaker. Returns None on failure."""
+        if not self.circuit_breaker.allow_request():
+            self._record(method, url, failed=True, fast_failed=True)
+            return None
+
+        import requests
+
+        session = self._get_session()
+        start = time.monotonic()
+        try:
+            resp = session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as exc:
+            logger.debug("[BackendService] Request failed for %s %s: %s", method, url, exc)
+            self.circuit_breaker.record_failure()
+            self._record(method, url, latency=time.monotonic() - start, failed=True)
+            return None
+
+        # 4xx means the backend is up and answering, only server errors count towards opening the circuit
+        if resp.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+        self._record(method, url, latency=time.monotonic() - start, failed=not resp.ok)
+        return resp
+
+    def _request_with_retries(self, method: str, url: str, **kwargs) -> "requests.Response | None":
         for attempt in range(1, self.max_retries + 1):
-            try:
-                resp = requests.request(method, url, timeout=self.timeout, **kwargs)
-                resp.raise_for_status()
+            if attempt > 1:
+                self._record(method, url, retried=True)
+
+            resp = self._request(method, url, **kwargs)
+
+            if resp is not None and resp.ok:
                 return resp
-            except requests.RequestException as exc:
-                logger.debug("[BackendService] Request attempt %d failed for %s %s: %s", attempt, method, url, exc)
-                if attempt < self.max_retries:
-                    time.sleep(self.backoff * attempt)
 
-        logger.exception("[BackendService] All request attempts failed for %s %s", method, url)
+            logger.debug(
+                "[BackendService] Request attempt %d failed for %s %s: %s",
+                attempt,
+                method,
+                url,
+                "no response" if resp is None else resp.status_code,
+            )
+
+            if self.circuit_breaker.state == CircuitBreaker.OPEN:
+                break
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * attempt)
+
+        logger.error("[BackendService] All request attempts failed for %s %s", method, url)
         return None
 
+    def _record(
+        self,
+        method: str,
+        url: str,
+        latency: float | None = None,
+        failed: bool = False,
+        retried: bool = False,
+        fast_failed: bool = False,
+    ):
+        endpoint = f"{method} {ID_SEGMENT.sub('/{id}', urlsplit(url).path)}"
+
+        if retried:
+            RETRIES.labels(endpoint).inc()
+        else:
+            REQUESTS.labels(endpoint, "fast_failed" if fast_failed else "failed" if failed else "ok").inc()
+
+        if latency is not None:
+            REQUEST_SECONDS.labels(endpoint).observe(latency)
+
+        with self._stats_lock:
+            stats = self._stats.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "failures": 0,
+                    "retries": 0,
+                    "fast_failures": 0,
+                    "latency_total": 0.0,
+                    "latency_max": 0.0,
+                },
+            )
+
+            if retried:
+                stats["retries"] += 1
+                return
+
+            stats["requests"] += 1
+            stats["failures"] += failed
+            stats["fast_failures"] += fast_failed
+
+            if latency is not None:
+                stats["latency_total"] += latency
+                stats["latency_max"] = max(stats["latency_max"], latency)
+
+    def stats(self) -> dict:
+        """Per-endpoint request, failure and retry counts with latency in ms, plus the circuit state."""
+        with self._stats_lock:
+            endpoints = {}
+
+            for endpoint, stats in self._stats.items():
+                timed = stats["requests"] - stats["fast_failures"]
+                endpoints[endpoint] = {
+                    "requests": stats["requests"],
+                    "failures": stats["failures"],
+                    "retries": stats["retries"],
+                    "fast_failures": stats["fast_failures"],
+                    "latency_mean_ms": round(stats["latency_total"] / timed * 1000, 2) if timed else 0.0,
+                    "latency_max_ms": round(stats["latency_max"] * 1000, 2),
+                }
+
+        return {"circuit": self.circuit_breaker.state, "endpoints": endpoints}
+
     # ---- Action log calls ----
     def create_action_log(self, payload: ActionLog):
         url = f"{self.BASE_URL}/api/v1/action-logs"
         logger.debug("[BackendService] Creating action log: %s", payload)
         resp = self._request_with_retries("POST", url, json=payload.model_dump())
+
+        if resp is None:
+            return None
+
         logger.info("[BackendService] Action log created status=%s", resp.status_code)
         return resp
 
     # ---- Asset file calls ----
-    def create_asset_file(self, asset_file: AssetFile):
-        payload = {
+    def _asset_file_payload(self, asset_file: AssetFile) -> dict:
+        return {
             "agent_id": asset_file.agent_id,
             "camera_id": asset_file.camera_id,
             "location": asset_file.location,
@@ -49,8 +272,45 @@ class BackendService:
             "unique_id": asset_file.unique_id,
             "file_name": asset_file.file_name,
             "file_size": asset_file.file_size,
+            "file_type": asset_file.file_type.value,
+            "preview_file_name": asset_file.preview_file_name or "",
+            # stored as a JSON document (text) by the backend
+            "frame_timing": json.dumps(asset_file.frame_timing) if asset_file.frame_timing else "",
         }
 
+    def create_asset_files(self, asset_files: list[AssetFile]) -> dict[str, int] | None:
+        """Registers many asset files in one call. Returns unique_id -> id of the created records, or None when the
+        bulk call failed or isn't supported (callers fall back to create_asset_file). Not retried, the fallback
+        calls are.
+        """
+        if not self.bulk_asset_files_supported:
+            return None
+
+        payload = [self._asset_file_payload(asset_file) for asset_file in asset_files]
+        url = f"{self.BASE_URL}/api/v1/asset-files/bulk"
+        logger.debug("[BackendService] Sending %d asset files to %s", len(payload), url)
+
+        resp = self._request("POST", url, json=payload)
+
+        if resp is None:
+            return None
+
+        if resp.status_code in (404, 405):
+            logger.info("[BackendService] Backend does not support bulk asset files, using single calls")
+            self.bulk_asset_files_supported = False
+            return None
+
+        if not resp.ok:
+            logger.debug("[BackendService] Bulk asset file request failed status=%s", resp.status_code)
+            return None
+
+        created = {row["unique_id"]: row["id"] for row in resp.json()["data"]}
+        logger.info("[BackendService] Asset files created (%d/%d)", len(created), len(payload))
+        return created
+
+    def create_asset_file(self, asset_file: AssetFile):
+        payload = self._asset_file_payload(asset_file)
+
         url = f"{self.BASE_URL}/api/v1/asset-files"
         logger.debug("[BackendService] Sending image-file create payload to %s: %s", url, payload)
         resp = self._request_with_retries("POST", url, json=payload)
@@ -74,5 +334,47 @@ class BackendService:
         logger.debug("[BackendService] Updating image-file %s with payload %s", asset_file.id, payload)
 
         resp = self._request_with_retries("PATCH", url, json=payload)
+
+        if resp is None:
+            return None
+
         logger.info("[BackendService] Image file updated (id=%s) status=%s", asset_file.id, resp.status_code)
         return resp
+
+    # ---- Asset file content uploads ----
+    def _upload_url(self, agent_id: str, unique_id: str) -> str:
+        return f"{self.BASE_URL}/api/v1/asset-files/uploads/{agent_id}/{unique_id}"
+
+    def get_upload_offset(self, agent_id: str, unique_id: str, file_name: str) -> int | None:
+        """How many bytes of the file the backend already has, None if it couldn't be asked."""
+        resp = self._request("HEAD", self._upload_url(agent_id, unique_id), headers={"Upload-Name": file_name})
+
+        if resp is None or not resp.ok:
+            return None
+
+        return int(resp.headers.get("Upload-Offset", 0))
+
+    def upload_chunk(
+        self, agent_id: str, unique_id: str, file_name: str, offset: int, length: int, data: bytes
+    ) -> int | None:
+        """Sends `data` at `offset` of a `length` bytes file. Returns the offset the backend is at afterwards, which
+        isn't offset + len(data) when the backend had a different offset (e.g. a response was lost). None on
+        failure. Not retried, the uploader resumes from the backend offset instead.
+        """
+        headers = {
+            "Content-Type": "application/offset+octet-stream",
+            "Upload-Offset": str(offset),
+            "Upload-Length": str(length),
+            "Upload-Name": file_name,
+        }
+        resp = self._request("PATCH", self._upload_url(agent_id, unique_id), data=data, headers=headers)
+
+        if resp is None:
+            return None
+
+        # 409: the backend is at another offset, carry on from there
+        if not (resp.ok or resp.status_code == 409) or "Upload-Offset" not in resp.headers:
+            logger.debug("[BackendService] Upload chunk failed (unique_id=%s) status=%s", unique_id, resp.status_code)
+            return None
+
+        return int(resp.headers["Upload-Offset"])
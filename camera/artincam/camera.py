@@ -1,25 +1,44 @@
 import logging
 import os
 import pathlib
-import shutil
 import threading
 import time
 from datetime import datetime, timezone
 from enum import StrEnum
 from queue import Queue
 
-import cv2
-import psutil
-
+from . import startup_trace
 from .backend_service import BackendService
-from .constants import ARTINCAM_AGENT_ID, AgentMessage
+from .catalog import AssetCatalog
+from .circular_output import ONE_MB, PreTriggerOutput
+from .config_store import ConfigStore
+from .constants import (
+    ARTINCAM_AGENT_ID,
+    ASSET_BATCH_LATENCY,
+    ASSET_BATCH_SIZE,
+    BACKEND_WORKERS,
+    METRICS_HOST,
+    METRICS_PORT,
+    RETENTION_EVICT_UNSAVED,
+    RETENTION_HIGH_WATERMARK,
+    RETENTION_LOW_WATERMARK,
+    RETENTION_POLICY,
+    UPLOAD_BANDWIDTH_KBPS,
+    UPLOAD_CHUNK_SIZE_KB,
+    UPLOAD_ENABLED,
+    UPLOAD_WORKERS,
+    AgentMessage,
+)
+from .image_writer import ImageWriter, Thumbnail
 from .schemas import (
     ActionLog,
     ArtincamPiAgentConfig,
     ArtincamPiCamera,
     AssetFile,
     AssetFileTypeEnum,
+    ImageStorageEnum,
     ModeEnum,
+    MotionCaptureEnum,
     StatusEnum,
 )
 
@@ -28,19 +47,41 @@ from .schemas import (
 # to help us test. But camera controls will only occur in the actual raspberry pi
 try:
     from libcamera import Transform
-    from picamera2 import MappedArray, Picamera2
+    from picamera2 import Picamera2
     from picamera2.encoders import H264Encoder
     from picamera2.outputs import FfmpegOutput, PyavOutput
 except ModuleNotFoundError:
     from .mocks.libcamera import Transform
-    from .mocks.picamera2 import Picamera2, MappedArray, H264Encoder, FfmpegOutput, PyavOutput
+    from .mocks.picamera2 import FfmpegOutput, H264Encoder, Picamera2, PyavOutput
 
+from .frame_timing import FrameStats, FrameTimingAnalyzer
 from .logger import logger
+from .metrics import CAPTURE_BUCKETS, MetricsServer, registry
+from .motion import MotionDetector, lores_size, luma
+from .outbox import Outbox, OutboxSender
+from .overlay import TimestampOverlay
+from .previews import PROXY_BITRATE, PreviewBudget, proxy_path, thumbnail_path
+from .quality import QualityController
+from .reconfigure import ReconfigureLevel, diff_camera_config, required_level
+from .retention import RetentionDaemon, policy_from_name
+from .scheduler import DeadlineScheduler
+from .segmented_output import SegmentedOutput, VideoSegment
+from .segments import SegmentSlot, SegmentWriter
+from .storage import StorageManager
+from .uploader import Uploader
 
 DEFAULT_BITRATE = 8_388_608  # example: 8MB
 ROOT_DIRECTORY = pathlib.Path(__file__).resolve().parent
 logger.setLevel(logging.INFO)
-one_GB = 2**30
+
+CAPTURE_SECONDS = registry.histogram(
+    "artincam_capture_seconds",
+    "Camera thread time per capture: taking an image (written by the image writer), or recording a video.",
+    ("type",),
+    buckets=CAPTURE_BUCKETS,
+)
+IMAGE_CAPTURE_SECONDS = CAPTURE_SECONDS.labels("image")
+VIDEO_CAPTURE_SECONDS = CAPTURE_SECONDS.labels("video")
 
 
 class TimeUnit(StrEnum):
@@ -56,32 +97,80 @@ class APIMethod(StrEnum):
 
 
 class FileCounter:
-    COUNTER_FILE_PATH = ROOT_DIRECTORY / "config/counter.txt"
+    """Capture counter used in asset unique ids, ids must never be reused, even after a crash.
+
+    Instead of rewriting the file on every capture, ids are reserved in blocks of `BLOCK_SIZE`: the file holds the
+    first id that is not reserved yet and is only written when a block runs out (once every BLOCK_SIZE captures).
+    The file is replaced atomically, so it always holds either the previous or the new high-water mark. After a
+    restart counting starts from that mark, the unused ids of the last block are skipped.
+    """
+
+    BLOCK_SIZE = 1000
 
     counter: int
+    # ids below this one are reserved on disk
+    _reserved: int
 
-    def __init__(self):
+    def __init__(self, path: pathlib.Path):
+        self.path = path
         self._init_counter()
+        self._reserve()
 
     def _init_counter(self):
-        """Reads the counter value from the file. If the file doesn't exist, returns 0."""
-        if not self.COUNTER_FILE_PATH.exists():
-            self.counter = 0
-
-        with open(self.COUNTER_FILE_PATH, "r") as file:
-            try:
+        """Reads the high-water mark from the file. If the file doesn't exist, starts from 0."""
+        try:
+            with open(self.path, "r") as file:
                 self.counter = int(file.read().strip())
-            except ValueError:
-                self.counter = 0
+        except FileNotFoundError:
+            self.counter = 0
+        except ValueError:
+            # only possible with a file written by an older version (not atomic) or edited by hand. Starting
+            # from 0 would reuse ids, the current unix time is above any count reached and fits the 10 digits
+            self.counter = int(time.time())
+            logger.error(f"[FileCounter] Unreadable counter file, continuing from {self.counter}")
 
     def increment_counter(self):
-        """Increments the counter and updates the file."""
+        """Increments the counter, reserving a new block on disk when the current one is used up."""
         self.counter += 1
-        with open(self.COUNTER_FILE_PATH, "w") as file:
-            file.write(str(self.counter))
+
+        if self.counter >= self._reserved:
+            self._reserve()
+
+    def _reserve(self):
+        self._reserved = self.counter + self.BLOCK_SIZE
+        self._write_atomic(self._reserved)
+
+    def _write_atomic(self, value: int):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+
+        with open(tmp_path, "w") as file:
+            file.write(str(value))
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp_path, self.path)
+
+        # make the rename itself durable, not supported on every platform
+        try:
+            dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        except OSError:
+            return
+
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
 
 
 class Camera:
+    OUTBOX_PATH = ROOT_DIRECTORY / "config/outbox.db"
+    CATALOG_PATH = ROOT_DIRECTORY / "config/catalog.db"
+    CONFIG_PATH = ROOT_DIRECTORY / "config/last_config.json"
+    COUNTER_PATH = ROOT_DIRECTORY / "config/counter.txt"
+    STARTUP_TRACE_PATH = ROOT_DIRECTORY / "config/startup_trace.json"
+
     _config: dict
     _mode: ModeEnum
     _status: StatusEnum
@@ -96,25 +185,64 @@ class Camera:
 
     _recording_time: int
     _cycle_rest_time: int
+
+    _motion_sensitivity: int
+    _motion_capture: MotionCaptureEnum
+    _motion_cooldown: int
+    _motion_detector: MotionDetector | None
+    _lores_size: tuple[int, int] | None
+    _previews: bool
+    _preview_budget: PreviewBudget
+
+    _pre_trigger_time: int
+    _pre_trigger_buffer_size: int
+    _pre_trigger_output: PreTriggerOutput | None
+    _segmented_output: SegmentedOutput | None
+    # asset file of each continuous recording segment until it is closed
+    _open_segments: dict[str, tuple[AssetFile, FrameStats]]
+    _trigger: threading.Event
     _time_unit: TimeUnit
     _output_path: pathlib.Path
+    _storage: StorageManager
 
     _agent_messages: Queue[tuple[AgentMessage, dict | None]] | None
     _stop: threading.Event
     _interrupt_sleep: threading.Event
+    _cycle_lock: threading.Lock
+    _config_applied: threading.Event
+    _config_store: ConfigStore
+    # "saved" (warm boot) or "backend", and the time from process start to the first capture
+    _config_source: str | None
+    _startup: dict | None
+
+    _image_schedule: DeadlineScheduler | None
+    _segment_writer: SegmentWriter | None
+    _cycle_schedule: DeadlineScheduler | None
 
     _backend_client: BackendService
     _messages_to_backend: Queue
+    _image_writer: ImageWriter
+    _outbox_sender: OutboxSender
+    _catalog: AssetCatalog
+    _uploader: Uploader | None
+    _retention: RetentionDaemon
+    _quality: QualityController
+
+    _timestamp_overlay: TimestampOverlay
+    _frame_timing: FrameTimingAnalyzer | None
 
     picam: Picamera2
     encoder: H264Encoder
     ffmpeg_output: FfmpegOutput
+    proxy_encoder: H264Encoder
+    proxy_output: FfmpegOutput
     file_counter: FileCounter
 
     def __init__(
         self,
         agent_messages: Queue[tuple[AgentMessage, dict | None]],
         stop_event: threading.Event,
+        agent_id: str = ARTINCAM_AGENT_ID,
     ):
         # bit rate data
         # 33554432 (33MB)- 30MB per 10s video
@@ -134,18 +262,81 @@ class Camera:
         self._horizontal_flip = False
         self._width = 1640
         self._height = 1232
+        self._agent_id = agent_id
         self._pi_id = None
         self._location = None
         self._output_path = ROOT_DIRECTORY
         self._camera_config = None
+        self._motion_detector = None
+        self._pre_trigger_output = None
+        self._segmented_output = None
+        self._open_segments = {}
+        self._frame_timing = None
+        self._image_schedule = None
+        self._cycle_schedule = None
+        self._segment_writer = None
+        self._lores_size = None
+        self._previews = False
 
         self.picam = Picamera2()
-        self.file_counter = FileCounter()
+        self.file_counter = FileCounter(self.COUNTER_PATH)
         self._agent_messages = agent_messages
         self._stop = stop_event
         self._interrupt_sleep = threading.Event()
+        # held by the capture loop while a cycle runs, config updates take it to apply changes between cycles
+        self._cycle_lock = threading.Lock()
+        self._config_applied = threading.Event()
+        self._config_source = None
+        self._startup = None
+        self._trigger = threading.Event()
         self._camera_config = None
-        self._backend_client = BackendService()
+        self._backend_client = BackendService(pool_size=BACKEND_WORKERS + 1 + UPLOAD_WORKERS)
+        # thumbnails and proxy clips are skipped once they'd compete with captures
+        self._preview_budget = PreviewBudget()
+        self._image_writer = ImageWriter(preview_budget=self._preview_budget)
+        self._storage = StorageManager()
+        # every asset produced and its state (writing, complete, registered, uploaded, transferred, evicted)
+        self._catalog = AssetCatalog(self.CATALOG_PATH)
+        # the media itself, only when enabled. Rate limited so streaming and health traffic keep some bandwidth
+        self._uploader = None
+        if UPLOAD_ENABLED:
+            self._uploader = Uploader(
+                self._catalog,
+                self._backend_client,
+                agent_id=self._agent_id,
+                workers=UPLOAD_WORKERS,
+                chunk_size=UPLOAD_CHUNK_SIZE_KB * 1024,
+                bandwidth=UPLOAD_BANDWIDTH_KBPS * 1024,
+            )
+        # asset files (and action logs worth keeping) survive restarts and outages in the outbox until sent
+        self._outbox_sender = OutboxSender(
+            Outbox(self.OUTBOX_PATH),
+            self._backend_client,
+            max_batch_size=ASSET_BATCH_SIZE,
+            max_latency=ASSET_BATCH_LATENCY,
+            on_asset_files_sent=self._asset_files_registered,
+        )
+        # frees the local output directory before captures start failing on a full card, in its own thread
+        self._retention = RetentionDaemon(
+            self._catalog,
+            high_watermark=RETENTION_HIGH_WATERMARK,
+            low_watermark=RETENTION_LOW_WATERMARK,
+            policy=policy_from_name(RETENTION_POLICY),
+            evict_unsaved=RETENTION_EVICT_UNSAVED,
+            on_evicted=self._assets_evicted,
+            on_file_removed=self._storage.record_removed,
+        )
+        # lowers bitrate and JPEG quality when the storage wouldn't last until the configured date, idle otherwise
+        self._quality = QualityController(
+            self._catalog, free_space=self._storage.free_space, on_decision=self._quality_decided
+        )
+
+        # warm boot: capture with the last applied configuration right away, the backend's is reconciled with it
+        # once it arrives (usually nothing changed and nothing is restarted)
+        self._config_store = ConfigStore(self.CONFIG_PATH)
+        if (saved_config := self._config_store.load()) is not None:
+            logger.info("[Camera] Starting with the last saved configuration")
+            self._agent_messages.put((AgentMessage.SAVED_CONFIG, saved_config))
 
         self._agent_message_thread = threading.Thread(
             target=self._camera_listener_loop,
@@ -153,12 +344,26 @@ class Camera:
         )
         self._agent_message_thread.start()
         self._messages_to_backend = Queue()
-
-        self._camera_callbacks_thread = threading.Thread(
-            target=self._camera_callbacks_loop,
-            daemon=True,
+        registry.gauge(
+            "artincam_backend_queue_depth",
+            "Callbacks waiting for a backend worker.",
+            fn=self._messages_to_backend.qsize,
         )
-        self._camera_callbacks_thread.start()
+
+        self._metrics_server = None
+        if METRICS_PORT:
+            try:
+                self._metrics_server = MetricsServer(registry, METRICS_HOST, METRICS_PORT)
+                logger.info(f"[Camera] Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+            except OSError as e:
+                logger.error(f"[Camera] Failed to serve metrics on {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+        # a few workers so one slow backend call doesn't hold every other callback behind it
+        self._camera_callbacks_threads = [
+            threading.Thread(target=self._camera_callbacks_loop, daemon=True) for _ in range(BACKEND_WORKERS)
+        ]
+        for thread in self._camera_callbacks_threads:
+            thread.start()
         self._health_check_thread = threading.Thread(
             target=self._health_check_loop,
             daemon=True,
@@ -177,108 +382,220 @@ class Camera:
         if self._vertical_flip:
             config_dict["transform"] = Transform(vflip=1)
 
+        self._lores_size = None
+        if self._needs_lores():
+            # motion detection, previews and the quality controller only look at a small stream, full resolution
+            # frames are never touched
+            self._lores_size = lores_size(self._width, self._height)
+            config_dict["lores"] = {"size": self._lores_size, "format": "YUV420"}
+
         video_config = self.picam.create_video_configuration(**config_dict)
         self.picam.configure(video_config)
-        self.encoder = H264Encoder(bitrate=self._bitrate, framerate=self._framerate, enable_sps_framerate=True)
+        self.setup_encoders()
+
+    def setup_encoders(self):
+        """Encoders, their outputs and the motion detector, rebuilt without touching the camera."""
+        self._motion_detector = None
+        if self._mode == ModeEnum.MOTION:
+            self._motion_detector = MotionDetector(sensitivity=self._motion_sensitivity)
+
         self.ffmpeg_output = FfmpegOutput("")
-        self.encoder.output = [self.ffmpeg_output]
+        # proxy clips are encoded from the lores stream by a second encoder, next to the full resolution video
+        self.proxy_output = FfmpegOutput("")
+        self.proxy_encoder = H264Encoder(bitrate=PROXY_BITRATE, framerate=self._framerate, enable_sps_framerate=True)
+        self.proxy_encoder.output = [self.proxy_output]
+
+        self._pre_trigger_output = None
+        self._segmented_output = None
+        if self._mode == ModeEnum.CONTINUOUS_VIDEO:
+            # one encoder session for as long as the camera runs, cut into files on keyframes (one per second)
+            self.encoder = H264Encoder(
+                bitrate=self._quality.bitrate if self._quality.enabled else self._bitrate,
+                framerate=self._framerate,
+                enable_sps_framerate=True,
+                iperiod=self._framerate,
+            )
+            self._segmented_output = SegmentedOutput(
+                duration=self._recording_time,
+                on_segment_opened=self._video_segment_opened,
+                on_segment_closed=self._video_segment_closed,
+            )
+            self.encoder.output = [self._segmented_output]
+        elif self._use_pre_trigger_buffer():
+            # one keyframe per second, the buffer is trimmed a GOP at a time so this keeps it close to the target
+            self.encoder = H264Encoder(
+                bitrate=self._bitrate,
+                framerate=self._framerate,
+                enable_sps_framerate=True,
+                iperiod=self._framerate,
+            )
+            self._pre_trigger_output = PreTriggerOutput(
+                duration=self._pre_trigger_time,
+                max_bytes=self._pre_trigger_buffer_size * ONE_MB,
+            )
+            self.encoder.output = [self._pre_trigger_output]
+        else:
+            self.encoder = H264Encoder(bitrate=self._bitrate, framerate=self._framerate, enable_sps_framerate=True)
+            self.encoder.output = [self.ffmpeg_output]
 
     def run(self):
         while self._camera_config is None and not self._stop.is_set():
             logger.info("[Camera] Waiting for initial configuration...")
-            self._interruptable_sleep(10)
+            self._config_applied.wait(timeout=10)
+            self._config_applied.clear()
 
         # initial camera setup
         self.setup()
         # initialize camera
         self.picam.start()
-        self._use_timestamp_overlay()
+        self._use_pre_callback()
         self._sleep(2)  # let the camera start running properly
 
         while not self._stop.is_set():  # while stop event is not set, keep running
-            if self._status != StatusEnum.ACTIVE:
-                self._sleep(1)
-                continue
+            # a config update waits for the running cycle to end, the next cycle waits for the update to be applied
+            with self._cycle_lock:
+                active = self._status == StatusEnum.ACTIVE
+                if active:
+                    self._run_cycle()
 
-            match self._mode:
-                case ModeEnum.IMAGE:
-                    self._capture_image()
-                    self._interruptable_sleep(self._image_rest_time)
+                self._interrupt_sleep.clear()
 
-                case ModeEnum.VIDEO:
-                    self._capture_video()
-                    self._interruptable_sleep(self._cycle_rest_time)
+            if not active:
+                self._config_applied.wait(timeout=1)
+                self._config_applied.clear()
+
+        self.close()
+
+    def close(self):
+        """Stops the camera and every worker, once the capture loop is done (or never ran, like in benchmarks)."""
+        # let the pending images reach the disk and get registered before the callbacks loop is told to stop
+        self._image_writer.close()
+        if self._segment_writer is not None:
+            self._segment_writer.close()
+        self._outbox_sender.close()
+        if self._uploader is not None:
+            self._uploader.close()
+        self._retention.close()
+        self._quality.close()
+        self._storage.close()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+        for _ in self._camera_callbacks_threads:
+            self._messages_to_backend.put(None)
+        self.picam.stop_encoder()
+        self.picam.stop()
+        self.picam.close()
 
-                case ModeEnum.IMAGE_VIDEO:
-                    start_time = time.time()
+    def _run_cycle(self):
+        match self._mode:
+            case ModeEnum.IMAGE:
+                self._capture_image_schedule()
 
-                    while time.time() - start_time < self._image_capture_time and not self._break_cycle_condition():
-                        self._capture_image(sleep=True)
-                        self._interruptable_sleep(self._image_rest_time)
+            case ModeEnum.VIDEO:
+                self._capture_video()
+                self._interruptable_sleep(self._cycle_rest_time)
 
-                        if self._break_cycle_condition():
-                            break
+            case ModeEnum.CONTINUOUS_VIDEO:
+                self._capture_continuous_video()
 
-                        self._capture_video(sleep=True)
-                        self._interruptable_sleep(self._cycle_rest_time)
+            case ModeEnum.IMAGE_VIDEO:
+                self._capture_image_video_schedule()
 
-                case ModeEnum.RTSP_STREAM:
-                    self._capture_stream()
+            case ModeEnum.RTSP_STREAM:
+                self._capture_stream()
 
-                case _:
-                    self._sleep(1)
+            case ModeEnum.MOTION:
+                self._capture_motion()
 
-            self._interrupt_sleep.clear()
-        self._messages_to_backend.put(None)
-        self.picam.stop_encoder()
-        self.picam.stop()
-        self.picam.close()
+            case _:
+                self._sleep(1)
 
     # ----- OVERLAYS -----
-    def _use_timestamp_overlay(self):
-        text_color = (255, 255, 255)  # color - white
-        bg_color = (0, 0, 0)  # color - black
-        padding = 5
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        scale = 1
-        thickness = 2
-
-        x_axis_location = self._width - 400
-        y_axis_location = self._height - 50
-        origin = (x_axis_location, y_axis_location)
-
-        (text_width, text_height), _ = cv2.getTextSize(time.strftime("%Y-%m-%d %X"), font, scale, thickness)
-
-        top_left = (x_axis_location - padding, y_axis_location - text_height - padding)
-        bottom_right = (x_axis_location + text_width + padding, y_axis_location + padding)
+    def _use_pre_callback(self):
+        """Draws the timestamp on every frame, through the frame timing analyzer so each frame is measured."""
+        self._timestamp_overlay = TimestampOverlay(self._width, self._height)
+        # the same frame duration setup() configured, the framerate only changes with a camera restart
+        self._frame_timing = FrameTimingAnalyzer(
+            1000000 // self._framerate, [("overlay", self._timestamp_overlay.apply)]
+        )
+        self.picam.pre_callback = self._frame_timing
 
-        def apply_timestamp(request):
-            with MappedArray(request, "main") as m:
-                image = m.array
-                cv2.rectangle(image, top_left, bottom_right, bg_color, cv2.FILLED)
-                cv2.putText(image, time.strftime("%Y-%m-%d %X"), origin, font, scale, text_color, thickness)
+        trace = startup_trace.active()
+        if trace is not None and "first_frame" not in trace.marks:
+            self.picam.pre_callback = self._first_frame_callback
 
-        self.picam.pre_callback = apply_timestamp
+    def _first_frame_callback(self, request):
+        """pre_callback for the first frame only when tracing startup, records it and hands over to the analyzer."""
+        self.picam.pre_callback = self._frame_timing
+        startup_trace.active().mark("first_frame")
+        self._frame_timing(request)
 
     # ----- MODE HANDLERS -----
-    def _capture_image(self, sleep: bool = False):
+    def _capture_image(self):
         # Capture the image and save to a file
+        started = time.monotonic()
         output_filepath, asset_file = self._get_asset_file_meta(AssetFileTypeEnum.IMAGE, image=True)
         self._current_time = time.strftime("%Y-%m-%d %X")
-        self._messages_to_backend.put(self._create_asset_file_callback(asset_file))
-        self.picam.capture_file(output_filepath)
-        file_path = pathlib.Path(output_filepath)
-        asset_file.file_size = 0 if not file_path.exists() else file_path.stat().st_size
-        self._messages_to_backend.put(self._update_asset_file_callback(asset_file))
+        destination, catalog_path = output_filepath, output_filepath
+
+        if self._segment_writer is not None:
+            # appended to the segment of its time window instead of getting its own file
+            directory = pathlib.Path(output_filepath).parent
+            timestamp = datetime.fromisoformat(asset_file.timestamp).timestamp()
+            destination = self._segment_writer.slot(directory, asset_file.unique_id, timestamp)
+            catalog_path = str(self._segment_writer.path_for(directory, timestamp))
+
+        # only hold the camera buffer long enough to copy the frame out, encoding and writing happen in the writer
+        request = self.picam.capture_request()
+        try:
+            frame = request.make_array("main")
+            lores_frame = request.make_array("lores") if self._lores_size is not None else None
+        finally:
+            request.release()
+
+        thumbnail = None
+        # segments exist to keep the file count down, their images don't get a thumbnail file each
+        if self._previews and self._segment_writer is None:
+            thumbnail = Thumbnail(lores_frame, self._lores_size, thumbnail_path(output_filepath))
+
+        if self._quality.enabled:
+            self._quality.observe_scene(lores_frame, self._lores_size[1])
+        # the controller's quality, or the default when it is disabled
+        self._image_writer.quality = self._quality.quality
+
+        self._catalog.add(asset_file, catalog_path)
+        on_written = self._image_written_callback(asset_file, destination, self._image_writer.quality)
+        on_failed = self._image_failed_callback(asset_file)
+        if not self._image_writer.submit(frame, destination, on_written, thumbnail, on_failed):
+            self._catalog.remove(asset_file.unique_id)
+            return
+
         self.file_counter.increment_counter()
+        IMAGE_CAPTURE_SECONDS.observe(time.monotonic() - started)
         logger.debug(f"Image taken, storing in ({output_filepath})\nImage Resting...({self._image_rest_time})")
 
     def _capture_video(self):
+        started = time.monotonic()
         output_filepath, asset_file = self._get_asset_file_meta(AssetFileTypeEnum.VIDEO)
-        self._messages_to_backend.put(self._create_asset_file_callback(asset_file))
         self.ffmpeg_output.output_filename = output_filepath
+        self._catalog.add(asset_file, output_filepath)
         logger.debug(f"Starting Recording ({self._recording_time}s)")
+        if self._quality.enabled:
+            # picked up by the encoder when it starts, no camera restart needed between clips
+            self.encoder.bitrate = self._quality.bitrate
         self.picam.start_encoder(self.encoder)
+        clip = self._frame_timing.start_clip()
+
+        if self._quality.enabled:
+            self._quality.observe_scene(self.picam.capture_array("lores"), self._lores_size[1])
+
+        preview_filepath = None
+        # hardware encoded, only the load check of the budget applies
+        if self._previews and self._preview_budget.allow():
+            preview_filepath = proxy_path(output_filepath)
+            self.proxy_output.output_filename = preview_filepath
+            self.picam.start_encoder(self.proxy_encoder, name="lores")
+            self._preview_budget.spend(0.0)
 
         # record for however many seconds. On each second update timestamp
         for _ in range(self._recording_time):
@@ -287,12 +604,26 @@ class Camera:
 
             self._current_time = time.strftime("%Y-%m-%d %X")
 
-        # once time is finished, stop recording
+        # once time is finished, stop recording (both encoders)
         self.picam.stop_encoder()
+        asset_file.frame_timing = self._frame_timing.finish_clip(clip, asset_file.file_name)
         self.file_counter.increment_counter()
-        file_path = pathlib.Path(output_filepath)
-        asset_file.file_size = 0 if not file_path.exists() else file_path.stat().st_size
-        self._messages_to_backend.put(self._update_asset_file_callback(asset_file))
+        VIDEO_CAPTURE_SECONDS.observe(time.monotonic() - started)
+        self._video_written(asset_file, output_filepath, preview_filepath)
+
+    def _capture_continuous_video(self):
+        """Records until the cycle is interrupted (config update, stop), the output splits it into
+        `recording_time` files without stopping the encoder, so there is no gap between files.
+        """
+        logger.debug(f"[Camera] Starting continuous recording ({self._recording_time}s files)")
+        self.picam.start_encoder(self.encoder)
+
+        while not self._break_cycle_condition():
+            self._current_time = time.strftime("%Y-%m-%d %X")
+            self._interruptable_sleep(1)
+
+        # closes the last file
+        self.picam.stop_encoder()
 
     def _capture_stream(self):
         rtsp_stream_output = PyavOutput(self._camera_config.rtsp_stream.address, format="rtsp")
@@ -305,6 +636,111 @@ class Camera:
 
         self.picam.stop_encoder()
 
+    def _capture_image_schedule(self):
+        """Takes an image every `image_rest_time` seconds on a fixed grid until the cycle is interrupted."""
+        self._image_schedule = DeadlineScheduler(self._image_rest_time)
+        self._cycle_schedule = None
+
+        while not self._break_cycle_condition():
+            self._capture_image()
+
+            if self._image_schedule.wait(self._interruptable_sleep):
+                break
+
+    def _capture_image_video_schedule(self):
+        """Runs image/video cycles on a fixed grid: images every `image_rest_time` seconds for
+        `image_capture_time`, one `recording_time` video, then `cycle_rest_time` before the next cycle starts.
+        """
+        cycle_time = self._image_capture_time + self._recording_time + self._cycle_rest_time
+        self._cycle_schedule = DeadlineScheduler(cycle_time)
+        self._image_schedule = DeadlineScheduler(self._image_rest_time)
+
+        while not self._break_cycle_condition():
+            cycle_start = self._cycle_schedule.next_deadline
+            images_end = cycle_start + self._image_capture_time
+            self._image_schedule.reset(cycle_start)
+
+            while self._image_schedule.next_deadline < images_end:
+                self._capture_image()
+
+                if self._image_schedule.wait(self._interruptable_sleep, until=images_end):
+                    return
+
+            self._capture_video()
+
+            if self._cycle_schedule.wait(self._interruptable_sleep):
+                return
+
+    def schedule_stats(self) -> dict:
+        """Per-slot timing of the image/cycle schedules (fired, skipped and jitter)."""
+        stats = {}
+
+        if self._image_schedule is not None:
+            stats["image"] = self._image_schedule.stats()
+        if self._cycle_schedule is not None:
+            stats["cycle"] = self._cycle_schedule.stats()
+
+        return stats
+
+    def _capture_motion(self):
+        lores_height = self._lores_size[1]
+        cooldown_until = 0.0
+
+        if self._pre_trigger_output is not None:
+            # encoder runs the whole time, filling the pre-trigger buffer until something happens
+            self.picam.start_encoder(self.encoder)
+
+        while not self._break_cycle_condition():
+            # capture_array blocks until the next lores frame is ready, so this loop runs at most at the framerate
+            motion = self._motion_detector.update(luma(self.picam.capture_array("lores"), lores_height))
+            motion = motion and time.monotonic() >= cooldown_until
+
+            # manual triggers (websocket/api) skip the cooldown
+            if self._trigger.is_set():
+                self._trigger.clear()
+                logger.debug("[Camera] Capture triggered")
+            elif motion:
+                logger.debug(f"[Camera] Motion detected ({self._motion_detector.last_area:.2%} of the frame changed)")
+            else:
+                continue
+
+            match self._motion_capture:
+                case MotionCaptureEnum.VIDEO if self._pre_trigger_output is not None:
+                    self._capture_pre_trigger_video()
+                case MotionCaptureEnum.VIDEO:
+                    self._capture_video()
+                case _:
+                    self._capture_image()
+
+            # the scene changed while capturing, start a new background instead of triggering on stale data
+            self._motion_detector.reset()
+            cooldown_until = time.monotonic() + self._motion_cooldown
+
+        if self._pre_trigger_output is not None:
+            self.picam.stop_encoder()
+
+    def _capture_pre_trigger_video(self):
+        """Writes the buffered `pre_trigger_time` seconds plus the next `recording_time` seconds into one video."""
+        started = time.monotonic()
+        output_filepath, asset_file = self._get_asset_file_meta(AssetFileTypeEnum.VIDEO)
+        logger.debug(f"[Camera] Flushing pre-trigger buffer {self._pre_trigger_output.occupancy()}")
+        self._catalog.add(asset_file, output_filepath)
+        self._pre_trigger_output.open(output_filepath)
+        # frames from the trigger on, the buffered ones went through the analyzer before the clip existed
+        clip = self._frame_timing.start_clip()
+
+        for _ in range(self._recording_time):
+            if self._interruptable_sleep(1):
+                break
+
+            self._current_time = time.strftime("%Y-%m-%d %X")
+
+        self._pre_trigger_output.close()
+        asset_file.frame_timing = self._frame_timing.finish_clip(clip, asset_file.file_name)
+        self.file_counter.increment_counter()
+        VIDEO_CAPTURE_SECONDS.observe(time.monotonic() - started)
+        self._video_written(asset_file, output_filepath)
+
     # ----- VALIDATORS AND CONFIG -----
     def _set_config_update(self, config: ArtincamPiAgentConfig):
         camera_config: ArtincamPiCamera = config.camera
@@ -316,8 +752,11 @@ class Camera:
         # unit used to define video recording time, default is minutes (m)
         image_capture_time_unit = self._set_time_unit_conversion(camera_config.image_capture_time_unit)
         image_rest_time_unit = self._set_time_unit_conversion(camera_config.image_rest_time_unit)
+        segment_time_unit = self._set_time_unit_conversion(camera_config.segment_time_unit)
         recording_time_unit = self._set_time_unit_conversion(camera_config.recording_time_unit)
         cycle_rest_time_unit = self._set_time_unit_conversion(camera_config.cycle_rest_time_unit)
+        motion_cooldown_unit = self._set_time_unit_conversion(camera_config.motion_cooldown_unit)
+        pre_trigger_time_unit = self._set_time_unit_conversion(camera_config.pre_trigger_time_unit)
 
         # ----- STREAM SETUP -----
         self._vertical_flip = transforms.vertical_flip
@@ -328,6 +767,23 @@ class Camera:
         self._image_capture_time = camera_config.image_capture_time * image_capture_time_unit
         # wait time between images
         self._image_rest_time = camera_config.image_rest_time * image_rest_time_unit
+        # one file per image, or appended to a segment per `segment_time` window (fewer, larger files)
+        segments = None
+        if camera_config.image_storage == ImageStorageEnum.SEGMENTS:
+            segments = (camera_config.segment_time * segment_time_unit, camera_config.pi_id, camera_config.location)
+
+        current_segments = None
+        if self._segment_writer is not None:
+            writer = self._segment_writer
+            current_segments = (writer.duration, writer.pi_id, writer.location)
+
+        # queued images hold slots of the current writer, it is only replaced once they are in and when it changes:
+        # two writers appending to the same segment would corrupt its index
+        if segments != current_segments:
+            if self._segment_writer is not None:
+                self._image_writer.drain()
+                self._segment_writer.close()
+            self._segment_writer = SegmentWriter(*segments) if segments is not None else None
 
         # ----- VIDEO SETUP -----
         # how long should each video be, default is 10
@@ -338,12 +794,30 @@ class Camera:
         # immediately
         self._cycle_rest_time = camera_config.cycle_rest_time * cycle_rest_time_unit
 
+        # ----- MOTION SETUP -----
+        # how sensitive motion detection is, 1 (least) to 100 (most), default 50
+        self._motion_sensitivity = camera_config.motion_sensitivity
+        # what to capture once motion is detected (image or video), default image
+        self._motion_capture = camera_config.motion_capture
+        # how long to wait after a motion capture before another one can be triggered, default 10s
+        self._motion_cooldown = camera_config.motion_cooldown * motion_cooldown_unit
+        # how much video to keep in memory before a motion/manual trigger, default 0 (disabled)
+        self._pre_trigger_time = camera_config.pre_trigger_time * pre_trigger_time_unit
+        # max memory (MB) the pre-trigger buffer can use, the oldest video is dropped first, default 32MB
+        self._pre_trigger_buffer_size = camera_config.pre_trigger_buffer_size
+
+        # thumbnail per image and proxy clip per video, made from the lores stream, default False
+        self._previews = camera_config.previews
+
         # how many frames per second, default 24
         self._framerate = camera_config.framerate
 
         # bitrate is used to determine the quality of image during compression. The higher the value the
         # better quality image, the more space it takes
         self._bitrate = camera_config.bitrate
+        # with a date the storage must last until, bitrate and JPEG quality are lowered as needed to get there,
+        # `bitrate` is the highest one used
+        self._quality.configure(camera_config.must_last_until, self._bitrate)
 
         # how many width pixels, think of it as if you were providing measurements for a box ( width x height )
         # the bigger width x height, the better the image, the more storage it takes. Default is 1640
@@ -360,7 +834,9 @@ class Camera:
 
         # where to store recordings
         self._output_path = pathlib.Path(f"{ROOT_DIRECTORY}/{camera_config.output_dir}")
-        self._output_path.mkdir(parents=True, exist_ok=True)
+        # usb sticks get the data under data/<pi_id>/, the local output directory is the fallback
+        self._storage.configure(self._output_path, str(self._pi_id))
+        self._retention.configure(self._output_path)
 
     def _set_time_unit_conversion(self, unit: TimeUnit):
         """Depending on the file config's time unit, define the multiplier to convert whatever unit
@@ -383,14 +859,12 @@ class Camera:
     def _get_asset_file_meta(self, file_type: AssetFileTypeEnum, image=False) -> tuple[str, AssetFile]:
         """Defines the name of the file generated for the video."""
 
-        # Automatically add data to usb stick if it can be found, otherwise save in the local disk
-        usb_mount_point = self._find_usb_mount_points()
-        if usb_mount_point and shutil.disk_usage(usb_mount_point).free > one_GB:
-            final_transfer_path = pathlib.Path(usb_mount_point + "/data/" + str(self._pi_id) + "/")
-        else:
-            final_transfer_path = self._output_path
+        # Automatically add data to usb stick if it can be found, otherwise save in the local disk. The storage
+        # manager keeps the destination cached, nothing here touches the disk
+        final_transfer_path = self._storage.destination()
 
-        final_transfer_path.mkdir(parents=True, exist_ok=True)
+        if self._startup is None:
+            self._first_capture()
 
         # the timestamp format here aims to do: YYYYMMDDHHmmSS
         # Example: Say its Feb 20 2025, 6:03:10AM. The format would look like: 20250220060313
@@ -409,7 +883,7 @@ class Camera:
             file_stride=file_stride,
         )
         asset_file = AssetFile(
-            agent_id=ARTINCAM_AGENT_ID,
+            agent_id=self._agent_id,
             camera_id=str(self._pi_id),
             location=self._location,
             timestamp=current_time.isoformat(),
@@ -421,18 +895,38 @@ class Camera:
 
         return str(final_transfer_path / file_name), asset_file
 
-    def _find_usb_mount_points(self):
-        """
-        Lists mounted filesystems that appear to be USB storage devices.
-        """
+    def _first_capture(self):
+        """Reports how long it took from process start to the first capture."""
+        uptime = startup_trace.process_uptime()
+        self._startup = {
+            "time_to_first_capture_s": round(uptime, 2) if uptime is not None else None,
+            "config_source": self._config_source,
+        }
+
+        trace = startup_trace.active()
+        if trace is not None:
+            trace.mark("first_capture")
+            startup_trace.uninstall()
+            self._report_startup_trace(trace)
+
+        logger.info(f"[Camera] First capture {self._startup}")
+        self._outbox_sender.add_action_log(
+            ActionLog(agent_id=self._agent_id, category="startup", message=self._startup)
+        )
+
+    def _report_startup_trace(self, trace: startup_trace.StartupTrace):
+        """Logs the slowest imports and writes the whole trace next to the config, totals go with the startup log."""
+        report = trace.report()
+
+        for module in report["modules"]:
+            logger.info(f"[Camera] Import {module['module']}: {module['cumulative_ms']}ms ({module['self_ms']}ms self)")
+
         try:
-            partitions = psutil.disk_partitions(all=False)
-        except Exception:
-            return None
+            trace.write(self.STARTUP_TRACE_PATH)
+        except OSError as e:
+            logger.error(f"[Camera] Failed to write the startup trace ({self.STARTUP_TRACE_PATH}): {e}")
 
-        for p in partitions:
-            if p.device.startswith("/dev/sd") and p.mountpoint and os.path.exists(p.mountpoint):
-                return p.mountpoint
+        self._startup.update({key: value for key, value in report.items() if key != "modules"})
 
     def _sleep(self, seconds: float):
         if seconds > 0:
@@ -447,26 +941,95 @@ class Camera:
     def _break_cycle_condition(self) -> bool:
         return self._interrupt_sleep.is_set() or self._stop.is_set()
 
+    def _needs_lores(self) -> bool:
+        return self._mode == ModeEnum.MOTION or self._previews or self._quality.enabled
+
+    def _use_pre_trigger_buffer(self) -> bool:
+        return (
+            self._mode == ModeEnum.MOTION
+            and self._motion_capture == MotionCaptureEnum.VIDEO
+            and self._pre_trigger_time > 0
+        )
+
+    def trigger(self):
+        """Request a capture on the next motion loop iteration, as if motion was detected."""
+        self._trigger.set()
+
+    def pre_trigger_occupancy(self) -> dict | None:
+        if self._pre_trigger_output is None:
+            return None
+
+        return self._pre_trigger_output.occupancy()
+
     def _process_message(self, message: AgentMessage, params: str | ArtincamPiAgentConfig):
         match message:
             case AgentMessage.CONFIG_UPDATE:
-                config: ArtincamPiAgentConfig = params
-                self._status = StatusEnum.STOPPED
-                self._interrupt_sleep.set()
-                self._set_config_update(config)
-                logger.info("[Camera] Configuration updated.")
-                logger.info("[Camera] Stopping camera to update configuration...")
+                self._reconfigure(params, source="backend")
+
+            case AgentMessage.SAVED_CONFIG:
+                self._reconfigure(params, source="saved")
+
+            case AgentMessage.TRIGGER:
+                self.trigger()
+
+    def _reconfigure(self, config: ArtincamPiAgentConfig, source: str):
+        """Applies a config update, restarting only what the changed fields need (see reconfigure.FIELD_LEVELS).
+        Configurations from the backend are saved for the next boot.
+        """
+        start = time.monotonic()
+        previous = self._camera_config
+        changes = diff_camera_config(previous, config.camera)
+        level = required_level(changes)
+        self._config_source = source
+
+        if level == ReconfigureLevel.NONE:
+            logger.info(f"[Camera] Configuration from {source} unchanged.")
+            return
+
+        if source == "backend":
+            self._config_store.save(config)
+
+        # end the running cycle, the next one starts with the new configuration
+        self._status = StatusEnum.STOPPED
+        self._interrupt_sleep.set()
+
+        with self._cycle_lock:
+            needed_lores = self._needs_lores() if previous is not None else None
+            self._set_config_update(config)
+
+            if needed_lores is not None and self._needs_lores() != needed_lores:
+                level = ReconfigureLevel.SENSOR
+
+            if previous is None:
+                # the camera is set up by run() once the first configuration is there
+                pass
+            elif level == ReconfigureLevel.SENSOR:
+                logger.info("[Camera] Restarting camera to apply new configuration...")
                 self.picam.stop_encoder()
                 self.picam.stop()
 
                 while self.picam.started:
                     time.sleep(0.1)
 
-                logger.info("[Camera] Applying new configuration...")
                 self.setup()
-                logger.info("[Camera] Restarting camera with new configuration...")
                 self.picam.start()
-                self._interrupt_sleep.clear()
+                self._use_pre_callback()
+            elif level == ReconfigureLevel.ENCODER:
+                logger.info("[Camera] Rebuilding encoders to apply new configuration...")
+                self.picam.stop_encoder()
+                self.setup_encoders()
+
+            self._interrupt_sleep.clear()
+
+        self._config_applied.set()
+
+        if previous is None:
+            return
+
+        latency = time.monotonic() - start
+        logger.info(f"[Camera] Configuration updated ({level.name.lower()}) in {latency:.3f}s: {sorted(changes)}")
+        message = {"level": level.name.lower(), "changed": sorted(changes), "latency_ms": round(latency * 1000, 1)}
+        self._outbox_sender.add_action_log(ActionLog(agent_id=self._agent_id, category="reconfigure", message=message))
 
     # ---- thread loops ----
     def _camera_listener_loop(self):
@@ -485,7 +1048,10 @@ class Camera:
             if callback is None:
                 break
 
-            callback()
+            try:
+                callback()
+            except Exception:
+                logger.exception("[Camera] Backend callback failed")
 
     def _health_check_loop(self):
         while not self._stop.is_set():
@@ -495,31 +1061,111 @@ class Camera:
             self._sleep(60)  # send health log every 1 second
 
     # ---- CAMERA CALLBACKS ----
-    def _create_asset_file_callback(self, asset_file: AssetFile):
-        def callback():
-            response = self._backend_client.create_asset_file(asset_file)
+    def _image_written_callback(self, asset_file: AssetFile, output_filepath: str | SegmentSlot, quality: int):
+        # runs in an image writer thread once the file is on disk
+        def callback(file_size: int, preview_filepath: str | None):
+            asset_file.file_size = file_size
+            self._quality.observe_asset(AssetFileTypeEnum.IMAGE, file_size, quality)
+
+            if preview_filepath is not None:
+                asset_file.preview_file_name = pathlib.Path(preview_filepath).name
+
+            if isinstance(output_filepath, SegmentSlot):
+                self._storage.record_written(output_filepath.path, file_size)
+                self._catalog.complete(
+                    asset_file.unique_id, file_size, output_filepath.path, output_filepath.record.offset
+                )
+            else:
+                self._storage.record_written(output_filepath, file_size)
+                self._catalog.complete(asset_file.unique_id, file_size, preview_path=preview_filepath)
+
+            self._outbox_sender.add_asset_file(asset_file)
 
-            if response is None:
-                return
+        return callback
 
-            payload = response.json()
-            asset_file.id = payload["data"]["id"]
+    def _image_failed_callback(self, asset_file: AssetFile):
+        # runs in an image writer thread when the image couldn't be written, there's no asset to keep track of
+        def callback():
+            self._catalog.remove(asset_file.unique_id)
 
         return callback
 
-    def _update_asset_file_callback(self, asset_file: AssetFile):
-        def callback():
-            if asset_file.id is None:
-                logger.error("[Camera] asset_file.id is required for update")
-                return
+    def _asset_files_registered(self, unique_ids: list[str]):
+        # runs in the outbox sender thread once the backend accepted the asset files
+        self._catalog.mark_registered(unique_ids)
 
-            self._backend_client.update_asset_file(asset_file)
+        if self._uploader is not None:
+            self._uploader.wake()
 
-        return callback
+    def _assets_evicted(self, summary: dict):
+        # runs in the retention thread, kept in the outbox so evictions are known even after an outage
+        self._outbox_sender.add_action_log(ActionLog(agent_id=self._agent_id, category="retention", message=summary))
+
+    def _video_segment_opened(self) -> str:
+        # runs in the encoder thread, every file of a continuous recording is its own asset
+        output_filepath, asset_file = self._get_asset_file_meta(AssetFileTypeEnum.VIDEO)
+        self.file_counter.increment_counter()
+        self._catalog.add(asset_file, output_filepath)
+        self._open_segments[output_filepath] = (asset_file, self._frame_timing.start_clip())
+        return output_filepath
+
+    def _video_segment_closed(self, segment: VideoSegment):
+        # runs in the encoder thread, the file is registered by a callbacks thread so the encoder isn't held up
+        asset_file, clip = self._open_segments.pop(segment.filename)
+        asset_file.frame_timing = self._frame_timing.finish_clip(clip, asset_file.file_name)
+        logger.debug(f"[Camera] Video segment closed ({segment.frames} frames, {segment.duration:.2f}s)")
+        VIDEO_CAPTURE_SECONDS.observe(segment.duration)
+        self._messages_to_backend.put(lambda: self._video_written(asset_file, segment.filename))
+
+    def _quality_decided(self, decision: dict):
+        # runs in the quality controller thread when a setting changed
+        self._outbox_sender.add_action_log(ActionLog(agent_id=self._agent_id, category="quality", message=decision))
+
+    def _video_written(self, asset_file: AssetFile, output_filepath: str, preview_filepath: str | None = None):
+        file_path = pathlib.Path(output_filepath)
+        asset_file.file_size = 0 if not file_path.exists() else file_path.stat().st_size
+        self._quality.observe_asset(AssetFileTypeEnum.VIDEO, asset_file.file_size, self.encoder.bitrate)
+        self._storage.record_written(output_filepath, asset_file.file_size)
+
+        if preview_filepath is not None and os.path.exists(preview_filepath):
+            asset_file.preview_file_name = pathlib.Path(preview_filepath).name
+            self._storage.record_written(preview_filepath, os.path.getsize(preview_filepath))
+        else:
+            preview_filepath = None
+
+        self._catalog.complete(asset_file.unique_id, asset_file.file_size, preview_path=preview_filepath)
+        self._outbox_sender.add_asset_file(asset_file)
 
     def _health_check_log_callback(self):
         # todo only send health logs when the camera is acrively sending data
-        action_log = ActionLog(agent_id=ARTINCAM_AGENT_ID, category="health", message={"OK": "OK"})
+        message = {"OK": "OK"}
+
+        message["image_writer"] = self._image_writer.stats()
+        message["backend"] = self._backend_client.stats()
+        message["outbox"] = self._outbox_sender.outbox.stats()
+        message["storage"] = self._storage.stats()
+        message["retention"] = self._retention.stats()
+        message["previews"] = self._preview_budget.stats()
+
+        if self._startup is not None:
+            message["startup"] = self._startup
+
+        if self._frame_timing is not None:
+            message["frames"] = self._frame_timing.stats()
+
+        if self._quality.enabled:
+            message["quality"] = self._quality.stats()
+
+        if self._uploader is not None:
+            message["upload"] = self._uploader.stats()
+
+        if schedule := self.schedule_stats():
+            message["schedule"] = schedule
+
+        if (occupancy := self.pre_trigger_occupancy()) is not None:
+            message["pre_trigger_buffer"] = occupancy
+
+        action_log = ActionLog(agent_id=self._agent_id, category="health", message=message)
 
         def callback():
             self._backend_client.create_action_log(action_log)
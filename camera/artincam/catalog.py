@@ -0,0 +1,240 @@
+import pathlib
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .schemas import AssetFile, AssetFileTypeEnum, AssetStateEnum
+
+SECONDS_PER_DAY = 86400
+
+
+class AssetCatalog:
+    """Local SQLite index of every asset the agent produced and where it is in its lifecycle.
+
+    writing -> complete (on disk, size known) -> registered (backend knows about it) -> uploaded (backend has the
+    content, optional) -> transferred (moved off the device) or evicted (deleted to free space). Consumers (the
+    transfer tool, retention, ...) query it instead of listing directories. Safe to open from several processes, WAL
+    lets readers run while the agent writes. Images stored in a segment have the segment as path and their offset in
+    it as segment_offset (NULL for plain files). preview_path is the thumbnail or proxy clip generated with the asset,
+    if any, it follows the asset when transferred or evicted.
+    """
+
+    # columns added after the table was first created, with their definition
+    MIGRATIONS = {"file_name": "TEXT", "segment_offset": "INTEGER", "preview_path": "TEXT"}
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS assets (
+                unique_id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                file_size INTEGER NOT NULL DEFAULT -1,
+                captured_at REAL NOT NULL,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS assets_state_captured_at ON assets (state, captured_at);
+            CREATE INDEX IF NOT EXISTS assets_state_size ON assets (state, file_size DESC, captured_at);
+            CREATE INDEX IF NOT EXISTS assets_state_type_captured_at ON assets (state, file_type, captured_at);
+            CREATE INDEX IF NOT EXISTS assets_captured_at ON assets (captured_at);
+            CREATE INDEX IF NOT EXISTS assets_path ON assets (path);
+            """
+        )
+        self._migrate()
+
+    def _migrate(self):
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(assets)")}
+
+        for column, definition in self.MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE assets ADD COLUMN {column} {definition}")
+
+    def add(self, asset_file: AssetFile, path: str, state: AssetStateEnum = AssetStateEnum.WRITING):
+        captured_at = self._epoch(asset_file.timestamp)
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO assets (unique_id, path, file_name, file_type, file_size, captured_at, state, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (unique_id) DO UPDATE SET
+                    path = excluded.path, file_size = excluded.file_size, state = excluded.state,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    asset_file.unique_id,
+                    path,
+                    asset_file.file_name,
+                    asset_file.file_type.value,
+                    asset_file.file_size,
+                    captured_at,
+                    state.value,
+                    time.time(),
+                ),
+            )
+
+    def complete(
+        self,
+        unique_id: str,
+        file_size: int,
+        segment_path: str | None = None,
+        segment_offset: int = 0,
+        preview_path: str | None = None,
+    ):
+        """The file is fully on disk, or appended to `segment_path` at `segment_offset`."""
+        query = "UPDATE assets SET file_size = ?, state = ?, updated_at = ?, preview_path = ?"
+        params = [file_size, AssetStateEnum.COMPLETE.value, time.time(), preview_path]
+
+        if segment_path is not None:
+            query += ", path = ?, segment_offset = ?"
+            params += [segment_path, segment_offset]
+
+        with self._lock:
+            self._conn.execute(
+                query + " WHERE unique_id = ? AND state = ?", params + [unique_id, AssetStateEnum.WRITING.value]
+            )
+
+    def set_state(
+        self,
+        unique_ids: list[str],
+        state: AssetStateEnum,
+        path: str | None = None,
+        from_state: AssetStateEnum | None = None,
+    ):
+        """Moves assets to `state`, only the ones currently in `from_state` if given (e.g. a file transferred while
+        it was being uploaded stays transferred). `path` is the new location (e.g. transferred).
+        """
+        query = "UPDATE assets SET state = ?, updated_at = ?"
+        if path is not None:
+            query += ", path = ?"
+        query += " WHERE unique_id = ?"
+        if from_state is not None:
+            query += " AND state = ?"
+
+        now = time.time()
+        params = []
+
+        for unique_id in unique_ids:
+            row = [state.value, now]
+            if path is not None:
+                row.append(path)
+            row.append(unique_id)
+            if from_state is not None:
+                row.append(from_state.value)
+            params.append(row)
+
+        with self._lock:
+            self._conn.executemany(query, params)
+
+    def set_preview_path(self, unique_id: str, preview_path: str):
+        with self._lock:
+            self._conn.execute("UPDATE assets SET preview_path = ? WHERE unique_id = ?", (preview_path, unique_id))
+
+    def mark_registered(self, unique_ids: list[str]):
+        """Registration with the backend only moves completed assets forward, never back."""
+        self.set_state(unique_ids, AssetStateEnum.REGISTERED, from_state=AssetStateEnum.COMPLETE)
+
+    def at_path(self, path: str) -> list[sqlite3.Row]:
+        """Every asset stored at `path`, several for a segment."""
+        with self._lock:
+            return self._conn.execute("SELECT * FROM assets WHERE path = ?", (path,)).fetchall()
+
+    def remove(self, unique_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM assets WHERE unique_id = ?", (unique_id,))
+
+    def in_states(
+        self, states: list[AssetStateEnum], since: float = 0, until: float | None = None, limit: int | None = None
+    ) -> list[sqlite3.Row]:
+        """Assets in any of `states` captured in [since, until), oldest first."""
+        until = time.time() + SECONDS_PER_DAY if until is None else until
+        query = " UNION ALL ".join(
+            "SELECT * FROM assets WHERE state = ? AND captured_at >= ? AND captured_at < ?" for _ in states
+        )
+        params = [value for state in states for value in (state.value, since, until)]
+        query = f"SELECT * FROM ({query}) ORDER BY captured_at"
+
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def untransferred(self, since: float = 0) -> list[sqlite3.Row]:
+        """Assets fully written but still on the device, captured since `since` (epoch seconds)."""
+        return self.in_states(
+            [AssetStateEnum.COMPLETE, AssetStateEnum.REGISTERED, AssetStateEnum.UPLOADED], since=since
+        )
+
+    def eviction_candidates(
+        self,
+        state: AssetStateEnum,
+        directory: str,
+        order_by: str,
+        limit: int,
+        file_type: AssetFileTypeEnum | None = None,
+        exclude_paths: set[str] | frozenset[str] = frozenset(),
+    ) -> list[sqlite3.Row]:
+        """Up to `limit` assets in `state` (of `file_type` if given) stored under `directory` (except
+        `exclude_paths`), in `order_by` order (a retention policy). Every policy order has a (state, ...) index, rows
+        are read in order and the query stops at `limit` instead of sorting every asset in the state.
+        """
+        query = "SELECT * FROM assets WHERE state = ?"
+        params = [state.value]
+
+        if file_type is not None:
+            query += " AND file_type = ?"
+            params.append(file_type.value)
+
+        # the paths under directory/ sort between "directory/" and "directory0" ("0" comes right after "/"). Unary +
+        # keeps the planner on the policy's index instead of assets_path, which would need a sort
+        directory = directory.rstrip("/")
+        excluded = ", ".join("?" for _ in exclude_paths)
+        query += f" AND +path >= ? AND +path < ? AND path NOT IN ({excluded}) ORDER BY {order_by} LIMIT ?"
+        params += [directory + "/", directory + "0", *exclude_paths, limit]
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def bytes_per_day(self, since: float = 0) -> dict[str, int]:
+        """Bytes captured per UTC day (YYYY-MM-DD)."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT date(captured_at, 'unixepoch') AS day, SUM(MAX(file_size, 0)) AS bytes
+                FROM assets WHERE captured_at >= ? GROUP BY day ORDER BY day
+                """,
+                (since,),
+            ).fetchall()
+
+        return {row["day"]: row["bytes"] for row in rows}
+
+    def totals_since(self, since: float) -> dict[str, tuple[int, int, float]]:
+        """Count, bytes and first capture time of the assets captured since `since`, per file type."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT file_type, COUNT(*) AS count, SUM(MAX(file_size, 0)) AS bytes, MIN(captured_at) AS first
+                FROM assets WHERE captured_at >= ? GROUP BY file_type
+                """,
+                (since,),
+            ).fetchall()
+
+        return {row["file_type"]: (row["count"], row["bytes"], row["first"]) for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _epoch(self, timestamp: str) -> float:
+        return datetime.fromisoformat(timestamp).timestamp()
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import deque
+
+# libcamera and pimcamera2 will already be installed in the raspberry pis
+# when working outside a raspberry PI we will use a libcamera and picamera mocks
+try:
+    from picamera2.outputs import Output, PyavOutput
+except ModuleNotFoundError:
+    from .mocks.picamera2 import Output, PyavOutput
+
+ONE_MB = 2**20
+
+
+class PreTriggerOutput(Output):
+    """Encoder output that keeps the last `duration` seconds of encoded H.264 in memory.
+
+    While idle, frames only go into the ring buffer. Once `open` is called the buffer is flushed into the file
+    (starting on a keyframe, with the original timestamps) and the following frames are written live until `close`.
+    Memory is bounded by both `duration` and `max_bytes`, whole GOPs are dropped from the front of the buffer so it
+    always starts on a keyframe. Like picamera2's CircularOutput2, the streams the encoder adds to this output are
+    added again to every file, the muxer needs them before the first packet.
+    """
+
+    def __init__(self, duration: float, max_bytes: int):
+        super().__init__()
+        self.duration = duration
+        self.max_bytes = max_bytes
+
+        # (frame, keyframe, timestamp in microseconds)
+        self._frames: deque[tuple[bytes, bool, int]] = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._file_output: PyavOutput | None = None
+        # frames that arrived while the buffer was being written to the file, they follow it
+        self._flushing: deque[tuple[bytes, bool, int]] | None = None
+        # encoder stream -> (codec name, stream options), as added by the encoder
+        self._streams: dict = {}
+
+    def _add_stream(self, encoder_stream, codec_name, **kwargs):
+        self._streams[encoder_stream] = (codec_name, kwargs)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio:
+            return
+
+        if timestamp is None:
+            timestamp = time.monotonic_ns() // 1000
+
+        with self._lock:
+            if self._file_output is not None:
+                self._file_output.outputframe(frame, keyframe, timestamp)
+                return
+
+            if self._flushing is not None:
+                self._flushing.append((bytes(frame), keyframe, timestamp))
+                return
+
+            if not self._frames and not keyframe:
+                # a flushed file must start with a keyframe, anything before the first one can't be decoded
+                return
+
+            data = bytes(frame)
+            self._frames.append((data, keyframe, timestamp))
+            self._bytes += len(data)
+            self._evict(timestamp)
+
+    def _evict(self, newest_timestamp: int):
+        max_age = self.duration * 1_000_000
+
+        while self._frames and (self._bytes > self.max_bytes or newest_timestamp - self._frames[0][2] > max_age):
+            # drop the oldest GOP, the buffer must keep starting with a keyframe
+            self._pop()
+            while self._frames and not self._frames[0][1]:
+                self._pop()
+
+    def _pop(self):
+        data, _, _ = self._frames.popleft()
+        self._bytes -= len(data)
+
+    def open(self, filename: str):
+        """Flush the buffered frames into `filename` and keep writing live frames into it until `close`."""
+        file_output = PyavOutput(filename)
+        file_output.start()
+        for encoder_stream, (codec_name, kwargs) in self._streams.items():
+            file_output._add_stream(encoder_stream, codec_name, **kwargs)
+
+        with self._lock:
+            frames, self._frames = self._frames, deque()
+            self._bytes = 0
+            self._flushing = deque()
+
+        # written outside the lock (up to max_bytes), the encoder thread only queues its frames meanwhile
+        while True:
+            for data, keyframe, timestamp in frames:
+                file_output.outputframe(data, keyframe, timestamp)
+
+            with self._lock:
+                frames, self._flushing = self._flushing, deque()
+                if not frames:
+                    self._flushing = None
+                    self._file_output = file_output
+                    return
+
+    def close(self):
+        with self._lock:
+            file_output, self._file_output = self._file_output, None
+
+        if file_output is not None:
+            file_output.stop()
+
+    def stop(self):
+        self.close()
+
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+            self._flushing = None
+
+        super().stop()
+
+    def occupancy(self) -> dict:
+        """Buffer usage, used to size `pre_trigger_time` / `pre_trigger_buffer_size` for each device."""
+        with self._lock:
+            seconds = (self._frames[-1][2] - self._frames[0][2]) / 1_000_000 if self._frames else 0.0
+
+            return {
+                "frames": len(self._frames),
+                "bytes": self._bytes,
+                "seconds": round(seconds, 2),
+                "max_bytes": self.max_bytes,
+                "max_seconds": self.duration,
+                "recording": self._file_output is not None or self._flushing is not None,
+            }
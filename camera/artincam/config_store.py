@@ -0,0 +1,55 @@
+import os
+import pathlib
+
+from pydantic import ValidationError
+
+from .logger import logger
+from .schemas import ArtincamPiAgentConfig
+
+
+class ConfigStore:
+    """Last configuration the camera applied, so it can start capturing at boot without waiting for the backend.
+
+    The file is replaced atomically (written to a temporary file, synced, renamed), after a power cut it holds either
+    the previous or the new configuration, never a mix of both.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+
+    def load(self) -> ArtincamPiAgentConfig | None:
+        """The saved configuration, None when there is none or it can't be used (the backend's will be waited for)."""
+        try:
+            return ArtincamPiAgentConfig.model_validate_json(self.path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValidationError) as e:
+            logger.error(f"[ConfigStore] Ignoring saved configuration ({self.path}): {e}")
+            return None
+
+    def save(self, config: ArtincamPiAgentConfig):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+
+        try:
+            with open(tmp_path, "w") as file:
+                file.write(config.model_dump_json(indent=2))
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"[ConfigStore] Failed to save configuration ({self.path}): {e}")
+            return
+
+        # make the rename itself durable, not supported on every platform
+        try:
+            dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        except OSError:
+            return
+
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
@@ -15,9 +15,38 @@ def get_env(name: str, required: bool = False):
 ARTINCAM_AGENT_ID = get_env("ARTINCAM_AGENT_ID", required=True)
 BACKEND_HOST = get_env("BACKEND_HOST", required=True)
 USE_HTTPS = get_env("USE_HTTPS", required=False) == "1"
+# asset files are registered with the backend in batches of up to ASSET_BATCH_SIZE records, a record waits at most
+# ASSET_BATCH_LATENCY seconds before its batch is sent
+ASSET_BATCH_SIZE = int(get_env("ASSET_BATCH_SIZE", required=False) or 20)
+ASSET_BATCH_LATENCY = float(get_env("ASSET_BATCH_LATENCY", required=False) or 5)
+# number of threads running backend callbacks (health logs, asset registration fallbacks, ...)
+BACKEND_WORKERS = int(get_env("BACKEND_WORKERS", required=False) or 3)
+# captured files are uploaded to the backend in the background when enabled, UPLOAD_WORKERS files at a time sharing
+# UPLOAD_BANDWIDTH_KBPS so streaming and health traffic keep some room
+UPLOAD_ENABLED = get_env("UPLOAD_ENABLED", required=False) == "1"
+UPLOAD_WORKERS = int(get_env("UPLOAD_WORKERS", required=False) or 2)
+UPLOAD_BANDWIDTH_KBPS = int(get_env("UPLOAD_BANDWIDTH_KBPS", required=False) or 1024)
+UPLOAD_CHUNK_SIZE_KB = int(get_env("UPLOAD_CHUNK_SIZE_KB", required=False) or 256)
+# the local output directory is kept under RETENTION_HIGH_WATERMARK percent used by evicting assets (in
+# RETENTION_POLICY order: age, size, type:image or type:video) down to RETENTION_LOW_WATERMARK. Only uploaded assets
+# are evicted unless RETENTION_EVICT_UNSAVED is set
+RETENTION_HIGH_WATERMARK = float(get_env("RETENTION_HIGH_WATERMARK", required=False) or 90)
+RETENTION_LOW_WATERMARK = float(get_env("RETENTION_LOW_WATERMARK", required=False) or 80)
+RETENTION_POLICY = get_env("RETENTION_POLICY", required=False) or "age"
+RETENTION_EVICT_UNSAVED = get_env("RETENTION_EVICT_UNSAVED", required=False) == "1"
+# times every module the agent imports and the first frame and capture since process start, the report is logged and
+# written to artincam/config/startup_trace.json
+STARTUP_TRACE = get_env("STARTUP_TRACE", required=False) == "1"
+# metrics (captures, queues, storage, backend latency) are served in the Prometheus text format on
+# http://METRICS_HOST:METRICS_PORT/metrics, 0 disables the endpoint. Only reachable from the Pi itself unless
+# METRICS_HOST is 0.0.0.0
+METRICS_HOST = get_env("METRICS_HOST", required=False) or "127.0.0.1"
+METRICS_PORT = int(get_env("METRICS_PORT", required=False) or 9464)
 
 
 class AgentMessage(Enum):
     CHANGE_MODE = "change_mode"
     CONFIG_UPDATE = "config_update"
+    SAVED_CONFIG = "saved_config"
+    TRIGGER = "trigger"
     EXIT = "exit"
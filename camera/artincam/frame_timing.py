@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from .logger import logger
+from .metrics import FRAME_BUCKETS, registry
+
+# upper bounds of the interval histogram bins, in frame durations (interval / expected frame duration)
+INTERVAL_BINS = (0.5, 0.9, 1.1, 1.5, 2.5)
+INTERVAL_BIN_NAMES = ("<0.5x", "0.5-0.9x", "0.9-1.1x", "1.1-1.5x", "1.5-2.5x", ">2.5x")
+# an interval longer than this many frame durations means the sensor skipped frames
+DROP_THRESHOLD = 1.5
+# clips dropping more than this fraction of their frames are logged as a warning
+DROP_WARNING_RATE = 0.01
+
+FRAMES = registry.counter("artincam_frames_total", "Frames that went through the pre_callback chain.")
+DROPPED = registry.counter(
+    "artincam_frames_dropped_total", "Frames the sensor should have delivered but didn't, from sensor timestamp gaps."
+)
+INTERVAL_SECONDS = registry.histogram(
+    "artincam_frame_interval_seconds",
+    "Time between the sensor timestamps of consecutive frames.",
+    buckets=(0.005, 0.01, 0.02, 0.03, 0.035, 0.04, 0.05, 0.075, 0.1, 0.2, 0.5, 1.0),
+)
+CALLBACK_SECONDS = registry.histogram(
+    "artincam_pre_callback_seconds", "Time each pre_callback takes per frame.", ("callback",), buckets=FRAME_BUCKETS
+)
+
+
+class FrameStats:
+    """Frame timing over a span of frames: a clip, or the analyzer's rolling window."""
+
+    def __init__(self, frame_duration: float, callbacks: tuple[str, ...]):
+        self.frame_duration = frame_duration
+        self.callbacks = callbacks
+
+        self.frames = 0
+        self.dropped = 0
+        self.intervals = 0
+        self.interval_total = 0.0
+        self.interval_max = 0.0
+        self.bins = [0] * (len(INTERVAL_BINS) + 1)
+        self.callback_total = [0.0] * len(callbacks)
+        self.callback_max = [0.0] * len(callbacks)
+
+    def add(self, interval: float | None, dropped: int, bin: int, callback_times: list[float]):
+        self.frames += 1
+        self.dropped += dropped
+
+        if interval is not None:
+            self.intervals += 1
+            self.interval_total += interval
+            self.interval_max = max(self.interval_max, interval)
+            self.bins[bin] += 1
+
+        for i, elapsed in enumerate(callback_times):
+            self.callback_total[i] += elapsed
+            if elapsed > self.callback_max[i]:
+                self.callback_max[i] = elapsed
+
+    def summary(self) -> dict:
+        mean_interval = self.interval_total / self.intervals if self.intervals else None
+        expected = self.frames + self.dropped
+
+        return {
+            "frames": self.frames,
+            "expected_fps": round(1 / self.frame_duration, 2),
+            "measured_fps": round(1 / mean_interval, 2) if mean_interval else None,
+            "dropped": self.dropped,
+            "drop_rate": round(self.dropped / expected, 4) if expected else 0.0,
+            "interval_ms": {
+                "mean": round(mean_interval * 1000, 2) if mean_interval else None,
+                "max": round(self.interval_max * 1000, 2),
+            },
+            "intervals": dict(zip(INTERVAL_BIN_NAMES, self.bins)),
+            "callbacks_ms": {
+                name: {
+                    "mean": round(self.callback_total[i] / self.frames * 1000, 3) if self.frames else 0.0,
+                    "max": round(self.callback_max[i] * 1000, 3),
+                }
+                for i, name in enumerate(self.callbacks)
+            },
+        }
+
+
+class FrameTimingAnalyzer:
+    """pre_callback that runs the camera's frame callbacks (overlay) and measures the frames going through them.
+
+    Intervals come from the sensor timestamps of consecutive requests (SensorTimestamp metadata, nanoseconds), so
+    they show what the sensor delivered and not when python got to it. An interval longer than DROP_THRESHOLD frame
+    durations (`frame_duration`, the FrameDurationLimits the camera was configured with) counts the missing frames as
+    dropped. The time each callback takes is attributed to it by name.
+
+    `stats()` covers the last `window` seconds of frames, clips get their own totals between `start_clip()` and
+    `finish_clip()`. Runs in the camera's request thread, a frame costs a metadata read, a lock and a few additions.
+    """
+
+    def __init__(self, frame_duration: int, callbacks: list[tuple[str, Callable]], window: float = 60.0):
+        self.frame_duration = frame_duration / 1_000_000
+        self.callbacks = list(callbacks)
+        self.callback_names = tuple(name for name, _ in callbacks)
+
+        self._callback_seconds = [CALLBACK_SECONDS.labels(name) for name in self.callback_names]
+        self._previous_timestamp: int | None = None
+        # (interval, dropped, bin, callback times) of the last `window` seconds of frames
+        self._recent = deque(maxlen=max(int(window / self.frame_duration), 1))
+        self._clips: list[FrameStats] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        timestamp = request.get_metadata().get("SensorTimestamp")
+
+        callback_times = []
+        for (_, callback), histogram in zip(self.callbacks, self._callback_seconds):
+            start = time.perf_counter()
+            callback(request)
+            elapsed = time.perf_counter() - start
+            callback_times.append(elapsed)
+            histogram.observe(elapsed)
+
+        self.record(timestamp, callback_times)
+
+    def record(self, timestamp: int | None, callback_times: list[float]):
+        """Adds a frame with its sensor timestamp (nanoseconds, None when the request has none)."""
+        interval, dropped, bin = None, 0, 0
+
+        if timestamp is not None and self._previous_timestamp is not None and timestamp > self._previous_timestamp:
+            interval = (timestamp - self._previous_timestamp) / 1_000_000_000
+            ratio = interval / self.frame_duration
+            bin = next((i for i, bound in enumerate(INTERVAL_BINS) if ratio < bound), len(INTERVAL_BINS))
+
+            if ratio > DROP_THRESHOLD:
+                dropped = round(ratio) - 1
+
+            INTERVAL_SECONDS.observe(interval)
+            if dropped:
+                DROPPED.inc(dropped)
+
+        if timestamp is not None:
+            self._previous_timestamp = timestamp
+
+        FRAMES.inc()
+
+        with self._lock:
+            self._recent.append((interval, dropped, bin, callback_times))
+            for clip in self._clips:
+                clip.add(interval, dropped, bin, callback_times)
+
+    def start_clip(self) -> FrameStats:
+        clip = FrameStats(self.frame_duration, self.callback_names)
+
+        with self._lock:
+            self._clips.append(clip)
+
+        return clip
+
+    def finish_clip(self, clip: FrameStats, name: str = "") -> dict:
+        """Stops counting frames for the clip and returns its summary."""
+        with self._lock:
+            if clip in self._clips:
+                self._clips.remove(clip)
+
+            summary = clip.summary()
+
+        if summary["drop_rate"] > DROP_WARNING_RATE:
+            logger.warning(
+                f"[FrameTiming] {name} dropped {summary['dropped']} frames ({summary['drop_rate']:.1%}), "
+                f"{summary['measured_fps']} fps for {summary['expected_fps']} expected"
+            )
+
+        return summary
+
+    def stats(self) -> dict:
+        """Summary of the rolling window."""
+        stats = FrameStats(self.frame_duration, self.callback_names)
+
+        with self._lock:
+            recent = list(self._recent)
+
+        for frame in recent:
+            stats.add(*frame)
+
+        return stats.summary()
@@ -0,0 +1,198 @@
+import contextlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from queue import Full, Queue
+from typing import Callable
+
+import numpy as np
+
+from .logger import logger
+from .metrics import registry
+from .previews import PreviewBudget, encode_thumbnail
+from .segments import SegmentSlot
+
+DEFAULT_JPEG_QUALITY = 90  # same default picamera2 uses in capture_file
+
+WRITE_SECONDS = registry.histogram("artincam_image_write_seconds", "Time to encode and write one image.")
+DROPPED = registry.counter("artincam_image_writer_dropped_total", "Images dropped because the write queue was full.")
+FAILED = registry.counter("artincam_image_writer_failed_total", "Images that could not be encoded or written.")
+
+
+@dataclass
+class Thumbnail:
+    """Lores frame captured with an image, written to `path` after it."""
+
+    frame: np.ndarray
+    size: tuple[int, int]
+    path: str
+
+
+class ImageWriter:
+    """Bounded worker pool that encodes captured frames to JPEG and writes them to disk.
+
+    The capture thread only copies the frame out of the camera buffer and hands it over, encoding, writing and the
+    stat of the file happen here. When every worker is busy and the queue is full the frame is dropped (and counted)
+    instead of blocking the capture cadence. A frame submitted with a segment slot instead of a file path is appended
+    to that segment. A thumbnail (lores frame) submitted with the image is written after it, when `preview_budget`
+    allows it. A frame that can't be encoded or written is counted, its partial file removed and `on_failed` called.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queued: int = 4,
+        quality: int = DEFAULT_JPEG_QUALITY,
+        preview_budget: PreviewBudget | None = None,
+    ):
+        self.quality = quality
+        self.preview_budget = preview_budget or PreviewBudget()
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+        # each queued frame is a full resolution copy (~8MB at 1640x1232 XBGR), keep the queue short
+        self._queue: Queue[
+            tuple[
+                np.ndarray,
+                str | SegmentSlot,
+                Callable[[int, str | None], None],
+                Thumbnail | None,
+                Callable[[], None] | None,
+            ]
+            | None
+        ] = Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._worker_loop, daemon=True) for _ in range(workers)]
+        registry.gauge("artincam_image_writer_queue_depth", "Images waiting to be written.", fn=self._queue.qsize)
+
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        frame: np.ndarray,
+        output_filepath: str | SegmentSlot,
+        on_written: Callable[[int, str | None], None],
+        thumbnail: Thumbnail | None = None,
+        on_failed: Callable[[], None] | None = None,
+    ) -> bool:
+        """Queue a frame to be written. on_written receives the file size once the file is on disk, and the path of
+        the thumbnail if one was written. on_failed is called instead when the frame couldn't be written.
+
+        Returns False when the queue is full and the frame was dropped.
+        """
+        try:
+            self._queue.put_nowait((frame, output_filepath, on_written, thumbnail, on_failed))
+        except Full:
+            with self._lock:
+                self.dropped += 1
+            DROPPED.inc()
+            logger.error(f"[ImageWriter] Write queue full, dropping image ({self.dropped} dropped so far)")
+            return False
+
+        return True
+
+    def close(self):
+        """Waits for every queued image to be written and stops the workers."""
+        for _ in self._workers:
+            self._queue.put(None)
+
+        for worker in self._workers:
+            worker.join()
+
+    def drain(self):
+        """Waits for every image queued so far to be written (or to fail), the workers keep running."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped, "failed": self.failed}
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is None:
+                    break
+
+                self._handle(*item)
+            finally:
+                # drain() waits on these
+                self._queue.task_done()
+
+    def _handle(
+        self,
+        frame: np.ndarray,
+        output_filepath: str | SegmentSlot,
+        on_written: Callable[[int, str | None], None],
+        thumbnail: Thumbnail | None,
+        on_failed: Callable[[], None] | None,
+    ):
+
+        start = time.perf_counter()
+        try:
+            file_size = self._write(frame, output_filepath)
+        except Exception:
+            logger.exception(f"[ImageWriter] Failed to write image ({output_filepath})")
+            self._failed(output_filepath, on_failed)
+            return
+
+        WRITE_SECONDS.observe(time.perf_counter() - start)
+
+        with self._lock:
+            self.written += 1
+
+        on_written(file_size, self._write_thumbnail(thumbnail) if thumbnail is not None else None)
+
+    def _failed(self, output_filepath: str | SegmentSlot, on_failed: Callable[[], None] | None):
+        with self._lock:
+            self.failed += 1
+        FAILED.inc()
+
+        # a truncated JPEG would look like a capture, a failed segment append is cut off by the segment's recovery
+        if isinstance(output_filepath, str):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(output_filepath)
+
+        if on_failed is not None:
+            on_failed()
+
+    def _write_thumbnail(self, thumbnail: Thumbnail) -> str | None:
+        if not self.preview_budget.allow():
+            return None
+
+        start = time.thread_time()
+        try:
+            data = encode_thumbnail(thumbnail.frame, *thumbnail.size)
+            with open(thumbnail.path, "wb") as file:
+                file.write(data)
+        except Exception:
+            logger.exception(f"[ImageWriter] Failed to write thumbnail ({thumbnail.path})")
+            return None
+        finally:
+            self.preview_budget.spend(time.thread_time() - start)
+
+        return thumbnail.path
+
+    def _write(self, frame: np.ndarray, output_filepath: str | SegmentSlot) -> int:
+        import cv2
+
+        # picamera2's default XBGR8888 format is laid out as [R, G, B, 255] per pixel, opencv expects BGR
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+
+        if isinstance(output_filepath, SegmentSlot):
+            return output_filepath.writer.append(output_filepath, encoded.tobytes()).length
+
+        with open(output_filepath, "wb") as file:
+            file.write(encoded)
+
+        # the size is known from the encoded buffer, no need to stat the file
+        return encoded.nbytes
@@ -1,11 +1,34 @@
 import logging
+import threading
+import time
+from typing import Callable
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# bitrate of an encoder created without one
+DEFAULT_BITRATE = 10_000_000
+# a keyframe is this many times the size of the other frames of its GOP
+KEYFRAME_SIZE_RATIO = 4
+
 
 class Picamera2:
+    """Stand-in for the camera when working outside a raspberry pi.
+
+    Once started, frames are produced on their own thread at the configured resolution and framerate like the sensor
+    does: every frame goes through `pre_callback`, then to the running encoders, then to whoever waits in
+    `capture_request`/`capture_array`. A frame the loop can't produce on time (slow pre_callback, busy machine) is
+    skipped and shows up as a gap in the sensor timestamps. Encoders write packets sized from their bitrate into
+    their outputs, so videos end up the size the real encoder would make them.
+    """
+
+    # buffers frames are drawn into, like the camera's buffer pool
+    BUFFER_COUNT = 4
+
     def __init__(self):
         self.main = None
+        self.lores = None
         self.controls = None
         self.width = None
         self.height = None
@@ -14,61 +37,382 @@ class Picamera2:
 
         self.pre_callback = None
 
+        # optional frame generator, receives the stream name and its config and returns the frame. Tests and
+        # benchmarks use it to feed specific scenes, by default a static noise texture is returned
+        self.frame_source: Callable[[str, dict], np.ndarray] | None = None
+        # moves a square across the default scene, makes the motion detector trigger
+        self.motion = False
+
+        self._scenes: dict[str, np.ndarray] = {}
+        self._buffers: dict[str, list[np.ndarray]] = {}
+        self._request: CompletedRequest | None = None
+        self._sequence = 0
+        self._frame_ready = threading.Condition()
+        self._frame_thread: threading.Thread | None = None
+        # name -> running encoder and its packets
+        self._encoders: dict[str, _EncoderSession] = {}
+        self._encoder_lock = threading.Lock()
+
     def start(self):
         logger.debug("[PICAMERA2] start")
+        if self.started:
+            return
+
         self.started = True
+        self._prepare_buffers()
+        self._frame_thread = threading.Thread(target=self._frame_loop, daemon=True)
+        self._frame_thread.start()
+
+    def capture_request(self) -> "CompletedRequest":
+        if not self.started:
+            # a real camera blocks until the next frame is ready
+            time.sleep(1 / (self.framerate or 30))
+            arrays = {name: self._render(name, stream, 0).copy() for name, stream in self._streams()}
+            return CompletedRequest(arrays=arrays, metadata={"SensorTimestamp": time.monotonic_ns()})
+
+        return self._next_request()
 
     def capture_file(self, filename: str):
-        return
-        logger.debug(f"[PICAMERA2] capture_file ({self.height}, {self.width}) to {filename}")
+        logger.debug(f"[PICAMERA2] capture_file ({self.width}, {self.height}) to {filename}")
+        # only loaded when a file is captured, like the camera's own encoders
+        import cv2
 
-    def start_encoder(self, filename: str):
-        return
-        logger.debug(f"[PICAMERA2] start_encoder ({self.height}, {self.width} at {self.framerate}) to {filename}")
+        cv2.imwrite(filename, self.capture_array("main"))
+
+    def start_encoder(self, encoder=None, output=None, pts=None, quality=None, name=None):
+        name = name or "main"
+        logger.debug(f"[PICAMERA2] start_encoder ({self.width}, {self.height} at {self.framerate}) from {name}")
+        if output is not None:
+            encoder.output = output
+
+        session = _EncoderSession(encoder, self.framerate or 30)
+        session.start()
 
-    def stop_encoder(self):
+        with self._encoder_lock:
+            previous = self._encoders.pop(name, None)
+            self._encoders[name] = session
+
+        if previous is not None:
+            previous.stop()
+
+    def stop_encoder(self, encoders=None):
         logger.debug("[PICAMERA2] stop_encoder")
+        with self._encoder_lock:
+            if encoders is None:
+                stopped = list(self._encoders.values())
+                self._encoders.clear()
+            else:
+                encoders = encoders if isinstance(encoders, (list, tuple)) else [encoders]
+                stopped = [session for session in self._encoders.values() if session.encoder in encoders]
+                self._encoders = {name: session for name, session in self._encoders.items() if session not in stopped}
+
+        for session in stopped:
+            session.stop()
 
     def stop(self):
         logger.debug("[PICAMERA2] stop")
         self.started = False
 
+        if self._frame_thread is not None:
+            self._frame_thread.join()
+            self._frame_thread = None
+
+        with self._frame_ready:
+            self._request = None
+            self._frame_ready.notify_all()
+
     def close(self):
         logger.debug("[PICAMERA2] close")
 
-    def create_video_configuration(self, main=None, controls=None, transform=None):
+    def capture_array(self, name: str = "main") -> np.ndarray:
+        request = self.capture_request()
+        try:
+            return request.make_array(name)
+        finally:
+            request.release()
+
+    def create_video_configuration(self, main=None, lores=None, controls=None, transform=None):
         main = main or {}
         controls = controls or {}
-        return {"main": main, "controls": controls, "transform": transform}
+        return {"main": main, "lores": lores, "controls": controls, "transform": transform}
 
     def configure(self, config):
         self.main = config["main"]
-        self.height = self.main.get("size", [640, 480])[0]
-        self.width = self.main.get("size", [640, 480])[1]
+        self.lores = config.get("lores")
+        self.width, self.height = self.main.get("size", (640, 480))
 
         self.controls = config["controls"]
         self.framerate = 1_000_000 / self.controls.get("FrameDurationLimits", (33_333, 33_333))[0]
+        self._scenes = {}
+
+    # ----- FRAME LOOP -----
+    def _frame_loop(self):
+        frame_duration = 1 / self.framerate
+        next_frame = time.monotonic()
+        index = 0
+
+        while self.started:
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > frame_duration:
+                # fell behind, the sensor drops the frames it had no free buffer for
+                next_frame += int(-delay / frame_duration) * frame_duration
+
+            timestamp = int(next_frame * 1_000_000_000)
+            request = CompletedRequest(
+                arrays={name: self._fill(name, stream, index) for name, stream in self._streams()},
+                metadata={"SensorTimestamp": timestamp, "FrameDuration": int(frame_duration * 1_000_000)},
+            )
+
+            if self.pre_callback is not None:
+                try:
+                    self.pre_callback(request)
+                except Exception:
+                    logger.exception("[PICAMERA2] pre_callback failed")
+
+            with self._encoder_lock:
+                for session in self._encoders.values():
+                    session.encode(timestamp // 1000)
+
+            with self._frame_ready:
+                self._request = request
+                self._sequence += 1
+                self._frame_ready.notify_all()
+
+            next_frame += frame_duration
+            index += 1
+
+    def _next_request(self) -> "CompletedRequest":
+        with self._frame_ready:
+            sequence = self._sequence
+            # a few frames worth of waiting, the loop may have been stopped meanwhile
+            self._frame_ready.wait_for(lambda: self._sequence != sequence or not self.started, timeout=1)
+            request = self._request
+
+        if request is None:
+            # stopped while waiting, hand out a frame like a stopped camera's last buffer
+            return CompletedRequest(
+                arrays={name: self._render(name, stream, 0).copy() for name, stream in self._streams()},
+                metadata={"SensorTimestamp": time.monotonic_ns()},
+            )
+
+        return request
+
+    def _streams(self) -> list[tuple[str, dict]]:
+        streams = [("main", self.main or {})]
+        if self.lores is not None:
+            streams.append(("lores", self.lores))
+        return streams
+
+    def _prepare_buffers(self):
+        self._buffers = {
+            name: [np.empty_like(self._render(name, stream, 0)) for _ in range(self.BUFFER_COUNT)]
+            for name, stream in self._streams()
+        }
+
+    def _fill(self, name: str, stream: dict, index: int) -> np.ndarray:
+        """Draws frame `index` into the next buffer of the pool, the camera overwrites its buffers the same way."""
+        buffer = self._buffers[name][index % self.BUFFER_COUNT]
+        np.copyto(buffer, self._render(name, stream, index))
+        return buffer
+
+    def _render(self, name: str, stream: dict, index: int) -> np.ndarray:
+        if self.frame_source is not None:
+            return self.frame_source(name, stream)
+
+        scene = self._scenes.get(name)
+        if scene is None:
+            scene = self._scenes[name] = _noise_scene(stream)
+
+        if not self.motion:
+            return scene
+
+        # a square crossing the frame in about two seconds, on the luma plane only for YUV420
+        width, height = stream.get("size", (640, 480))
+        frame = scene.copy()
+        side = max(height // 4, 1)
+        x = int(index * width / (2 * (self.framerate or 30))) % max(width - side, 1)
+        y = (height - side) // 2
+        frame[y : y + side, x : x + side] = 255
+        return frame
+
+
+def _noise_scene(stream: dict) -> np.ndarray:
+    """A textured gray frame in the stream's format, noise compresses like a real scene where a flat frame doesn't."""
+    width, height = stream.get("size", (640, 480))
+    rng = np.random.default_rng(0)
+
+    if stream.get("format") == "YUV420":
+        frame = np.full((height * 3 // 2, width), 128, dtype=np.uint8)
+        frame[:height] = rng.integers(96, 160, (height, width), dtype=np.uint8)
+        return frame
+
+    frame = rng.integers(96, 160, (height, width, 4), dtype=np.uint8)
+    frame[..., 3] = 255
+    return frame
+
+
+class _EncoderSession:
+    """A running encoder: packets of the size its bitrate gives, a keyframe every `iperiod` frames."""
+
+    def __init__(self, encoder: "H264Encoder", camera_framerate: float):
+        self.encoder = encoder
+        outputs = encoder.output
+        self.outputs = list(outputs) if isinstance(outputs, (list, tuple)) else [outputs]
+
+        framerate = encoder.framerate or camera_framerate
+        gop = encoder.iperiod or max(int(framerate), 1)
+        # the GOP averages to the bitrate: one keyframe KEYFRAME_SIZE_RATIO times the size of each other frame
+        frame_size = (encoder.bitrate or DEFAULT_BITRATE) / 8 / framerate * gop / (gop - 1 + KEYFRAME_SIZE_RATIO)
+        self._frame = bytes(int(frame_size))
+        self._keyframe = bytes(int(frame_size * KEYFRAME_SIZE_RATIO))
+        self._gop = gop
+        self._frames = 0
+        self._framerate = framerate
+
+    def start(self):
+        # like the real encoders: outputs are started, then told about the stream the packets belong to
+        for output in self.outputs:
+            output.start()
+            output._add_stream("video", "h264", rate=self._framerate)
+
+    def encode(self, timestamp: int):
+        keyframe = self._frames % self._gop == 0
+        packet = self._keyframe if keyframe else self._frame
+        self._frames += 1
+
+        for output in self.outputs:
+            output.outputframe(packet, keyframe, timestamp)
+
+    def stop(self):
+        for output in self.outputs:
+            output.stop()
+
+
+class CompletedRequest:
+    def __init__(self, arrays: dict | None = None, metadata: dict | None = None):
+        self.arrays = arrays or {}
+        self.metadata = metadata or {}
+
+    def make_array(self, name: str):
+        # a copy, like the real request: the buffer goes back to the camera on release
+        return self.arrays[name].copy()
+
+    def get_metadata(self):
+        return self.metadata
+
+    def release(self):
+        return
 
 
 class MappedArray:
-    pass
+    def __init__(self, request: CompletedRequest, stream: str):
+        self.request = request
+        self.stream = stream
+        self.array = None
+
+    def __enter__(self):
+        # the buffer itself, drawing into it changes the frame
+        self.array = self.request.arrays[self.stream]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.array = None
 
 
 class H264Encoder:
-    def __init__(self, bitrate: int | None, framerate: int = None, enable_sps_framerate: bool = False):
+    def __init__(
+        self,
+        bitrate: int | None,
+        framerate: int = None,
+        enable_sps_framerate: bool = False,
+        iperiod: int | None = None,
+    ):
         self.bitrate = bitrate
         self.framerate = framerate
         self.enable_sps_framerate = enable_sps_framerate
+        self.iperiod = iperiod
         self.output = []
 
 
-class FfmpegOutput:
+class Output:
+    def __init__(self, pts=None):
+        self.recording = False
+
+    def start(self):
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        return
+
+    def _add_stream(self, encoder_stream, codec_name, **kwargs):
+        return
+
+
+class _FileOutput(Output):
+    """Writes the encoded packets to a file, without muxing: the size is right, the file doesn't play."""
+
+    def __init__(self):
+        super().__init__()
+        self._file = None
+
+    def filename(self) -> str | None:
+        raise NotImplementedError
+
+    def start(self):
+        super().start()
+        filename = self.filename()
+        if filename and "://" not in filename:
+            self._file = open(filename, "wb")
+
+    def stop(self):
+        super().stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if self._file is not None and not audio:
+            self._file.write(frame)
+
+
+class FfmpegOutput(_FileOutput):
     def __init__(self, output: str):
+        super().__init__()
         self.output = output
         self.output_filename = ""
 
+    def filename(self) -> str | None:
+        return self.output_filename or self.output
+
+
+class PyavOutput(_FileOutput):
+    """Muxes like the real one: a packet for a stream the encoder never added (`_add_stream`) fails."""
 
-class PyavOutput:
-    def __init__(self, rstp_address: str, format: str):
+    def __init__(self, rstp_address: str, format: str | None = None):
+        super().__init__()
         self.rstp_address = rstp_address
         self.format = format
+        self._streams = {}
+
+    def start(self):
+        self._streams = {}
+        super().start()
+
+    def _add_stream(self, encoder_stream, codec_name, **kwargs):
+        if not self.recording:
+            raise RuntimeError("PyavOutput: streams can only be added to a started output")
+        self._streams[encoder_stream] = codec_name
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if self.recording and not audio and "video" not in self._streams:
+            raise RuntimeError("PyavOutput: no video stream in the container, _add_stream was never called")
+        super().outputframe(frame, keyframe, timestamp, packet, audio)
+
+    def filename(self) -> str | None:
+        # streams go nowhere
+        return None if self.format == "rtsp" else self.rstp_address
@@ -0,0 +1,65 @@
+import numpy as np
+
+LORES_WIDTH = 320
+
+
+def lores_size(width: int, height: int) -> tuple[int, int]:
+    """Small stream size with the main stream's aspect ratio. YUV420 needs even dimensions."""
+    lores_height = int(LORES_WIDTH * height / width) // 2 * 2
+    return LORES_WIDTH, max(lores_height, 2)
+
+
+def luma(frame: np.ndarray, height: int) -> np.ndarray:
+    """Grayscale view of a lores frame. YUV420 frames are (height * 3 / 2, width), the first rows are the Y plane."""
+    if frame.ndim == 3:
+        # BGR/XBGR frames (mocks or non-YUV streams), average of the color channels is good enough to detect motion
+        return frame[..., :3].mean(axis=2, dtype=np.float32)
+
+    return frame[:height]
+
+
+class MotionDetector:
+    """Detects activity by comparing downscaled grayscale frames against a running background model.
+
+    sensitivity goes from 1 (only big/strong changes trigger) to 100 (small/subtle changes trigger). It maps to the
+    per-pixel difference threshold and to the minimum fraction of the frame that has to change.
+    """
+
+    # per-pixel grayscale difference needed to count a pixel as changed, for sensitivity 1 and 100
+    MAX_THRESHOLD = 60
+    MIN_THRESHOLD = 8
+    # fraction of the (downscaled) frame that has to change, for sensitivity 1 and 100
+    MAX_AREA = 0.05
+    MIN_AREA = 0.001
+
+    def __init__(self, sensitivity: int = 50, downscale: int = 2, learning_rate: float = 0.05):
+        ratio = (min(max(sensitivity, 1), 100) - 1) / 99
+
+        self.threshold = self.MAX_THRESHOLD - ratio * (self.MAX_THRESHOLD - self.MIN_THRESHOLD)
+        self.min_area = self.MAX_AREA - ratio * (self.MAX_AREA - self.MIN_AREA)
+        self.downscale = downscale
+        self.learning_rate = learning_rate
+
+        self.last_area = 0.0
+        self._background: np.ndarray | None = None
+
+    def reset(self):
+        self._background = None
+        self.last_area = 0.0
+
+    def update(self, gray: np.ndarray) -> bool:
+        """Feed a grayscale frame, returns True when the changed area is over the configured minimum."""
+        frame = gray[:: self.downscale, :: self.downscale].astype(np.float32)
+
+        if self._background is None or self._background.shape != frame.shape:
+            self._background = frame
+            self.last_area = 0.0
+            return False
+
+        changed = np.abs(frame - self._background) > self.threshold
+        self.last_area = np.count_nonzero(changed) / changed.size
+
+        # running average background, slowly adapts to light changes (clouds, sunrise) and leaves moving things out
+        self._background += self.learning_rate * (frame - self._background)
+
+        return self.last_area >= self.min_area
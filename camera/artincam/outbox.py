@@ -0,0 +1,262 @@
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable
+
+from .backend_service import BackendService
+from .logger import logger
+from .schemas import ActionLog, AssetFile
+
+
+class EventKind:
+    ASSET_FILE = "asset_file"
+    ACTION_LOG = "action_log"
+
+
+class Outbox:
+    """Durable, ordered store of events waiting to be sent to the backend (SQLite, survives restarts).
+
+    Each event has an idempotency key (the asset file unique_id, or a random id for action logs), adding the same
+    key twice keeps a single event. Events are only removed once the backend accepted them. Pending events stay on
+    disk, only a batch at a time is loaded in memory, their count is kept in memory. When more than `max_events` are
+    pending (long outage), the oldest action logs are dropped first, then the oldest events.
+    """
+
+    def __init__(self, path: pathlib.Path, max_events: int = 200_000):
+        self.path = path
+        self.max_events = max_events
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL + NORMAL: a commit is one sequential append, a power cut can lose the last commits but never corrupts
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        # counted once, then kept up to date by every insert and delete so adding an event never scans the table
+        self._pending = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def put_asset_file(self, asset_file: AssetFile):
+        self._put(EventKind.ASSET_FILE, asset_file.unique_id, asset_file.model_dump_json())
+
+    def put_action_log(self, action_log: ActionLog):
+        self._put(EventKind.ACTION_LOG, str(uuid.uuid4()), action_log.model_dump_json())
+
+    def _put(self, kind: str, key: str, payload: str):
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (kind, idempotency_key, payload, created_at) VALUES (?, ?, ?, ?)",
+                (kind, key, payload, time.time()),
+            ).rowcount
+
+            if not inserted:
+                # an event re-added with the same key (e.g. size updated) replaces the pending one but keeps its
+                # position
+                self._conn.execute("UPDATE outbox SET payload = ? WHERE idempotency_key = ?", (payload, key))
+                return
+
+            self._pending += 1
+            if self._pending > self.max_events:
+                self._trim()
+
+    def _trim(self):
+        excess = self._pending - self.max_events
+
+        for kind_filter in ("WHERE kind = 'action_log'", ""):
+            if excess <= 0:
+                break
+
+            deleted = self._conn.execute(
+                f"DELETE FROM outbox WHERE id IN (SELECT id FROM outbox {kind_filter} ORDER BY id LIMIT ?)", (excess,)
+            ).rowcount
+            excess -= deleted
+            self.dropped += deleted
+            self._pending -= deleted
+
+        logger.error(f"[Outbox] More than {self.max_events} events pending, dropped oldest ({self.dropped} so far)")
+
+    def peek(self, limit: int) -> list[tuple[int, str, str, int]]:
+        """Oldest pending events as (id, kind, payload, attempts)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, kind, payload, attempts FROM outbox ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+    def remove(self, ids: list[int]):
+        if not ids:
+            return
+
+        with self._lock:
+            self._pending -= self._conn.executemany(
+                "DELETE FROM outbox WHERE id = ?", [(event_id,) for event_id in ids]
+            ).rowcount
+
+    def record_attempt(self, event_id: int):
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", (event_id,))
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def stats(self) -> dict:
+        return {"pending": self.pending(), "dropped": self.dropped}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxSender:
+    """Sends outbox events to the backend in order.
+
+    Sending starts once `max_batch_size` events are pending or `max_latency` seconds after the first one was added,
+    consecutive asset files go in one bulk call. While the backend is unreachable nothing is removed, sending resumes
+    (in bulk) once it answers again. An event the backend keeps rejecting is dropped after `max_attempts` so it can't
+    block the ones behind it. `on_asset_files_sent` receives the unique ids of the asset files the backend accepted.
+    """
+
+    RETRY_INTERVAL = 10.0
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        backend_client: BackendService,
+        max_batch_size: int = 20,
+        max_latency: float = 5.0,
+        max_attempts: int = 10,
+        on_asset_files_sent: Callable[[list[str]], None] | None = None,
+    ):
+        self.outbox = outbox
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_latency = max_latency
+        self.max_attempts = max_attempts
+        self.on_asset_files_sent = on_asset_files_sent
+
+        self._backend_client = backend_client
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._send_loop, daemon=True)
+        self._thread.start()
+
+    def add_asset_file(self, asset_file: AssetFile):
+        self.outbox.put_asset_file(asset_file)
+        self._wake.set()
+
+    def add_action_log(self, action_log: ActionLog):
+        self.outbox.put_action_log(action_log)
+        self._wake.set()
+
+    def close(self):
+        """Tries to send what is pending one last time and stops. Anything unsent stays in the outbox."""
+        self._closing.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _send_loop(self):
+        while not self._closing.is_set():
+            # replay anything left from a previous run first, then wait for new events
+            if not self.outbox.pending():
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            if self.outbox.pending() < self.max_batch_size:
+                # let a batch build up, a full batch (or closing) wakes us early
+                deadline = time.monotonic() + self.max_latency
+                while not self._closing.is_set() and self.outbox.pending() < self.max_batch_size:
+                    if not self._wake.wait(timeout=max(deadline - time.monotonic(), 0)):
+                        break
+                    self._wake.clear()
+
+            if not self._flush():
+                # backend unreachable, keep everything and try again later
+                self._closing.wait(timeout=self.RETRY_INTERVAL)
+
+        self._flush()
+
+    def _flush(self) -> bool:
+        """Sends pending events in order until the outbox is empty. Returns False if the backend is unreachable."""
+        while events := self.outbox.peek(self.max_batch_size):
+            # events go out in order: a run of asset files in bulk, an action log on its own
+            run = []
+            for event in events:
+                if event[1] != events[0][1] or (event[1] == EventKind.ACTION_LOG and run):
+                    break
+                run.append(event)
+
+            if run[0][1] == EventKind.ASSET_FILE:
+                sent = self._send_asset_files(run)
+            else:
+                sent = self._send_action_log(run[0])
+
+            if not sent:
+                return False
+
+        return True
+
+    def _send_asset_files(self, events: list[tuple[int, str, str, int]]) -> bool:
+        asset_files = [AssetFile.model_validate_json(payload) for _, _, payload, _ in events]
+        created_ids = self._backend_client.create_asset_files(asset_files) or {}
+        sent = []
+        sent_unique_ids = []
+        reachable = True
+
+        for (event_id, _, _, attempts), asset_file in zip(events, asset_files):
+            if asset_file.unique_id not in created_ids:
+                # bulk not supported/failed, fall back to a single create. unique_id makes the retry idempotent
+                response = self._backend_client.create_asset_file(asset_file)
+
+                if response is None:
+                    if not self._record_failure(event_id, attempts, f"asset file {asset_file.unique_id}"):
+                        reachable = False
+                        break
+                    continue
+
+            sent.append(event_id)
+            sent_unique_ids.append(asset_file.unique_id)
+
+        self.outbox.remove(sent)
+
+        if sent_unique_ids and self.on_asset_files_sent is not None:
+            self.on_asset_files_sent(sent_unique_ids)
+
+        return reachable
+
+    def _send_action_log(self, event: tuple[int, str, str, int]) -> bool:
+        event_id, _, payload, attempts = event
+
+        if self._backend_client.create_action_log(ActionLog.model_validate_json(payload)) is None:
+            return self._record_failure(event_id, attempts, "action log")
+
+        self.outbox.remove([event_id])
+        return True
+
+    def _record_failure(self, event_id: int, attempts: int, description: str) -> bool:
+        """Returns False to stop sending for now, True to carry on with the next event.
+
+        Only rejections from a reachable backend count as attempts, an outage never gets events dropped.
+        """
+        if self._backend_client.circuit_breaker.failures > 0:
+            return False
+
+        if attempts + 1 >= self.max_attempts:
+            logger.error(f"[OutboxSender] Backend keeps rejecting {description}, dropping it")
+            self.outbox.remove([event_id])
+            return True
+
+        self.outbox.record_attempt(event_id)
+        return False
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+
+# libcamera and pimcamera2 will already be installed in the raspberry pis
+# when working outside a raspberry PI we will use a libcamera and picamera mocks
+try:
+    from picamera2 import MappedArray
+except ModuleNotFoundError:
+    from .mocks.picamera2 import MappedArray
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %X"
+
+
+class TimestampOverlay:
+    """Draws the current timestamp on the bottom right corner of every frame of a stream.
+
+    Rendering text with opencv on every full resolution frame is expensive, the text only changes once per second
+    so the patch (background box + text) is rendered once per second into a small tile and then copied into the frame
+    with a single slice assignment.
+    """
+
+    text_color = (255, 255, 255)  # color - white
+    bg_color = (0, 0, 0)  # color - black
+    padding = 5
+    scale = 1
+    thickness = 2
+
+    def __init__(self, width: int, height: int, stream: str = "main", opaque_background: bool = True):
+        # opencv is only loaded once an overlay is used, it is one of the slowest imports of the agent
+        import cv2
+
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self._stream = stream
+        self._opaque_background = opaque_background
+
+        x_axis_location = width - 400
+        y_axis_location = height - 50
+
+        (text_width, text_height), _ = cv2.getTextSize(
+            time.strftime(TIMESTAMP_FORMAT), self.font, self.scale, self.thickness
+        )
+
+        # patch boundaries in frame coordinates (end exclusive), clipped so small resolutions don't break the slicing
+        self._x0 = max(x_axis_location - self.padding, 0)
+        self._y0 = max(y_axis_location - text_height - self.padding, 0)
+        self._x1 = min(x_axis_location + text_width + self.padding + 1, width)
+        self._y1 = min(y_axis_location + self.padding + 1, height)
+
+        # text origin relative to the tile
+        self._origin = (x_axis_location - self._x0, y_axis_location - self._y0)
+
+        self._tile: np.ndarray | None = None
+        self._mask: np.ndarray | None = None
+        self._tile_second: int | None = None
+
+    def apply(self, request):
+        """pre_callback entrypoint, draws the cached timestamp tile in the request's stream."""
+        with MappedArray(request, self._stream) as m:
+            self.blit(m.array)
+
+    def blit(self, image: np.ndarray):
+        now = time.time()
+        second = int(now)
+
+        if self._tile is None or second != self._tile_second or self._tile.dtype != image.dtype:
+            self._render(image, now)
+            self._tile_second = second
+
+        region = image[self._y0 : self._y1, self._x0 : self._x1]
+
+        if self._mask is None:
+            region[...] = self._tile
+        else:
+            np.copyto(region, self._tile, where=self._mask)
+
+    def _render(self, image: np.ndarray, now: float):
+        """Render the patch for the given time. Tile matches the frame channels (XBGR8888 frames have 4)."""
+        import cv2
+
+        shape = (self._y1 - self._y0, self._x1 - self._x0) + image.shape[2:]
+
+        tile = np.empty(shape, dtype=image.dtype)
+        cv2.rectangle(tile, (0, 0), (shape[1] - 1, shape[0] - 1), self.bg_color, cv2.FILLED)
+        cv2.putText(
+            tile,
+            time.strftime(TIMESTAMP_FORMAT, time.localtime(now)),
+            self._origin,
+            self.font,
+            self.scale,
+            self.text_color,
+            self.thickness,
+        )
+        self._tile = tile
+
+        if self._opaque_background:
+            # background box covers the whole tile, so a plain copy is enough
+            self._mask = None
+        else:
+            # only the text glyphs are copied, the mask is built here once per second instead of on every frame
+            glyphs = tile != self.bg_color[0]
+            self._mask = glyphs.any(axis=-1, keepdims=True) if tile.ndim == 3 else glyphs
@@ -0,0 +1,87 @@
+import os
+import pathlib
+import threading
+import time
+
+import numpy as np
+
+THUMBNAIL_QUALITY = 70
+# low resolution proxy clips only need to be watchable while browsing
+PROXY_BITRATE = 500_000
+
+
+def thumbnail_path(asset_path: str) -> str:
+    path = pathlib.Path(asset_path)
+    return str(path.with_name(f"{path.stem}_thumb.jpg"))
+
+
+def proxy_path(asset_path: str) -> str:
+    path = pathlib.Path(asset_path)
+    return str(path.with_name(f"{path.stem}_proxy.mp4"))
+
+
+def encode_thumbnail(lores_frame: np.ndarray, width: int, height: int) -> bytes:
+    """JPEG of a lores frame. YUV420 frames are (height * 3 / 2, stride), rows may be padded past `width`."""
+    import cv2
+
+    if lores_frame.ndim == 3:
+        # BGR/XBGR frames (mocks or non-YUV streams)
+        frame = cv2.cvtColor(lores_frame, cv2.COLOR_RGBA2BGR) if lores_frame.shape[2] == 4 else lores_frame
+    else:
+        frame = cv2.cvtColor(lores_frame, cv2.COLOR_YUV2BGR_I420)[:height, :width]
+
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+
+    if not ok:
+        raise ValueError("Thumbnail encoding failed")
+
+    return encoded.tobytes()
+
+
+class PreviewBudget:
+    """Decides whether a preview is worth making right now, so browsing aids never compete with captures.
+
+    Previews are skipped while the load average is over `max_load` per CPU, and once the thumbnails of the last
+    `window` seconds took more than `budget` of it (e.g. 0.1 = 10% of one core).
+    """
+
+    def __init__(self, budget: float = 0.1, window: float = 10.0, max_load: float = 1.0):
+        self.budget = budget
+        self.window = window
+        self.max_load = max_load * (os.cpu_count() or 1)
+
+        self.generated = 0
+        self.skipped = 0
+
+        self._spent = 0.0
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._spent = 0.0
+                self._window_start = now
+
+            allowed = self._spent < self.budget * self.window and self._load() < self.max_load
+
+            if not allowed:
+                self.skipped += 1
+
+            return allowed
+
+    def spend(self, seconds: float):
+        with self._lock:
+            self._spent += seconds
+            self.generated += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"generated": self.generated, "skipped": self.skipped}
+
+    def _load(self) -> float:
+        try:
+            return os.getloadavg()[0]
+        except OSError:
+            return 0.0
@@ -0,0 +1,262 @@
+import threading
+import time
+from datetime import date, datetime
+from datetime import time as dt_time
+from typing import Callable
+
+import numpy as np
+
+from .catalog import AssetCatalog
+from .image_writer import DEFAULT_JPEG_QUALITY
+from .logger import logger
+from .motion import luma
+from .schemas import AssetFileTypeEnum
+
+SECONDS_PER_DAY = 86400
+
+
+class QualityController:
+    """Picks the video bitrate and JPEG quality so the free space of the destination lasts until `until`.
+
+    Every `INTERVAL` seconds the free space (destination tier) is divided by the days left into a daily budget, and
+    compared to the bytes per day the current capture rate would produce at each candidate setting. Bytes per asset
+    are measured from every asset written: video sizes scale with the bitrate, image sizes with the size of the
+    current lores frame encoded at the candidate quality, so a busy scene (high variance) costs more per image than a
+    dark or flat one. The highest setting whose forecast fits the budget wins, bitrate and quality go down together
+    from (`max_bitrate`, `max_quality`) to a fraction of it. Decisions are logged and passed to `on_decision` only
+    when they change a setting, the camera applies them between clips.
+    """
+
+    INTERVAL = 300.0
+    # capture rate is measured over the last day of assets, and only once at least MIN_SPAN seconds are covered
+    WINDOW = SECONDS_PER_DAY
+    MIN_SPAN = 600.0
+    # weight of the latest asset in the bytes per asset averages
+    SMOOTHING = 0.2
+    MIN_BITRATE_RATIO = 0.125
+    MIN_QUALITY = 50
+    QUALITY_STEP = 5
+    # candidate settings, from the configured maximum (1.0) down to the minimum (0.0)
+    LEVELS = 20
+    # bitrate changes smaller than this are not worth a log entry
+    HYSTERESIS = 0.1
+
+    def __init__(
+        self,
+        catalog: AssetCatalog,
+        free_space: Callable[[], int | None],
+        on_decision: Callable[[dict], None] | None = None,
+    ):
+        self.free_space = free_space
+        self.on_decision = on_decision
+
+        self.until: date | None = None
+        self.max_bitrate = 0
+        self.max_quality = DEFAULT_JPEG_QUALITY
+        self.bitrate = 0
+        self.quality = DEFAULT_JPEG_QUALITY
+        self.last_decision: dict | None = None
+
+        # bytes per bit/s of bitrate per video, bytes per lores JPEG byte per image
+        self._video_ratio: float | None = None
+        self._image_ratio: float | None = None
+        self._scene: np.ndarray | None = None
+        self._scene_sizes: dict[int, int] = {}
+
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._controller_loop, daemon=True)
+        self._thread.start()
+
+    def configure(self, until: date | None, max_bitrate: int, max_quality: int = DEFAULT_JPEG_QUALITY):
+        """Sets the date the storage has to last until (None disables the controller) and the highest settings."""
+        with self._lock:
+            if (until, max_bitrate, max_quality) == (self.until, self.max_bitrate, self.max_quality):
+                # other settings changed, the current decision still holds
+                return
+
+            self.until = until
+            self.max_bitrate = max_bitrate
+            self.max_quality = max_quality
+            self.bitrate = max_bitrate
+            self.quality = max_quality
+            self.last_decision = None
+
+        self._wake.set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.until is not None
+
+    def observe_scene(self, lores_frame: np.ndarray, height: int):
+        """Latest lores frame, its luma is what image sizes are forecast from."""
+        scene = np.ascontiguousarray(luma(lores_frame, height), dtype=np.uint8)
+
+        with self._lock:
+            self._scene = scene
+            self._scene_sizes = {}
+
+    def observe_asset(self, file_type: AssetFileTypeEnum, file_size: int, setting: int):
+        """An asset was written with `setting` (bitrate for videos, JPEG quality for images)."""
+        if file_size <= 0 or setting <= 0:
+            return
+
+        if file_type == AssetFileTypeEnum.VIDEO:
+            ratio = file_size / setting
+        else:
+            scene_size = self._scene_size(setting)
+            if not scene_size:
+                return
+            ratio = file_size / scene_size
+
+        with self._lock:
+            current = self._video_ratio if file_type == AssetFileTypeEnum.VIDEO else self._image_ratio
+            ratio = ratio if current is None else current + self.SMOOTHING * (ratio - current)
+
+            if file_type == AssetFileTypeEnum.VIDEO:
+                self._video_ratio = ratio
+            else:
+                self._image_ratio = ratio
+
+    def wake(self):
+        self._wake.set()
+
+    def close(self):
+        self._closing.set()
+        self._wake.set()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "until": self.until.isoformat() if self.until else None,
+                "bitrate": self.bitrate,
+                "quality": self.quality,
+                "last_decision": self.last_decision,
+            }
+
+    def _controller_loop(self):
+        while not self._closing.is_set():
+            if self.enabled:
+                try:
+                    self._decide()
+                except Exception:
+                    logger.exception("[QualityController] Decision failed")
+
+            self._wake.wait(timeout=self.INTERVAL)
+            self._wake.clear()
+
+    def _decide(self):
+        with self._lock:
+            until, max_bitrate, max_quality = self.until, self.max_bitrate, self.max_quality
+            video_ratio, image_ratio = self._video_ratio, self._image_ratio
+            scene = self._scene
+
+        free = self.free_space()
+        now = time.time()
+        rates = self._capture_rates(now)
+
+        if free is None or rates is None:
+            return
+
+        end = datetime.combine(until, dt_time.max).timestamp()
+        days_left = max((end - now) / SECONDS_PER_DAY, 1 / 24)
+        budget = free / days_left
+        videos_per_day, images_per_day = rates
+
+        def forecast(bitrate: int, quality: int) -> float:
+            total = 0.0
+            if videos_per_day and video_ratio is not None:
+                total += videos_per_day * video_ratio * bitrate
+            if images_per_day and image_ratio is not None:
+                total += images_per_day * image_ratio * (self._scene_size(quality) or 0)
+            return total
+
+        # highest level that fits, the lowest one when none does
+        for level in range(self.LEVELS, -1, -1):
+            bitrate, quality = self._settings(level / self.LEVELS, max_bitrate, max_quality)
+            demand = forecast(bitrate, quality)
+            if demand <= budget:
+                break
+
+        decision = {
+            "until": until.isoformat(),
+            "days_left": round(days_left, 2),
+            "free": free,
+            "budget_per_day": int(budget),
+            "forecast_per_day": int(demand),
+            "videos_per_day": round(videos_per_day, 1),
+            "images_per_day": round(images_per_day, 1),
+            "scene_variance": round(float(scene.var()), 1) if scene is not None else None,
+            "bitrate": bitrate,
+            "quality": quality,
+            "fits": demand <= budget,
+        }
+
+        with self._lock:
+            if self.until != until:
+                # reconfigured while deciding
+                return
+
+            changed = quality != self.quality or abs(bitrate - self.bitrate) > self.HYSTERESIS * self.bitrate
+            self.last_decision = decision
+
+            if not changed:
+                return
+
+            self.bitrate = bitrate
+            self.quality = quality
+
+        logger.info(f"[QualityController] {decision}")
+
+        if not decision["fits"]:
+            logger.warning(f"[QualityController] Storage won't last until {until} even at the lowest settings")
+
+        if self.on_decision is not None:
+            self.on_decision(decision)
+
+    def _settings(self, level: float, max_bitrate: int, max_quality: int) -> tuple[int, int]:
+        min_bitrate = max_bitrate * self.MIN_BITRATE_RATIO
+        bitrate = int(min_bitrate + level * (max_bitrate - min_bitrate))
+        min_quality = min(self.MIN_QUALITY, max_quality)
+        quality = min_quality + level * (max_quality - min_quality)
+        quality = min(int(round(quality / self.QUALITY_STEP) * self.QUALITY_STEP), max_quality)
+        return bitrate, max(quality, min_quality)
+
+    def _capture_rates(self, now: float) -> tuple[float, float] | None:
+        """Videos and images captured per day over the last WINDOW, None until enough of it is covered."""
+        totals = self._catalog.totals_since(now - self.WINDOW)
+        if not totals:
+            return None
+
+        span = now - min(first for _, _, first in totals.values())
+        if span < self.MIN_SPAN:
+            return None
+
+        def per_day(file_type: AssetFileTypeEnum) -> float:
+            count = totals.get(file_type.value, (0, 0, now))[0]
+            return count * SECONDS_PER_DAY / span
+
+        return per_day(AssetFileTypeEnum.VIDEO), per_day(AssetFileTypeEnum.IMAGE)
+
+    def _scene_size(self, quality: int) -> int | None:
+        """Size of the latest lores frame as a JPEG at `quality`, cached until the next frame."""
+        import cv2
+
+        with self._lock:
+            scene = self._scene
+            size = self._scene_sizes.get(quality)
+
+        if scene is None or size is not None:
+            return size
+
+        ok, encoded = cv2.imencode(".jpg", scene, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        size = len(encoded) if ok else None
+
+        with self._lock:
+            if self._scene is scene and size is not None:
+                self._scene_sizes[quality] = size
+
+        return size
@@ -0,0 +1,71 @@
+from enum import IntEnum
+
+from .schemas import ArtincamPiCamera
+
+
+class ReconfigureLevel(IntEnum):
+    """How much of the camera a config change has to re-apply, each level includes the ones below it."""
+
+    # nothing changed
+    NONE = 0
+    # timings, naming and storage: read when the next cycle starts, the camera and encoder keep running
+    SCHEDULE = 1
+    # encoders and their outputs are rebuilt, the camera (sensor, streams) keeps running
+    ENCODER = 2
+    # stream configuration or sensor controls: the camera is stopped, configured and started again
+    SENSOR = 3
+
+
+# level of every camera field, fields not listed here (e.g. added later) restart the camera to be safe
+FIELD_LEVELS = {
+    "status": ReconfigureLevel.SCHEDULE,
+    "output_dir": ReconfigureLevel.SCHEDULE,
+    "location": ReconfigureLevel.SCHEDULE,
+    "pi_id": ReconfigureLevel.SCHEDULE,
+    "image_capture_time": ReconfigureLevel.SCHEDULE,
+    "image_capture_time_unit": ReconfigureLevel.SCHEDULE,
+    "image_rest_time": ReconfigureLevel.SCHEDULE,
+    "image_rest_time_unit": ReconfigureLevel.SCHEDULE,
+    "image_storage": ReconfigureLevel.SCHEDULE,
+    "segment_time": ReconfigureLevel.SCHEDULE,
+    "segment_time_unit": ReconfigureLevel.SCHEDULE,
+    "cycle_rest_time": ReconfigureLevel.SCHEDULE,
+    "cycle_rest_time_unit": ReconfigureLevel.SCHEDULE,
+    "motion_cooldown": ReconfigureLevel.SCHEDULE,
+    "motion_cooldown_unit": ReconfigureLevel.SCHEDULE,
+    "must_last_until": ReconfigureLevel.SCHEDULE,
+    # continuous recordings cut files in the encoder output
+    "recording_time": ReconfigureLevel.ENCODER,
+    "recording_time_unit": ReconfigureLevel.ENCODER,
+    "bitrate": ReconfigureLevel.ENCODER,
+    "rtsp_stream": ReconfigureLevel.ENCODER,
+    "motion_sensitivity": ReconfigureLevel.ENCODER,
+    "motion_capture": ReconfigureLevel.ENCODER,
+    "pre_trigger_time": ReconfigureLevel.ENCODER,
+    "pre_trigger_time_unit": ReconfigureLevel.ENCODER,
+    "pre_trigger_buffer_size": ReconfigureLevel.ENCODER,
+    # the mode decides which streams are configured (lores for motion) and how encoders are wired
+    "mode": ReconfigureLevel.SENSOR,
+    "resolution": ReconfigureLevel.SENSOR,
+    "framerate": ReconfigureLevel.SENSOR,
+    "transforms": ReconfigureLevel.SENSOR,
+    "previews": ReconfigureLevel.SENSOR,
+}
+
+
+def diff_camera_config(old: ArtincamPiCamera | None, new: ArtincamPiCamera) -> dict[str, ReconfigureLevel]:
+    """Changed fields with the level each one needs. Without a previous config everything changed."""
+    if old is None:
+        return {field: ReconfigureLevel.SENSOR for field in ArtincamPiCamera.model_fields}
+
+    old_values, new_values = old.model_dump(), new.model_dump()
+
+    return {
+        field: FIELD_LEVELS.get(field, ReconfigureLevel.SENSOR)
+        for field in new_values
+        if old_values.get(field) != new_values[field]
+    }
+
+
+def required_level(changes: dict[str, ReconfigureLevel]) -> ReconfigureLevel:
+    return max(changes.values(), default=ReconfigureLevel.NONE)
@@ -0,0 +1,272 @@
+import itertools
+import os
+import pathlib
+import shutil
+import threading
+from typing import Callable
+
+from .catalog import AssetCatalog
+from .logger import logger
+from .schemas import AssetFileTypeEnum, AssetStateEnum
+from .segments import index_path, segment_closed
+
+
+class RetentionPolicy:
+    """Order assets are evicted in, as an ORDER BY over the catalog matching one of its (state, ...) indexes so
+    candidates are read in order a batch at a time instead of sorting every file on the device. `file_types` are
+    evicted one after the other in that order, None for every type.
+    """
+
+    name = "age"
+    order_by = "captured_at"
+    file_types: tuple[AssetFileTypeEnum | None, ...] = (None,)
+
+
+class AgePolicy(RetentionPolicy):
+    """Oldest captures first."""
+
+
+class SizePolicy(RetentionPolicy):
+    """Largest files first, the least evictions to get back under the watermark."""
+
+    name = "size"
+    order_by = "file_size DESC, captured_at"
+
+
+class TypePolicy(RetentionPolicy):
+    """Every asset of `file_type` (oldest first) before any other, e.g. videos before images."""
+
+    def __init__(self, file_type: AssetFileTypeEnum):
+        self.name = f"type:{file_type.value}"
+        # the rest in age order, the ones of file_type left behind (kept segments, ...) come up again there
+        self.file_types = (file_type, None)
+
+
+def policy_from_name(name: str) -> RetentionPolicy:
+    """age, size, type:image or type:video."""
+    match name.split(":", 1):
+        case ["age"]:
+            return AgePolicy()
+        case ["size"]:
+            return SizePolicy()
+        case ["type", file_type]:
+            return TypePolicy(AssetFileTypeEnum(file_type))
+        case _:
+            raise ValueError(f"Unknown retention policy: {name}")
+
+
+class RetentionDaemon:
+    """Keeps the local output directory under a disk usage watermark by deleting assets in the background.
+
+    When the disk goes over `high_watermark` percent used, assets under the output directory are evicted until it is
+    back under `low_watermark`. Assets the backend already has (uploaded) go first, in `policy` order. The ones that
+    only exist on this device (registered, then complete) are only evicted when `evict_unsaved` is set, otherwise the
+    disk is left full and the error logged. Image segments are evicted whole, once their window is over and every
+    image in them can be evicted. Candidates come from the asset catalog a batch at a time, the directory is never
+    listed. Each pass that evicted something is reported to `on_evicted` (a summary dict), evicted assets are marked
+    as such in the catalog.
+    """
+
+    INTERVAL = 30.0
+    BATCH_SIZE = 200
+
+    def __init__(
+        self,
+        catalog: AssetCatalog,
+        high_watermark: float = 90.0,
+        low_watermark: float = 80.0,
+        policy: RetentionPolicy | None = None,
+        evict_unsaved: bool = False,
+        on_evicted: Callable[[dict], None] | None = None,
+        on_file_removed: Callable[[str, int], None] | None = None,
+    ):
+        if not 0 < low_watermark < high_watermark <= 100:
+            raise ValueError("Retention watermarks must satisfy 0 < low < high <= 100")
+
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.policy = policy or AgePolicy()
+        self.evict_unsaved = evict_unsaved
+        self.on_evicted = on_evicted
+        self.on_file_removed = on_file_removed
+
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.last_usage: float | None = None
+
+        self._catalog = catalog
+        self._output_path: pathlib.Path | None = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._retention_loop, daemon=True)
+        self._thread.start()
+
+    def configure(self, output_path: pathlib.Path):
+        """Sets the directory kept under the watermark, checked right away."""
+        with self._lock:
+            self._output_path = output_path
+
+        self._wake.set()
+
+    def wake(self):
+        """Check the disk now instead of at the next interval (e.g. the local storage is filling up)."""
+        self._wake.set()
+
+    def close(self):
+        self._closing.set()
+        self._wake.set()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "usage": self.last_usage,
+                "evicted": self.evicted,
+                "evicted_bytes": self.evicted_bytes,
+                "policy": self.policy.name,
+            }
+
+    def _retention_loop(self):
+        while not self._closing.is_set():
+            with self._lock:
+                output_path = self._output_path
+
+            if output_path is not None:
+                try:
+                    self._enforce(output_path)
+                except Exception:
+                    logger.exception("[RetentionDaemon] Retention pass failed")
+
+            self._wake.wait(timeout=self.INTERVAL)
+            self._wake.clear()
+
+    def _enforce(self, output_path: pathlib.Path):
+        try:
+            usage = shutil.disk_usage(output_path)
+        except OSError:
+            return
+
+        with self._lock:
+            self.last_usage = usage.used / usage.total * 100
+
+        if self.last_usage < self.high_watermark:
+            return
+
+        # bytes to free to get down to the low watermark, tracked from the evicted sizes instead of statvfs per file
+        to_free = usage.used - usage.total * self.low_watermark / 100
+        # a segment can only go once every image in it is allowed, the states of a stage are allowed together
+        stages = [[AssetStateEnum.UPLOADED]]
+        if self.evict_unsaved:
+            stages.append([AssetStateEnum.REGISTERED, AssetStateEnum.COMPLETE])
+
+        summary = {"policy": self.policy.name, "usage_before": round(self.last_usage, 1), "evicted": 0, "bytes": 0}
+        states_evicted = set()
+        allowed = set()
+        # segments that can't go yet (still written, or holding images that must be kept), skipped for this pass
+        kept_segments = set()
+
+        for states in stages:
+            allowed.update(states)
+
+            # one state at a time so every batch is read straight out of an index
+            for state, file_type in itertools.product(states, self.policy.file_types):
+                while to_free > 0 and not self._closing.is_set():
+                    candidates = self._catalog.eviction_candidates(
+                        state,
+                        str(output_path),
+                        self.policy.order_by,
+                        self.BATCH_SIZE,
+                        file_type=file_type,
+                        exclude_paths=kept_segments,
+                    )
+                    if not candidates:
+                        break
+
+                    evicted_before, kept_before = summary["evicted"], len(kept_segments)
+                    to_free -= self._evict(candidates, summary, allowed, kept_segments)
+                    states_evicted.update(asset["state"] for asset in candidates)
+
+                    # files that can't be deleted stay first in line, stop once a whole batch of them is left. Kept
+                    # segments are excluded from the next batch, that's still progress
+                    if summary["evicted"] == evicted_before and len(kept_segments) == kept_before:
+                        break
+
+        if not summary["evicted"]:
+            logger.error(
+                f"[RetentionDaemon] {output_path} is {self.last_usage:.1f}% full and nothing can be evicted"
+                + ("" if self.evict_unsaved else " (only uploaded assets are evicted)")
+            )
+            return
+
+        usage = shutil.disk_usage(output_path)
+        with self._lock:
+            self.last_usage = usage.used / usage.total * 100
+
+        summary["usage_after"] = round(self.last_usage, 1)
+        summary["states"] = sorted(states_evicted)
+        logger.info(
+            f"[RetentionDaemon] Evicted {summary['evicted']} assets ({summary['bytes']} bytes), "
+            f"{summary['usage_before']}% -> {summary['usage_after']}%"
+        )
+
+        if self.on_evicted is not None:
+            self.on_evicted(summary)
+
+    def _evict(self, candidates: list, summary: dict, allowed: set, kept_segments: set) -> int:
+        freed = 0
+        evicted = []
+
+        for asset in candidates:
+            paths, assets = [asset["path"]], [asset]
+
+            if asset["segment_offset"] is not None:
+                if asset["path"] in kept_segments:
+                    continue
+
+                # the whole segment goes at once, with every image in it
+                assets = self._catalog.at_path(asset["path"])
+                if not segment_closed(asset["path"]) or any(row["state"] not in allowed for row in assets):
+                    kept_segments.add(asset["path"])
+                    continue
+
+                paths.append(str(index_path(asset["path"])))
+                kept_segments.add(asset["path"])
+
+            # previews are not counted in file_size, their size is read before they go
+            previews = [row["preview_path"] for row in assets if row["preview_path"]]
+            preview_size = sum(os.path.getsize(path) for path in previews if os.path.exists(path))
+            paths += previews
+
+            try:
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        # already gone, only the catalog needs to catch up
+                        pass
+            except OSError as e:
+                logger.error(f"[RetentionDaemon] Failed to evict {asset['path']}: {e}")
+                continue
+
+            size = sum(max(row["file_size"], 0) for row in assets) + preview_size
+            freed += size
+            evicted += [row["unique_id"] for row in assets]
+
+            if self.on_file_removed is not None:
+                self.on_file_removed(asset["path"], size)
+
+            for row in assets:
+                summary["oldest"] = min(summary.get("oldest", row["captured_at"]), row["captured_at"])
+                summary["newest"] = max(summary.get("newest", 0), row["captured_at"])
+
+        self._catalog.set_state(evicted, AssetStateEnum.EVICTED)
+
+        summary["evicted"] += len(evicted)
+        summary["bytes"] += freed
+
+        with self._lock:
+            self.evicted += len(evicted)
+            self.evicted_bytes += freed
+
+        return freed
@@ -0,0 +1,74 @@
+import math
+import statistics
+import time
+from collections import deque
+from typing import Callable
+
+# a slot that is late by less than this fraction of the interval still fires, later than that it's skipped
+LATE_TOLERANCE = 0.5
+JITTER_SAMPLES = 512
+
+
+class DeadlineScheduler:
+    """Fires on a fixed grid of monotonic deadlines (start, start + interval, start + 2 * interval, ...).
+
+    Sleeping a fixed rest time after each capture makes the real interval rest time + capture time, which drifts over
+    long windows. Here the time spent capturing is taken out of the next sleep instead. Slots that can't be met (the
+    capture took longer than the interval) are skipped and counted instead of firing back to back to catch up.
+    """
+
+    def __init__(self, interval: float, start: float | None = None):
+        self.interval = interval
+        self.next_deadline = time.monotonic() if start is None else start
+
+        self.fired = 0
+        self.skipped = 0
+        # how late each slot actually fired, in seconds
+        self._jitter: deque[float] = deque(maxlen=JITTER_SAMPLES)
+
+    def reset(self, start: float | None = None):
+        """Re-anchor the grid (e.g. on a new cycle), stats are kept."""
+        self.next_deadline = time.monotonic() if start is None else start
+
+    def wait(self, sleep: Callable[[float], bool], until: float | None = None) -> bool:
+        """Sleeps until the next slot. Returns True if the sleep was interrupted.
+
+        If `until` is given and the next slot falls on or after it, sleeps until `until` instead and leaves
+        `next_deadline` there, so the caller can tell the window is over with `next_deadline >= until`.
+        """
+        deadline = self.next_deadline + self.interval
+        now = time.monotonic()
+        late = now - deadline
+
+        if self.interval > 0 and late > self.interval * LATE_TOLERANCE:
+            missed = math.ceil(late / self.interval)
+            deadline += missed * self.interval
+            self.skipped += missed
+
+        if until is not None and deadline >= until:
+            self.next_deadline = until
+            return sleep(until - time.monotonic())
+
+        self.next_deadline = deadline
+
+        if sleep(deadline - time.monotonic()):
+            return True
+
+        self.fired += 1
+        self._jitter.append(max(time.monotonic() - deadline, 0.0))
+        return False
+
+    def stats(self) -> dict:
+        jitter_ms = sorted(j * 1000 for j in self._jitter)
+
+        return {
+            "interval": self.interval,
+            "fired": self.fired,
+            "skipped": self.skipped,
+            "jitter_ms": {
+                "mean": round(statistics.fmean(jitter_ms), 2) if jitter_ms else 0.0,
+                "p50": round(jitter_ms[len(jitter_ms) // 2], 2) if jitter_ms else 0.0,
+                "p95": round(jitter_ms[int(len(jitter_ms) * 0.95)], 2) if jitter_ms else 0.0,
+                "max": round(jitter_ms[-1], 2) if jitter_ms else 0.0,
+            },
+        }
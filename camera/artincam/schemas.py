@@ -1,3 +1,4 @@
+from datetime import date
 from enum import Enum
 from typing import Optional
 
@@ -10,6 +11,17 @@ class AssetFileTypeEnum(Enum):
     VIDEO = "video"
 
 
+class AssetStateEnum(str, Enum):
+    """Lifecycle of an asset in the local catalog, only kept on the agent."""
+
+    WRITING = "writing"
+    COMPLETE = "complete"
+    REGISTERED = "registered"
+    UPLOADED = "uploaded"
+    TRANSFERRED = "transferred"
+    EVICTED = "evicted"
+
+
 class AssetFile(BaseModel):
     id: Optional[int] = Field(None, description="Primary key")
     agent_id: str = Field(..., description="Agent ID")
@@ -20,6 +32,8 @@ class AssetFile(BaseModel):
     file_name: str = Field(..., description="File name", max_length=256)
     file_size: int = Field(0, description="File size in bytes", ge=-1)
     file_type: AssetFileTypeEnum
+    preview_file_name: Optional[str] = Field(None, description="Thumbnail or proxy clip file name", max_length=256)
+    frame_timing: Optional[dict] = Field(None, description="Frame rate and dropped frames of a video, see FrameStats")
 
 
 class ActionLog(BaseModel):
@@ -36,8 +50,20 @@ class ActionLog(BaseModel):
 class ModeEnum(str, Enum):
     RTSP_STREAM = "rtsp_stream"
     VIDEO = "video"
+    CONTINUOUS_VIDEO = "continuous_video"
     IMAGE = "image"
     IMAGE_VIDEO = "image/video"
+    MOTION = "motion"
+
+
+class MotionCaptureEnum(str, Enum):
+    IMAGE = "image"
+    VIDEO = "video"
+
+
+class ImageStorageEnum(str, Enum):
+    FILES = "files"
+    SEGMENTS = "segments"
 
 
 class StatusEnum(str, Enum):
@@ -81,6 +107,9 @@ class ArtincamPiCamera(BaseModel):
 
     framerate: int = Field(24, description="Frames per second (>=1)", ge=1)
     bitrate: int = Field(8388608, description="Bitrate (>=1)", ge=1)
+    must_last_until: Optional[date] = Field(
+        None, description="Lower bitrate and JPEG quality as needed for the storage to last until this date"
+    )
 
     recording_time: int = Field(10, description="Recording time", example=10, ge=1)
     recording_time_unit: TimeUnitEnum = Field(TimeUnitEnum.S, description="Unit for recording_time")
@@ -104,6 +133,25 @@ class ArtincamPiCamera(BaseModel):
     image_rest_time: int = Field(10.0, description="Rest time between images", ge=0)
     image_rest_time_unit: TimeUnitEnum = Field(TimeUnitEnum.S, description="Unit for image_rest_time")
 
+    image_storage: ImageStorageEnum = Field(
+        ImageStorageEnum.FILES, description="Store each image in its own file or append them to segments"
+    )
+    segment_time: int = Field(1, description="Time window covered by each image segment", ge=1)
+    segment_time_unit: TimeUnitEnum = Field(TimeUnitEnum.H, description="Unit for segment_time")
+
+    motion_sensitivity: int = Field(50, description="Motion sensitivity (1 least sensitive, 100 most)", ge=1, le=100)
+    motion_capture: MotionCaptureEnum = Field(
+        MotionCaptureEnum.IMAGE, description="What to capture when motion is detected"
+    )
+    motion_cooldown: int = Field(10, description="Time to wait after a motion capture before re-arming", ge=0)
+    motion_cooldown_unit: TimeUnitEnum = Field(TimeUnitEnum.S, description="Unit for motion_cooldown")
+
+    pre_trigger_time: int = Field(0, description="Time kept in memory before a triggered video (0 disables)", ge=0)
+    pre_trigger_time_unit: TimeUnitEnum = Field(TimeUnitEnum.S, description="Unit for pre_trigger_time")
+    pre_trigger_buffer_size: int = Field(32, description="Max memory used by the pre-trigger buffer in MB", ge=1)
+
+    previews: bool = Field(False, description="Generate a thumbnail per image and a proxy clip per video")
+
 
 class ArtincamPiAgentConfig(BaseModel):
     camera: ArtincamPiCamera = Field(..., description="Camera configuration")
@@ -0,0 +1,110 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+# libcamera and pimcamera2 will already be installed in the raspberry pis
+# when working outside a raspberry PI we will use a libcamera and picamera mocks
+try:
+    from picamera2.outputs import Output, PyavOutput
+except ModuleNotFoundError:
+    from .mocks.picamera2 import Output, PyavOutput
+
+# sensor timestamps jitter, a keyframe this close to `duration` still starts the next file instead of waiting a GOP
+SPLIT_TOLERANCE = 100_000
+
+
+@dataclass
+class VideoSegment:
+    """One file of a continuous recording, timestamps are the encoder's (microseconds)."""
+
+    filename: str
+    first_timestamp: int
+    last_timestamp: int
+    frames: int
+
+    @property
+    def duration(self) -> float:
+        return (self.last_timestamp - self.first_timestamp) / 1_000_000
+
+
+class SegmentedOutput(Output):
+    """Encoder output that splits one long encoder session into files of about `duration` seconds.
+
+    The encoder never stops between files: once the current file is `duration` seconds long, the next keyframe starts
+    a new one, so every frame lands in exactly one file and the next file starts on the frame right after the last one
+    of the previous file. File names come from `on_segment_opened` (one per file), `on_segment_closed` receives the
+    finished segment. Both run in the encoder thread, keep them short. The encoder needs a short keyframe interval
+    (iperiod), files are at most one GOP longer than `duration`. The streams the encoder adds to this output are added
+    again to every file, the muxer needs them before the first packet.
+    """
+
+    def __init__(
+        self,
+        duration: float,
+        on_segment_opened: Callable[[], str],
+        on_segment_closed: Callable[[VideoSegment], None],
+    ):
+        super().__init__()
+        self.duration = duration
+        self.on_segment_opened = on_segment_opened
+        self.on_segment_closed = on_segment_closed
+
+        self._lock = threading.Lock()
+        self._file_output: PyavOutput | None = None
+        self._segment: VideoSegment | None = None
+        # encoder stream -> (codec name, stream options), as added by the encoder
+        self._streams: dict = {}
+
+    def _add_stream(self, encoder_stream, codec_name, **kwargs):
+        self._streams[encoder_stream] = (codec_name, kwargs)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio or timestamp is None:
+            return
+
+        with self._lock:
+            segment = self._segment
+
+            if segment is None and not keyframe:
+                # a file must start with a keyframe, anything before the first one can't be decoded
+                return
+
+            if keyframe and (
+                segment is None or timestamp - segment.first_timestamp >= self.duration * 1_000_000 - SPLIT_TOLERANCE
+            ):
+                self._close_segment()
+                self._open_segment(timestamp)
+                segment = self._segment
+
+            self._file_output.outputframe(frame, keyframe, timestamp)
+            segment.last_timestamp = timestamp
+            segment.frames += 1
+
+    def stop(self):
+        with self._lock:
+            self._close_segment()
+
+        super().stop()
+
+    def current(self) -> VideoSegment | None:
+        with self._lock:
+            return self._segment
+
+    def _open_segment(self, timestamp: int):
+        filename = self.on_segment_opened()
+        self._file_output = PyavOutput(filename)
+        self._file_output.start()
+        for encoder_stream, (codec_name, kwargs) in self._streams.items():
+            self._file_output._add_stream(encoder_stream, codec_name, **kwargs)
+        self._segment = VideoSegment(filename, timestamp, timestamp, 0)
+
+    def _close_segment(self):
+        """Caller holds the lock."""
+        if self._file_output is None:
+            return
+
+        file_output, segment = self._file_output, self._segment
+        self._file_output, self._segment = None, None
+
+        file_output.stop()
+        self.on_segment_closed(segment)
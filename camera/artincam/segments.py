@@ -0,0 +1,227 @@
+import bisect
+import os
+import pathlib
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from .logger import logger
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+# index header: magic, version, segment start (epoch seconds), segment duration (seconds), location
+INDEX_HEADER = struct.Struct("<4sHdd32s")
+INDEX_MAGIC = b"ASEG"
+INDEX_VERSION = 1
+# index record: unique_id, capture time (epoch seconds), offset and length of the JPEG in the segment. Unique ids are
+# <pi_id:4>-<counter:10> (15 bytes), a longer one is refused rather than cut
+UNIQUE_ID_SIZE = 16
+INDEX_RECORD = struct.Struct(f"<{UNIQUE_ID_SIZE}sdQI")
+
+
+@dataclass
+class SegmentRecord:
+    unique_id: str
+    timestamp: float
+    offset: int
+    length: int
+
+
+@dataclass
+class SegmentSlot:
+    """Where the image writer appends an image instead of writing its own file. `path` and `record` are set once
+    the image is in the segment.
+    """
+
+    writer: "SegmentWriter"
+    directory: pathlib.Path
+    unique_id: str
+    timestamp: float
+
+    path: str | None = None
+    record: SegmentRecord | None = None
+
+
+def index_path(segment_path: str | pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(segment_path).with_suffix(INDEX_SUFFIX)
+
+
+def image_file_name(timestamp: float, unique_id: str, location: str) -> str:
+    """Name the image would have had as a file, same format as the camera uses."""
+    stamp = datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%d%H%M%S")
+    return f"{stamp}_{unique_id}_{location}.jpg"
+
+
+class SegmentReader:
+    """Random access to the images of a segment. The index is read once (a few KB per hour of images), after that
+    finding an image is a dict lookup (unique_id) or a bisect (timestamp) and reading it is one seek.
+    """
+
+    def __init__(self, segment_path: str | pathlib.Path):
+        self.path = pathlib.Path(segment_path)
+
+        with open(index_path(self.path), "rb") as file:
+            header = file.read(INDEX_HEADER.size)
+            data = file.read()
+
+        magic, version, self.start, self.duration, location = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{index_path(self.path)} is not a segment index")
+
+        self.location = location.rstrip(b"\0").decode()
+        # a record cut short by a crash is ignored, the writer truncates it on its next append
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        self.records = [
+            SegmentRecord(unique_id.rstrip(b"\0").decode(), timestamp, offset, length)
+            for unique_id, timestamp, offset, length in INDEX_RECORD.iter_unpack(data[:usable])
+        ]
+        # image writer threads can append out of capture order, timestamp lookups need them sorted
+        self.records.sort(key=lambda record: record.timestamp)
+        self._by_unique_id = {record.unique_id: record for record in self.records}
+        self._timestamps = [record.timestamp for record in self.records]
+
+    def closed(self, now: float | None = None) -> bool:
+        """Nothing will be appended anymore, the segment's time window is over."""
+        return self.start + self.duration <= (time.time() if now is None else now)
+
+    def find(self, unique_id: str) -> SegmentRecord | None:
+        return self._by_unique_id.get(unique_id)
+
+    def find_at(self, timestamp: float) -> SegmentRecord | None:
+        """Image captured closest to `timestamp`."""
+        if not self.records:
+            return None
+
+        i = bisect.bisect_left(self._timestamps, timestamp)
+        neighbours = self.records[max(i - 1, 0) : i + 1]
+        return min(neighbours, key=lambda record: abs(record.timestamp - timestamp))
+
+    def read(self, record: SegmentRecord) -> bytes:
+        with open(self.path, "rb") as file:
+            file.seek(record.offset)
+            return file.read(record.length)
+
+    def file_name(self, record: SegmentRecord) -> str:
+        return image_file_name(record.timestamp, record.unique_id, self.location)
+
+
+def segment_closed(segment_path: str | pathlib.Path, now: float | None = None) -> bool:
+    """Reads only the index header. A segment without a readable index is treated as closed (nothing writes it)."""
+    try:
+        with open(index_path(segment_path), "rb") as file:
+            _, _, start, duration, _ = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+    except (OSError, struct.error):
+        return True
+
+    return start + duration <= (time.time() if now is None else now)
+
+
+class SegmentWriter:
+    """Appends still images to rolling segment files instead of one file per image.
+
+    Images captured in the same `duration` window (e.g. an hour) go into `<start>_<pi_id>_<location>.seg`, back to
+    back, with a fixed size record per image (unique_id, capture time, offset, length) appended to the `.idx` next
+    to it. The image data is appended before its index record, so the index only ever points at complete images.
+    Appending to a segment left by a crash or a restart first drops whatever is past the last complete record.
+    Appends are serialized, encoding happens before in the image writer threads.
+    """
+
+    def __init__(self, duration: int, pi_id: int, location: str):
+        self.duration = max(duration, 1)
+        self.pi_id = pi_id
+        self.location = location
+
+        self._lock = threading.Lock()
+        self._path: pathlib.Path | None = None
+        self._data = None
+        self._index = None
+
+    def path_for(self, directory: pathlib.Path, timestamp: float) -> pathlib.Path:
+        start = self._start(timestamp)
+        stamp = datetime.fromtimestamp(start, timezone.utc).strftime("%Y%m%d%H%M%S")
+        return directory / f"{stamp}_{str(self.pi_id).zfill(4)}_{self.location}{SEGMENT_SUFFIX}"
+
+    def slot(self, directory: pathlib.Path, unique_id: str, timestamp: float) -> SegmentSlot:
+        return SegmentSlot(self, directory, unique_id, timestamp)
+
+    def append(self, slot: SegmentSlot, data: bytes) -> SegmentRecord:
+        unique_id = slot.unique_id.encode()
+        if len(unique_id) > UNIQUE_ID_SIZE:
+            # struct would silently truncate it, and the image could no longer be found by its id
+            raise ValueError(f"unique id {slot.unique_id} is longer than the {UNIQUE_ID_SIZE} bytes of the index")
+
+        path = self.path_for(slot.directory, slot.timestamp)
+
+        with self._lock:
+            if path != self._path:
+                self._open(path, self._start(slot.timestamp))
+
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+
+            record = SegmentRecord(slot.unique_id, slot.timestamp, offset, len(data))
+            self._index.write(INDEX_RECORD.pack(unique_id, slot.timestamp, offset, len(data)))
+            self._index.flush()
+
+        slot.path = str(path)
+        slot.record = record
+        return record
+
+    def close(self):
+        """Closes the current segment, a later append opens it again."""
+        with self._lock:
+            self._close_files()
+
+    def _start(self, timestamp: float) -> float:
+        return timestamp - timestamp % self.duration
+
+    def _open(self, path: pathlib.Path, start: float):
+        self._close_files()
+
+        idx_path = index_path(path)
+        if not idx_path.exists():
+            with open(idx_path, "wb") as file:
+                file.write(
+                    INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, start, self.duration, self.location.encode()[:32])
+                )
+
+        self._data = open(path, "ab")
+        self._index = open(idx_path, "ab")
+        self._recover(path)
+        self._path = path
+
+    def _recover(self, path: pathlib.Path):
+        """Truncates a partial index record and any image data past the last complete record."""
+        index_size = self._index.seek(0, os.SEEK_END)
+        records = max(index_size - INDEX_HEADER.size, 0) // INDEX_RECORD.size
+        index_end = INDEX_HEADER.size + records * INDEX_RECORD.size
+        data_end = 0
+
+        if records:
+            with open(index_path(path), "rb") as file:
+                file.seek(index_end - INDEX_RECORD.size)
+                _, _, offset, length = INDEX_RECORD.unpack(file.read(INDEX_RECORD.size))
+            data_end = offset + length
+
+        data_size = self._data.seek(0, os.SEEK_END)
+
+        if index_size != index_end or data_size != data_end:
+            logger.info(f"[SegmentWriter] Recovering {path.name}, dropping an image written partially")
+            self._index.truncate(index_end)
+            self._data.truncate(data_end)
+
+        self._index.seek(index_end)
+        self._data.seek(data_end)
+
+    def _close_files(self):
+        for file in (self._data, self._index):
+            if file is not None:
+                file.close()
+
+        self._data = None
+        self._index = None
+        self._path = None
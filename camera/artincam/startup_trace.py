@@ -0,0 +1,176 @@
+import importlib.abc
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+
+# only the standard library here: this module is imported before anything it is meant to time
+
+# modules listed in the report, by cumulative import time
+TOP_MODULES = 25
+
+
+def process_uptime() -> float | None:
+    """Seconds since this process was started (Linux), None when it can't be told."""
+    try:
+        with open("/proc/self/stat") as file:
+            # the command name (2nd field) can hold spaces, the fields after it can't
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    # field 22 (starttime) is the 20th after the command name, in clock ticks since boot
+    return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps the loader of one module to time its creation and execution, everything else goes to the real loader."""
+
+    def __init__(self, loader, name: str, trace: "StartupTrace"):
+        self._loader = loader
+        self._name = name
+        self._trace = trace
+
+    def __getattr__(self, attribute):
+        return getattr(self._loader, attribute)
+
+    def create_module(self, spec):
+        # extension modules (cv2, numpy's core) do most of their work here
+        self._trace._enter(self._name)
+        try:
+            return self._loader.create_module(spec)
+        finally:
+            self._trace._exit(self._name)
+
+    def exec_module(self, module):
+        # the module (and anything inspecting it later) only ever sees its real loader
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+
+        self._trace._enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._trace._exit(self._name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, trace: "StartupTrace"):
+        self._trace = trace
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, fullname, self._trace)
+
+        return spec
+
+
+class StartupTrace:
+    """Times every module imported after `install()`, and milestones (first frame, first capture) since process start.
+
+    Import times are the same ones `python -X importtime` reports: `cumulative` includes the modules imported while
+    importing a module, `self` doesn't. Modules imported before `install()` (the interpreter's own, asyncio) are not
+    listed, their cost is part of `interpreter_s`.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        # process age when tracing started: interpreter startup and whatever ran before install()
+        self.interpreter = process_uptime()
+        self.modules: dict[str, list[float]] = {}
+        self.marks: dict[str, float] = {}
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._finder = _TimingFinder(self)
+
+    def mark(self, name: str):
+        """Records when `name` first happened, later calls are ignored."""
+        with self._lock:
+            self.marks.setdefault(name, time.monotonic())
+
+    def since_start(self, name: str) -> float | None:
+        """Seconds from process start (or from install() when unknown) to the mark."""
+        if name not in self.marks:
+            return None
+
+        return self.marks[name] - self.started + (self.interpreter or 0)
+
+    def report(self) -> dict:
+        with self._lock:
+            modules = sorted(self.modules.items(), key=lambda item: item[1][0], reverse=True)
+
+        marks = {f"{name}_s": round(self.since_start(name), 3) for name in self.marks}
+
+        return {
+            "interpreter_s": round(self.interpreter, 3) if self.interpreter is not None else None,
+            "imports_s": round(sum(self_time for _, self_time in self.modules.values()), 3),
+            "modules_imported": len(modules),
+            **marks,
+            "modules": [
+                {"module": name, "cumulative_ms": round(cumulative * 1000, 1), "self_ms": round(self_time * 1000, 1)}
+                for name, (cumulative, self_time) in modules[:TOP_MODULES]
+            ],
+        }
+
+    def write(self, path: pathlib.Path):
+        """Writes the report as JSON, to compare startups across releases."""
+        path.write_text(json.dumps(self.report(), indent=2))
+
+    def _enter(self, name: str):
+        stack = self._local.__dict__.setdefault("stack", [])
+        # [module, started, time spent importing other modules from it]
+        stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self, name: str):
+        stack = self._local.stack
+        _, started, children = stack.pop()
+        elapsed = time.perf_counter() - started
+
+        if stack:
+            stack[-1][2] += elapsed
+
+        with self._lock:
+            # create_module and exec_module of the same module add up
+            totals = self.modules.setdefault(name, [0.0, 0.0])
+            totals[0] += elapsed
+            totals[1] += elapsed - children
+
+
+_trace: StartupTrace | None = None
+
+
+def install() -> StartupTrace:
+    """Starts tracing, call it before importing what should be timed."""
+    global _trace
+
+    if _trace is None:
+        _trace = StartupTrace()
+        sys.meta_path.insert(0, _trace._finder)
+
+    return _trace
+
+
+def uninstall():
+    """Stops timing imports, marks and the report stay available."""
+    if _trace is not None and _trace._finder in sys.meta_path:
+        sys.meta_path.remove(_trace._finder)
+
+
+def active() -> StartupTrace | None:
+    return _trace
@@ -0,0 +1,239 @@
+import os
+import pathlib
+import select
+import shutil
+import threading
+
+from .logger import logger
+from .metrics import registry
+
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+ONE_GB = 2**30
+
+WRITTEN_BYTES = registry.counter(
+    "artincam_storage_written_bytes_total", "Bytes of assets written, per tier.", ("tier",)
+)
+
+
+class StorageTier:
+    """A place assets can be written to, with an estimate of its free space."""
+
+    def __init__(self, name: str, path: pathlib.Path, min_free: int):
+        self.name = name
+        self.path = path
+        self.min_free = min_free
+
+        self.free = 0
+        self.ready = False
+
+    def refresh(self):
+        """Creates the directory and reads the real free space. Only called from the storage manager thread."""
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.free = shutil.disk_usage(self.path).free
+            self.ready = True
+        except OSError as e:
+            logger.error(f"[StorageManager] {self.name} storage ({self.path}) not available: {e}")
+            self.ready = False
+
+    def usable(self) -> bool:
+        return self.ready and self.free > self.min_free
+
+    def stats(self) -> dict:
+        return {"name": self.name, "path": str(self.path), "free": self.free, "ready": self.ready}
+
+
+class StorageManager:
+    """Picks where assets are written without touching the disk on every capture.
+
+    Tiers are tried in order: every USB stick (mounted /dev/sd* device) then the local output directory. The chosen
+    destination is cached, free space is estimated from the bytes written and only re-read with statvfs every
+    `resync_interval` seconds. Mounts are re-scanned when /proc/self/mountinfo reports a change (a stick plugged in or
+    pulled out). When the active tier drops under its `min_free`, writes fail over to the next tier; the local
+    directory is the last resort and is used even when it is full, like before.
+    """
+
+    def __init__(self, usb_min_free: int = ONE_GB, resync_interval: float = 60.0):
+        self.usb_min_free = usb_min_free
+        self.resync_interval = resync_interval
+
+        self._lock = threading.Lock()
+        self._tiers: list[StorageTier] = []
+        self._active: StorageTier | None = None
+        self._local_path: pathlib.Path | None = None
+        self._usb_subdir: str = ""
+
+        registry.gauge(
+            "artincam_storage_free_bytes",
+            "Free space estimate of every storage tier.",
+            ("tier", "path"),
+            fn=self._free_by_tier,
+        )
+
+        self._closing = threading.Event()
+        self._mountinfo = self._open_mountinfo()
+        self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._thread.start()
+
+    def configure(self, local_path: pathlib.Path, usb_subdir: str):
+        """Sets the local output directory and the directory used inside USB sticks, re-scans the tiers."""
+        with self._lock:
+            self._local_path = local_path
+            self._usb_subdir = usb_subdir
+
+        self._rescan()
+
+    def destination(self) -> pathlib.Path:
+        """Directory the next asset should be written to (already created)."""
+        with self._lock:
+            if self._active is None:
+                raise RuntimeError("StorageManager used before being configured")
+
+            return self._active.path
+
+    def record_written(self, filepath: str, size: int):
+        """Takes `size` bytes off the free space estimate of the tier `filepath` was written to."""
+        with self._lock:
+            for tier in self._tiers:
+                if pathlib.Path(filepath).is_relative_to(tier.path):
+                    tier.free -= size
+                    WRITTEN_BYTES.labels(tier.name).inc(size)
+                    break
+
+            if self._active is not None and not self._active.usable():
+                self._select()
+
+    def record_removed(self, filepath: str, size: int):
+        """Gives `size` bytes back to the free space estimate of the tier `filepath` was deleted from."""
+        with self._lock:
+            for tier in self._tiers:
+                if pathlib.Path(filepath).is_relative_to(tier.path):
+                    tier.free += size
+                    break
+
+    def free_space(self) -> int | None:
+        """Free space estimate of the tier assets are written to, None before the first scan."""
+        with self._lock:
+            return self._active.free if self._active is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self._active.name if self._active else None,
+                "tiers": [tier.stats() for tier in self._tiers],
+            }
+
+    def _free_by_tier(self) -> dict[tuple[str, str], int]:
+        with self._lock:
+            return {(tier.name, str(tier.path)): tier.free for tier in self._tiers if tier.ready}
+
+    def close(self):
+        self._closing.set()
+        self._thread.join()
+
+        if self._mountinfo is not None:
+            self._mountinfo.close()
+
+    def _rescan(self):
+        with self._lock:
+            local_path, usb_subdir = self._local_path, self._usb_subdir
+
+        if local_path is None:
+            return
+
+        tiers = [
+            StorageTier("usb", pathlib.Path(mount_point) / "data" / usb_subdir, self.usb_min_free)
+            for mount_point in self._find_usb_mount_points()
+        ]
+        tiers.append(StorageTier("local", local_path, 0))
+
+        for tier in tiers:
+            tier.refresh()
+
+        with self._lock:
+            self._tiers = tiers
+            self._select()
+
+    def _resync(self):
+        if self._mountinfo is None:
+            # no mount change notifications, look for new USB sticks on every resync instead
+            self._rescan()
+            return
+
+        with self._lock:
+            tiers = list(self._tiers)
+
+        for tier in tiers:
+            tier.refresh()
+
+        with self._lock:
+            self._select()
+
+    def _select(self):
+        """Makes the first usable tier active, the last one (local) if none is. Caller holds the lock."""
+        tier = next((tier for tier in self._tiers if tier.usable()), self._tiers[-1] if self._tiers else None)
+
+        if tier is not self._active and tier is not None:
+            previous = self._active.name if self._active else None
+            logger.info(f"[StorageManager] Writing to {tier.name} storage ({tier.path}), was {previous}")
+
+            if not tier.usable():
+                logger.error(f"[StorageManager] No storage above its free space threshold, using {tier.path}")
+
+        self._active = tier
+
+    def _watch_loop(self):
+        since_resync = 0.0
+
+        while not self._closing.is_set():
+            if self._wait_for_mount_change(timeout=1.0):
+                self._rescan()
+                since_resync = 0.0
+                continue
+
+            since_resync += 1.0
+            if since_resync >= self.resync_interval:
+                self._resync()
+                since_resync = 0.0
+
+    def _open_mountinfo(self):
+        """mountinfo signals POLLPRI when the mount table changes, so mounts don't have to be listed every time."""
+        try:
+            mountinfo = open(MOUNTINFO_PATH, "rb")
+            poller = select.poll()
+            poller.register(mountinfo, select.POLLPRI | select.POLLERR)
+        except (OSError, AttributeError):
+            logger.info("[StorageManager] mountinfo not available, USB sticks are only detected on resync")
+            return None
+
+        self._poller = poller
+        return mountinfo
+
+    def _wait_for_mount_change(self, timeout: float) -> bool:
+        if self._mountinfo is None:
+            # no change notifications, fall back to re-scanning on every resync
+            self._closing.wait(timeout)
+            return False
+
+        if not self._poller.poll(timeout * 1000):
+            return False
+
+        # the event stays raised until the file is read again
+        self._mountinfo.seek(0)
+        self._mountinfo.read()
+        return True
+
+    def _find_usb_mount_points(self) -> list[str]:
+        """Lists mounted filesystems that appear to be USB storage devices."""
+        import psutil
+
+        try:
+            partitions = psutil.disk_partitions(all=False)
+        except Exception:
+            return []
+
+        return [
+            p.mountpoint
+            for p in partitions
+            if p.device.startswith("/dev/sd") and p.mountpoint and os.path.exists(p.mountpoint)
+        ]
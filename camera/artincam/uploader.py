@@ -0,0 +1,192 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .backend_service import BackendService, CircuitBreaker
+from .catalog import AssetCatalog
+from .logger import logger
+from .schemas import AssetStateEnum
+
+
+class TokenBucket:
+    """Limits the rate bytes are sent at, shared by every upload so they stay under `rate` together."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int, stop: threading.Event) -> bool:
+        """Waits until `amount` bytes can be sent. Returns False if `stop` was set while waiting."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # going negative books the bytes now, callers behind this one wait for them too
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        return not stop.wait(wait) if wait > 0 else not stop.is_set()
+
+
+class Uploader:
+    """Uploads the content of registered assets to the backend in the background.
+
+    Files go in `chunk_size` chunks, `workers` files at a time, all of them together limited to `bandwidth` bytes
+    per second. Each upload starts by asking the backend how much it already has, so a disconnect or a restart only
+    costs the chunk that was in flight. While the backend is unreachable nothing is attempted, uploads resume on the
+    next poll once it answers again. Uploaded assets move to the uploaded state in the catalog.
+    """
+
+    POLL_INTERVAL = 10.0
+    # a file that failed to upload while the backend was reachable waits this long before the next attempt, so it
+    # doesn't hold back the ones behind it
+    FAILED_RETRY_DELAY = 300.0
+
+    def __init__(
+        self,
+        catalog: AssetCatalog,
+        backend_client: BackendService,
+        agent_id: str,
+        workers: int = 2,
+        chunk_size: int = 256 * 1024,
+        bandwidth: int = 1024 * 1024,
+    ):
+        self.agent_id = agent_id
+        self.workers = max(workers, 1)
+        self.chunk_size = chunk_size
+
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.failed = 0
+
+        self._catalog = catalog
+        self._backend_client = backend_client
+        self._bucket = TokenBucket(rate=bandwidth, burst=max(bandwidth, chunk_size))
+        self._in_flight: set[str] = set()
+        self._retry_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """New assets were registered, look for work now instead of at the next poll."""
+        self._wake.set()
+
+    def close(self):
+        """Stops after the chunks in flight, unfinished uploads resume from the backend offset next time."""
+        self._closing.set()
+        self._wake.set()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "uploaded": self.uploaded,
+                "uploaded_bytes": self.uploaded_bytes,
+                "failed": self.failed,
+            }
+
+    def _poll_loop(self):
+        while not self._closing.is_set():
+            if self._backend_client.circuit_breaker.state != CircuitBreaker.OPEN:
+                self._start_uploads()
+
+            self._wake.wait(timeout=self.POLL_INTERVAL)
+            self._wake.clear()
+
+    def _start_uploads(self):
+        with self._lock:
+            free_slots = self.workers - len(self._in_flight)
+            now = time.monotonic()
+            self._retry_at = {unique_id: at for unique_id, at in self._retry_at.items() if at > now}
+            skipped = len(self._in_flight) + len(self._retry_at)
+
+        if free_slots <= 0:
+            return
+
+        # oldest first, the ones in flight or waiting to be retried are skipped
+        assets = self._catalog.in_states([AssetStateEnum.REGISTERED], limit=free_slots + skipped)
+
+        for asset in assets:
+            if free_slots <= 0:
+                break
+
+            with self._lock:
+                if asset["unique_id"] in self._in_flight or asset["unique_id"] in self._retry_at:
+                    continue
+                self._in_flight.add(asset["unique_id"])
+
+            self._pool.submit(self._upload, asset)
+            free_slots -= 1
+
+    def _upload(self, asset):
+        unique_id = asset["unique_id"]
+
+        try:
+            uploaded = self._upload_file(asset)
+        except Exception:
+            logger.exception(f"[Uploader] Upload of {unique_id} failed")
+            uploaded = False
+
+        with self._lock:
+            self._in_flight.discard(unique_id)
+
+            if uploaded:
+                self.uploaded += 1
+                self.uploaded_bytes += max(asset["file_size"], 0)
+            else:
+                self.failed += 1
+
+                # an outage isn't the file's fault, it's retried as soon as the backend is back
+                if self._backend_client.circuit_breaker.failures == 0:
+                    self._retry_at[unique_id] = time.monotonic() + self.FAILED_RETRY_DELAY
+
+        if uploaded:
+            # a slot is free, start the next one right away
+            self._wake.set()
+
+    def _upload_file(self, asset) -> bool:
+        unique_id, path, length = asset["unique_id"], asset["path"], asset["file_size"]
+        # an image in a segment is the `length` bytes at segment_offset, uploaded under its own name
+        base = asset["segment_offset"] or 0
+        file_name = asset["file_name"] or path.rsplit("/", 1)[-1]
+
+        offset = self._backend_client.get_upload_offset(self.agent_id, unique_id, file_name)
+        if offset is None:
+            return False
+
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            # removed from the device behind our back, nothing left to upload
+            logger.error(f"[Uploader] {path} is gone, marking {unique_id} as evicted")
+            self._catalog.set_state([unique_id], AssetStateEnum.EVICTED, from_state=AssetStateEnum.REGISTERED)
+            return False
+
+        with file:
+            while offset < length:
+                file.seek(base + offset)
+                data = file.read(min(self.chunk_size, length - offset))
+                if not data:
+                    logger.error(f"[Uploader] {path} is shorter than the {length} bytes catalogued for {unique_id}")
+                    return False
+
+                if not self._bucket.consume(len(data), self._closing):
+                    return False
+
+                offset = self._backend_client.upload_chunk(self.agent_id, unique_id, file_name, offset, length, data)
+                if offset is None:
+                    return False
+
+        self._catalog.set_state([unique_id], AssetStateEnum.UPLOADED, from_state=AssetStateEnum.REGISTERED)
+        logger.debug(f"[Uploader] Uploaded {unique_id} ({length} bytes)")
+        return True
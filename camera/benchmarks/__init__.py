@@ -0,0 +1,7 @@
+import os
+
+# the agent's settings are read when artincam is imported: benchmarks never talk to a real backend (the stand-in's
+# address is set once it is running) and don't take the metrics port of an agent running on the same machine
+os.environ.setdefault("ARTINCAM_AGENT_ID", "benchmark")
+os.environ.setdefault("BACKEND_HOST", "127.0.0.1:0")
+os.environ.setdefault("METRICS_PORT", "0")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Runs the benchmark suite and writes the results as JSON, to compare runs across changes and devices.
+
+    python -m benchmarks                                   # everything, results in benchmarks/results/
+    python -m benchmarks --only overlay capture --quick    # a subset, smaller runs
+    python -m benchmarks --compare benchmarks/results/raspberrypi-20261017T120000.json
+
+Each benchmark can also be run on its own with its own options (`python -m benchmarks.capture --help`).
+"""
+
+import argparse
+import json
+import logging
+import pathlib
+import sys
+import time
+
+from benchmarks import backend_drain, capture, harness, overlay, transfer
+
+# name -> (run, its arguments for a full run, for a quick one)
+BENCHMARKS = {
+    "overlay": (overlay.run, {}, {"frames": 100}),
+    "capture": (capture.run, {}, {"images": 10, "recording_time": 2}),
+    "backend_drain": (backend_drain.run, {}, {"asset_files": 200, "action_logs": 60}),
+    "transfer": (transfer.run, {}, {"images": 50, "videos": 1}),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run, all by default")
+    parser.add_argument("--quick", action="store_true", help="smaller runs, to check the suite itself")
+    parser.add_argument("--output", type=pathlib.Path, help="results file, benchmarks/results/<host>-<time>.json")
+    parser.add_argument("--compare", type=pathlib.Path, help="previous results file to compare with")
+    parser.add_argument("--verbose", action="store_true", help="keep the agent's logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # the camera sets its own log level when imported, later than this
+        logging.disable(logging.INFO)
+
+    results = {"environment": harness.environment(), "quick": args.quick, "benchmarks": {}}
+
+    for name in args.only or BENCHMARKS:
+        run, full, quick = BENCHMARKS[name]
+        print(f"{name}...", file=sys.stderr)
+        started = time.monotonic()
+        results["benchmarks"][name] = run(**(quick if args.quick else full))
+        print(f"{name} done in {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+    path = harness.write_results(results, args.output)
+    print(json.dumps(results["benchmarks"], indent=2))
+    print(f"results written to {path}", file=sys.stderr)
+
+    if args.compare is not None:
+        previous = json.loads(args.compare.read_text())
+        if previous.get("environment", {}).get("host") != results["environment"]["host"]:
+            print("compared runs are from different hosts", file=sys.stderr)
+
+        changes = harness.compare(previous, results)
+        print(f"\n{len(changes)} change(s) over {harness.COMPARE_THRESHOLD:g}% against {args.compare}:")
+        for line in changes:
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
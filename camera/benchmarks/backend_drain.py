@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Backend traffic drained against the stand-in backend.
+
+Two queues are measured: the outbox (asset files registered in bulk by the OutboxSender, `batch_size` per call) and
+the camera's callbacks queue (action logs sent one call each by `workers` threads, like the camera's backend
+workers). `latency` is added by the stand-in to every request, the round trip to the real backend. Run from the
+camera directory:
+
+    python -m benchmarks.backend_drain --asset-files 1000 --action-logs 300 --latency 0.02
+"""
+
+import argparse
+import json
+import pathlib
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from queue import Queue
+
+from artincam.backend_service import BackendService
+from artincam.outbox import Outbox, OutboxSender
+from artincam.schemas import ActionLog, AssetFile, AssetFileTypeEnum
+from benchmarks import harness
+
+
+def _asset_file(i: int) -> AssetFile:
+    return AssetFile(
+        agent_id="benchmark",
+        camera_id="1",
+        location="benchmark",
+        timestamp=datetime.now(timezone.utc).isoformat(),
+        unique_id=f"0001-{i:010d}",
+        file_name=f"20260101000000_0001-{i:010d}_benchmark.jpg",
+        file_size=950_000,
+        file_type=AssetFileTypeEnum.IMAGE,
+    )
+
+
+def _drain_outbox(directory: pathlib.Path, asset_files: int, batch_size: int) -> dict:
+    outbox = Outbox(directory / f"outbox-{batch_size}.db")
+    for i in range(asset_files):
+        outbox.put_asset_file(_asset_file(i))
+
+    backend_client = BackendService()
+    started = time.perf_counter()
+    sender = OutboxSender(outbox, backend_client, max_batch_size=batch_size, max_latency=0)
+
+    while outbox.pending():
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    sender.close()
+
+    stats = backend_client.stats()
+    outbox.close()
+
+    return {
+        "name": f"batch-{batch_size}",
+        "batch_size": batch_size,
+        "asset_files": asset_files,
+        "asset_files_per_s": round(asset_files / elapsed, 1),
+        "requests": sum(endpoint["requests"] for endpoint in stats["endpoints"].values()),
+    }
+
+
+def _drain_callbacks(action_logs: int, workers: int) -> dict:
+    """Same loop as the camera's backend workers: take a callback from the queue, run it."""
+    backend_client = BackendService(pool_size=workers)
+    callbacks = Queue()
+    latencies = []
+    lock = threading.Lock()
+
+    def send(i: int):
+        started = time.perf_counter()
+        backend_client.create_action_log(ActionLog(agent_id="benchmark", category="health", message={"i": i}))
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    def worker():
+        while (callback := callbacks.get()) is not None:
+            callback()
+
+    for i in range(action_logs):
+        callbacks.put(lambda i=i: send(i))
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        callbacks.put(None)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "name": f"workers-{workers}",
+        "workers": workers,
+        "action_logs": action_logs,
+        "action_logs_per_s": round(action_logs / elapsed, 1),
+        "latency_ms": harness.percentiles(latencies),
+    }
+
+
+def run(
+    asset_files: int = 1000,
+    action_logs: int = 300,
+    batch_sizes: tuple[int, ...] = (1, 20),
+    workers: tuple[int, ...] = (1, 3),
+    latency: float = 0.01,
+) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+
+        with harness.stand_in_backend(directory / "uploads", latency=latency):
+            return {
+                "latency_ms": latency * 1000,
+                "outbox": [_drain_outbox(directory, asset_files, batch_size) for batch_size in batch_sizes],
+                "callbacks": [_drain_callbacks(action_logs, count) for count in workers],
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark draining the backend queues against the stand-in.")
+    parser.add_argument("--asset-files", type=int, default=1000)
+    parser.add_argument("--action-logs", type=int, default=300)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds the stand-in adds to every request")
+    args = parser.parse_args()
+
+    results = run(args.asset_files, args.action_logs, tuple(args.batch_sizes), tuple(args.workers), args.latency)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
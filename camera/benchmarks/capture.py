@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Image and video capture throughput against the mock Picamera2.
+
+The mock produces frames at the configured resolution and framerate through the camera's pre_callback (overlay and
+frame timing), its encoder writes packets sized from the bitrate. Images are taken back to back with
+`_capture_image` (time the capture thread is held, and how long the writer takes to get them on disk), then one
+`_capture_video` per bitrate (file size against the bitrate, time on top of `recording_time`, dropped frames). Run
+from the camera directory:
+
+    python -m benchmarks.capture --width 1640 --height 1232 --images 50 --recording-time 5
+"""
+
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+
+from benchmarks import harness
+
+
+def _capture_images(camera, images: int) -> dict:
+    clip = camera._frame_timing.start_clip()
+    latencies = []
+
+    started = time.perf_counter()
+    for _ in range(images):
+        capture_started = time.perf_counter()
+        camera._capture_image()
+        latencies.append(time.perf_counter() - capture_started)
+    captured = time.perf_counter() - started
+
+    writer = camera._image_writer
+    while writer.written + writer.dropped < images:
+        time.sleep(0.01)
+    written = time.perf_counter() - started
+
+    sizes = [path.stat().st_size for path in camera._storage.destination().glob("*.jpg")]
+
+    return {
+        "images": images,
+        "capture_ms": harness.percentiles(latencies),
+        "captures_per_s": round(images / captured, 2),
+        "written_per_s": round(writer.written / written, 2),
+        "dropped": writer.dropped,
+        "mean_file_kb": round(sum(sizes) / len(sizes) / 1024, 1) if sizes else None,
+        "frames_dropped": camera._frame_timing.finish_clip(clip)["dropped"],
+    }
+
+
+def _capture_video(camera, bitrate: int) -> dict:
+    camera._bitrate = bitrate
+    camera.setup_encoders()
+
+    videos = []
+    record_video = camera._video_written
+
+    def video_written(asset_file, output_filepath, preview_filepath=None):
+        videos.append(asset_file)
+        record_video(asset_file, output_filepath, preview_filepath)
+
+    camera._video_written = video_written
+    started = time.perf_counter()
+    try:
+        camera._capture_video()
+    finally:
+        del camera._video_written
+    elapsed = time.perf_counter() - started
+
+    asset_file = videos[0]
+    expected_size = bitrate / 8 * camera._recording_time
+
+    return {
+        "name": f"{bitrate}bps",
+        "bitrate": bitrate,
+        "file_mb": round(asset_file.file_size / 2**20, 2),
+        "size_ratio": round(asset_file.file_size / expected_size, 3),
+        "overhead_ms": round((elapsed - camera._recording_time) * 1000, 1),
+        "measured_fps": asset_file.frame_timing["measured_fps"],
+        "frames_dropped": asset_file.frame_timing["dropped"],
+        "overlay_ms": asset_file.frame_timing["callbacks_ms"]["overlay"],
+    }
+
+
+def run(
+    width: int = 1640,
+    height: int = 1232,
+    framerate: int = 24,
+    images: int = 50,
+    recording_time: int = 5,
+    bitrates: tuple[int, ...] = (4_194_304, 8_388_608),
+) -> dict:
+    camera_config = {
+        "mode": "image/video",
+        "resolution": {"width": width, "height": height},
+        "framerate": framerate,
+        "recording_time": recording_time,
+        "recording_time_unit": "s",
+        "image_rest_time": 1,
+        "image_rest_time_unit": "s",
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+
+        with harness.stand_in_backend(directory / "uploads"), harness.camera(directory, camera_config) as camera:
+            # the first frames go through the mock's frame loop while it settles
+            time.sleep(1)
+            results = {
+                "resolution": f"{width}x{height}",
+                "framerate": framerate,
+                "image": _capture_images(camera, images),
+                "video": [_capture_video(camera, bitrate) for bitrate in bitrates],
+            }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image and video captures against the mock camera.")
+    parser.add_argument("--width", type=int, default=1640)
+    parser.add_argument("--height", type=int, default=1232)
+    parser.add_argument("--framerate", type=int, default=24)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--recording-time", type=int, default=5, help="seconds per video")
+    parser.add_argument("--bitrates", type=int, nargs="+", default=[4_194_304, 8_388_608])
+    args = parser.parse_args()
+
+    results = run(args.width, args.height, args.framerate, args.images, args.recording_time, tuple(args.bitrates))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Crash check of the capture counter (FileCounter): ids must never be reused, whenever the agent dies.
+
+Runs the counter in child processes that take ids like the camera does (use `counter`, then `increment_counter`)
+and kills each of them (os._exit, nothing is cleaned up) at a chosen point of a counter file write: after the
+temporary file is written, after its fsync, after the replace, or after the directory fsync. The next child starts
+from whatever the killed one left on disk. Exits with 1 if an id is handed out twice or the counter goes backwards.
+The point, the write and the number of ids taken are random but seeded, a run can be repeated. Run from the camera
+directory:
+
+    python -m benchmarks.file_counter --runs 200 --seed 1
+"""
+
+import argparse
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tempfile
+
+# where the child dies during a counter file write: (wrapped call, before/after it, 0 for the file's fsync or 1 for
+# the directory's)
+CRASH_POINTS = {
+    "after-tmp-write": ("fsync", "before", 0),
+    "after-tmp-fsync": ("replace", "before", 0),
+    "after-replace": ("replace", "after", 0),
+    "after-dir-fsync": ("fsync", "after", 1),
+}
+CRASH_EXIT_CODE = 86
+# small blocks so most runs go through a few writes
+BLOCK_SIZE = 10
+
+
+def _child(path: pathlib.Path, point: str, write: int, captures: int):
+    """Takes `captures` ids, printing each one as it is used, and dies at `point` of the `write`-th counter write."""
+    from artincam.camera import FileCounter
+
+    call, when, nth = CRASH_POINTS[point]
+    calls = {"fsync": 0, "replace": 0}
+    # every write is one file fsync, one replace and one directory fsync
+    target = write * 2 - 1 + nth if call == "fsync" else write
+
+    def crashing(name: str, real):
+        def wrapper(*args):
+            calls[name] += 1
+            if calls[name] == target and when == "before":
+                os._exit(CRASH_EXIT_CODE)
+            result = real(*args)
+            if calls[name] == target and when == "after":
+                os._exit(CRASH_EXIT_CODE)
+            return result
+
+        return wrapper
+
+    os.fsync = crashing("fsync", os.fsync)
+    os.replace = crashing("replace", os.replace)
+    FileCounter.BLOCK_SIZE = BLOCK_SIZE
+
+    counter = FileCounter(path)
+    for _ in range(captures):
+        print(counter.counter, flush=True)
+        counter.increment_counter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that capture counter ids survive crashes without reuse.")
+    parser.add_argument("--runs", type=int, default=100, help="child processes, each killed at a random point")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", nargs=4, metavar=("PATH", "POINT", "WRITE", "CAPTURES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path, point, write, captures = args.child
+        _child(pathlib.Path(path), point, int(write), int(captures))
+        return
+
+    rng = random.Random(args.seed)
+    ids = []
+    crashes = dict.fromkeys(CRASH_POINTS, 0)
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory) / "counter.txt"
+
+        for run in range(args.runs):
+            point = rng.choice(list(CRASH_POINTS))
+            # the first write is the reservation at startup, the next ones each BLOCK_SIZE ids
+            write = rng.randint(1, 4)
+            captures = rng.randint(0, BLOCK_SIZE * 4)
+            command = ["--child", str(path), point, str(write), str(captures)]
+            child = subprocess.run(
+                [sys.executable, "-m", "benchmarks.file_counter", *command], capture_output=True, text=True
+            )
+
+            if child.returncode not in (0, CRASH_EXIT_CODE):
+                failures.append(f"run {run} ({point}, write {write}) failed:\n{child.stderr}")
+                break
+
+            if child.returncode == CRASH_EXIT_CODE:
+                crashes[point] += 1
+
+            taken = [int(line) for line in child.stdout.split()]
+            if ids and taken and taken[0] <= ids[-1]:
+                failures.append(f"run {run} ({point}, write {write}) started at {taken[0]} after {ids[-1]}")
+            ids.extend(taken)
+
+    if len(set(ids)) != len(ids):
+        failures.append(f"{len(ids) - len(set(ids))} id(s) handed out twice")
+
+    print(f"{args.runs} runs, {sum(crashes.values())} killed: {crashes}")
+    print(f"{len(ids)} ids taken, last {ids[-1] if ids else None}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if failures:
+        sys.exit(1)
+
+    print("OK: no id was reused")
+
+
+if __name__ == "__main__":
+    main()
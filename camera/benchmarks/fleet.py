@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Fleet load: many agents against one backend.
+
+Runs `agents` ArtincamAgents in this process, each with its own Camera (mock Picamera2, its own outbox, catalog and
+output directory) and the real BackendService and websocket code, capturing at the configured cadence. The agents are
+created through the backend's agents API, then measured:
+
+- connect: time from an agent's start to its websocket being connected (agents start over `ramp` seconds)
+- registration: asset files registration requests, and end to end from the capture to the backend accepting it
+  (this one includes the outbox batching, up to ASSET_BATCH_LATENCY seconds)
+- broadcasts: the config of every agent is updated at once (PATCH /api/v1/agents/<id>), time until each agent got
+  it on its websocket and until its camera applied it
+- reconnect storms: every websocket is closed at once, time for each agent to be connected again on top of its
+  reconnect delay
+
+The in-process stand-in backend is used by default, pass `--backend` to load a real one (agents and their files are
+left on it). The stand-in and the agents share this process, on one machine the results say more about the agent's
+side than about the backend. Run from the camera directory, it isn't part of `python -m benchmarks`:
+
+    python -m benchmarks.fleet --agents 50 --image-rest-time 2 --duration 30 --broadcasts 5 --reconnect-storms 2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import logging
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from artincam import camera as camera_module
+from artincam.agent import ArtincamAgent
+from artincam.backend_service import BackendService
+from artincam.camera import Camera
+from benchmarks import harness
+
+ARTICAM_PI_AGENT_TYPE_ID = 1
+# seconds to wait for a broadcast to reach every agent, or for every agent to reconnect
+TIMEOUT = 30.0
+
+
+class FleetRecorder:
+    """Latencies reported by every agent and camera of the fleet, from their threads."""
+
+    def __init__(self):
+        self.registration_requests = []
+        self.registration_end_to_end = []
+        self.registered = 0
+        self._lock = threading.Lock()
+
+    def record_registration(self, asset_files: list, elapsed: float, created: bool):
+        now = datetime.now(timezone.utc)
+
+        with self._lock:
+            self.registration_requests.append(elapsed)
+            if created:
+                self.registered += len(asset_files)
+                self.registration_end_to_end.extend(
+                    (now - datetime.fromisoformat(asset_file.timestamp)).total_seconds() for asset_file in asset_files
+                )
+
+
+class SimulatedCamera(Camera):
+    """A Camera with its files in its own directory, timing the registration of its asset files."""
+
+    def __init__(self, agent_messages, stop_event, agent_id: str, directory: pathlib.Path, recorder: FleetRecorder):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.OUTBOX_PATH = directory / "outbox.db"
+        self.CATALOG_PATH = directory / "catalog.db"
+        self.CONFIG_PATH = directory / "last_config.json"
+        self.COUNTER_PATH = directory / "counter.txt"
+        self.STARTUP_TRACE_PATH = directory / "startup_trace.json"
+        # location -> when a config update with it was applied
+        self.applied = {}
+
+        super().__init__(agent_messages, stop_event, agent_id=agent_id)
+
+        create_asset_files = self._backend_client.create_asset_files
+
+        def timed_create_asset_files(asset_files):
+            started = time.perf_counter()
+            created = create_asset_files(asset_files)
+            recorder.record_registration(asset_files, time.perf_counter() - started, created is not None)
+            return created
+
+        self._backend_client.create_asset_files = timed_create_asset_files
+
+    def _reconfigure(self, config, source: str):
+        super()._reconfigure(config, source)
+        self.applied.setdefault(config.camera.location, time.perf_counter())
+
+
+class SimulatedAgent(ArtincamAgent):
+    """An agent noting when each config update (told apart by its location) reached it."""
+
+    def __init__(self, agent_id: str, camera_factory):
+        super().__init__(agent_id, camera_factory)
+        # location -> when a config update with it was received
+        self.delivered = {}
+
+    def _parse_message(self, msg: str):
+        with contextlib.suppress(ValueError, KeyError, TypeError):
+            parsed_msg = json.loads(msg)
+            if parsed_msg.get("type") == "config-update":
+                self.delivered.setdefault(parsed_msg["config"]["camera"]["location"], time.perf_counter())
+
+        super()._parse_message(msg)
+
+
+def _agent_id(index: int) -> str:
+    # stable ids, a rerun against a real backend updates the same agents
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"artincam-fleet/{index}"))
+
+
+def _config(index: int, location: str, mode: str, image_rest_time: int, width: int, height: int, framerate: int):
+    return {
+        "camera": {
+            "mode": mode,
+            "status": "ACTIVE",
+            "resolution": {"width": width, "height": height},
+            "framerate": framerate,
+            "output_dir": f"output/fleet-{index:04d}",
+            "location": location,
+            "pi_id": index,
+            "image_rest_time": image_rest_time,
+            "recording_time": 5,
+            "cycle_rest_time": image_rest_time,
+        }
+    }
+
+
+def _register_agents(session, base_url: str, configs: dict[str, dict]):
+    """Creates the agents on the backend, or updates the ones a previous run left."""
+    for index, (agent_id, config) in enumerate(configs.items()):
+        body = {
+            "id": agent_id,
+            "name": f"fleet-{index:04d}",
+            "description": "Simulated by benchmarks.fleet",
+            "agent_type_id": ARTICAM_PI_AGENT_TYPE_ID,
+            "config": config,
+        }
+        response = session.post(f"{base_url}/api/v1/agents", json=body, timeout=10)
+
+        if response.status_code >= 400:
+            response = session.patch(f"{base_url}/api/v1/agents/{agent_id}", json={"config": config}, timeout=10)
+            response.raise_for_status()
+
+
+async def _wait(condition, timeout: float = TIMEOUT) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+async def _start(agents: list[SimulatedAgent], ramp: float) -> list[float]:
+    latencies = []
+
+    async def start(agent: SimulatedAgent, delay: float):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        agent.start()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(agent.connected.wait(), TIMEOUT)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(start(agent, ramp * i / len(agents)) for i, agent in enumerate(agents)))
+    return latencies
+
+
+async def _broadcast(session, base_url: str, agents: list[SimulatedAgent], configs: dict, location: str) -> dict:
+    """Updates the config of every agent at once, like a fleet-wide change from the frontend."""
+    patch_latencies = []
+
+    def patch(agent_id: str):
+        config = json.loads(json.dumps(configs[agent_id]))
+        config["camera"]["location"] = location
+        configs[agent_id] = config
+
+        started = time.perf_counter()
+        session.patch(f"{base_url}/api/v1/agents/{agent_id}", json={"config": config}, timeout=TIMEOUT)
+        patch_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(patch, agent._agent_id) for agent in agents))
+    await _wait(lambda: all(location in agent.camera.applied for agent in agents))
+
+    delivered = [agent.delivered[location] - started for agent in agents if location in agent.delivered]
+    applied = [agent.camera.applied[location] - started for agent in agents if location in agent.camera.applied]
+
+    return {
+        "name": location,
+        "patch_ms": harness.percentiles(patch_latencies),
+        "delivery_ms": harness.percentiles(delivered),
+        "applied_ms": harness.percentiles(applied),
+        "missed": len(agents) - len(delivered),
+    }
+
+
+async def _reconnect_storm(agents: list[SimulatedAgent], storm: int) -> dict:
+    """Drops every websocket at once, like a backend restart, every agent reconnects after its RECONNECT_DELAY."""
+    latencies = []
+
+    async def reconnect(agent: SimulatedAgent):
+        ws = agent._ws
+        if ws is None:
+            return
+
+        started = time.perf_counter()
+        await ws.close()
+        if await _wait(lambda: agent._ws is not ws and agent.connected.is_set()):
+            latencies.append(time.perf_counter() - started - agent.RECONNECT_DELAY)
+
+    await asyncio.gather(*(reconnect(agent) for agent in agents))
+
+    return {
+        "name": f"storm-{storm}",
+        "reconnect_ms": harness.percentiles(latencies),
+        "missed": len(agents) - len(latencies),
+    }
+
+
+async def _run_fleet(
+    base_url: str,
+    directory: pathlib.Path,
+    agents: int,
+    mode: str,
+    image_rest_time: int,
+    resolution: tuple[int, int],
+    framerate: int,
+    duration: float,
+    broadcasts: int,
+    reconnect_storms: int,
+    reconnect_delay: float,
+    ramp: float,
+) -> dict:
+    import requests
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=agents))
+    configs = {_agent_id(i): _config(i, "fleet", mode, image_rest_time, *resolution, framerate) for i in range(agents)}
+    await asyncio.to_thread(_register_agents, session, base_url, configs)
+
+    recorder = FleetRecorder()
+    SimulatedAgent.RECONNECT_DELAY = reconnect_delay
+    fleet = [
+        SimulatedAgent(
+            agent_id,
+            functools.partial(SimulatedCamera, directory=directory / "agents" / agent_id, recorder=recorder),
+        )
+        for agent_id in configs
+    ]
+
+    started = time.perf_counter()
+    connect = await _start(fleet, ramp)
+
+    try:
+        # captures and their registration run for the whole duration, broadcasts and storms are spread over it
+        events = [("broadcast", i) for i in range(broadcasts)] + [("storm", i) for i in range(reconnect_storms)]
+        interval = duration / (len(events) + 1)
+        broadcast_results, storm_results = [], []
+
+        for n, (kind, i) in enumerate(events, start=1):
+            await asyncio.sleep(max(0.0, started + interval * n - time.perf_counter()))
+            if kind == "broadcast":
+                broadcast_results.append(await _broadcast(session, base_url, fleet, configs, f"fleet-b{i}"))
+            else:
+                storm_results.append(await _reconnect_storm(fleet, i))
+
+        await asyncio.sleep(max(0.0, started + duration - time.perf_counter()))
+    finally:
+        await asyncio.gather(*(agent.stop() for agent in fleet))
+
+    return {
+        "agents": agents,
+        "connected": len(connect),
+        "connect_ms": harness.percentiles(connect),
+        "registration": {
+            "asset_files": recorder.registered,
+            "asset_files_per_s": round(recorder.registered / duration, 1),
+            "request_ms": harness.percentiles(recorder.registration_requests),
+            "end_to_end_ms": harness.percentiles(recorder.registration_end_to_end),
+        },
+        "broadcasts": broadcast_results,
+        "reconnect_storms": storm_results,
+    }
+
+
+def run(
+    agents: int = 20,
+    mode: str = "image",
+    image_rest_time: int = 2,
+    resolution: tuple[int, int] = (320, 240),
+    framerate: int = 5,
+    duration: float = 30.0,
+    broadcasts: int = 3,
+    reconnect_storms: int = 1,
+    reconnect_delay: float = 1.0,
+    ramp: float = 2.0,
+    backend: str | None = None,
+    latency: float = 0.0,
+) -> dict:
+    with tempfile.TemporaryDirectory() as directory, contextlib.ExitStack() as stack:
+        directory = pathlib.Path(directory)
+        # every camera's outputs under the temporary directory
+        root_directory = camera_module.ROOT_DIRECTORY
+        camera_module.ROOT_DIRECTORY = directory
+        stack.callback(setattr, camera_module, "ROOT_DIRECTORY", root_directory)
+
+        if backend is None:
+            # points BackendService and the agents' websocket at it
+            stack.enter_context(harness.stand_in_backend(directory / "uploads", latency=latency))
+        else:
+            base_url, ws_url = BackendService.BASE_URL, ArtincamAgent.WS_URL
+            BackendService.BASE_URL = f"http://{backend}"
+            ArtincamAgent.WS_URL = f"ws://{backend}/ws/v1/agent"
+            stack.callback(setattr, BackendService, "BASE_URL", base_url)
+            stack.callback(setattr, ArtincamAgent, "WS_URL", ws_url)
+
+        results = asyncio.run(
+            _run_fleet(
+                BackendService.BASE_URL,
+                directory,
+                agents,
+                mode,
+                image_rest_time,
+                resolution,
+                framerate,
+                duration,
+                broadcasts,
+                reconnect_storms,
+                reconnect_delay,
+                ramp,
+            )
+        )
+
+    return {
+        "backend": backend or "stand-in",
+        "mode": mode,
+        "image_rest_time_s": image_rest_time,
+        "resolution": f"{resolution[0]}x{resolution[1]}",
+        "duration_s": duration,
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a backend with a fleet of simulated agents.")
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--mode", choices=["image", "video", "image/video"], default="image")
+    parser.add_argument("--image-rest-time", type=int, default=2, help="seconds between images (and between videos)")
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--framerate", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds the fleet runs")
+    parser.add_argument("--broadcasts", type=int, default=3, help="config updates sent to every agent at once")
+    parser.add_argument("--reconnect-storms", type=int, default=1, help="times every websocket is dropped at once")
+    parser.add_argument("--reconnect-delay", type=float, default=1.0, help="seconds an agent waits to reconnect")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which the agents are started")
+    parser.add_argument("--backend", help="host:port of a real backend, the in-process stand-in by default")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stand-in adds to every request")
+    parser.add_argument(
+        "--output", type=pathlib.Path, help="also write the results, with the environment, to this file"
+    )
+    parser.add_argument("--verbose", action="store_true", help="keep the agents' logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    # every agent reports its websocket state on stdout
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        results = run(
+            args.agents,
+            args.mode,
+            args.image_rest_time,
+            (args.width, args.height),
+            args.framerate,
+            args.duration,
+            args.broadcasts,
+            args.reconnect_storms,
+            args.reconnect_delay,
+            args.ramp,
+            args.backend,
+            args.latency,
+        )
+
+    print(json.dumps(results, indent=2))
+
+    if args.output is not None:
+        path = harness.write_results(
+            {"environment": harness.environment(), "benchmarks": {"fleet": results}}, args.output
+        )
+        print(f"results written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Shared pieces of the benchmark suite: the stand-in backend, a camera in a temporary directory, latency percentiles
+and the results file.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+from queue import Queue
+
+CAMERA_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent
+RESULTS_DIRECTORY = CAMERA_DIRECTORY / "benchmarks" / "results"
+# changes smaller than this (percent) are noise between two runs on the same machine
+COMPARE_THRESHOLD = 5.0
+
+
+@contextlib.contextmanager
+def stand_in_backend(upload_dir: pathlib.Path, latency: float = 0.0):
+    """Runs the stand-in backend on a free port and points the agent's BackendService and websocket at it."""
+    from artincam.agent import ArtincamAgent
+    from artincam.backend_service import BackendService
+    from support.stand_in_backend import start
+
+    server = start(port=0, upload_dir=upload_dir, latency=latency)
+    base_url, ws_url = BackendService.BASE_URL, ArtincamAgent.WS_URL
+    BackendService.BASE_URL = f"http://127.0.0.1:{server.server_port}"
+    ArtincamAgent.WS_URL = f"ws://127.0.0.1:{server.server_port}/ws/v1/agent"
+
+    try:
+        yield server
+    finally:
+        BackendService.BASE_URL, ArtincamAgent.WS_URL = base_url, ws_url
+        server.shutdown()
+        server.server_close()
+
+
+@contextlib.contextmanager
+def camera(directory: pathlib.Path, camera_config: dict):
+    """A Camera configured with `camera_config` (the `camera` part of the agent config), its files in `directory` and
+    its mock Picamera2 started, ready for the capture methods to be called directly.
+    """
+    from artincam import camera as camera_module
+    from artincam.schemas import ArtincamPiAgentConfig
+
+    patched = {
+        (camera_module.Camera, "OUTBOX_PATH"): directory / "outbox.db",
+        (camera_module.Camera, "CATALOG_PATH"): directory / "catalog.db",
+        (camera_module.Camera, "CONFIG_PATH"): directory / "last_config.json",
+        (camera_module.Camera, "STARTUP_TRACE_PATH"): directory / "startup_trace.json",
+        (camera_module.Camera, "COUNTER_PATH"): directory / "counter.txt",
+        (camera_module, "ROOT_DIRECTORY"): directory,
+    }
+    originals = {key: getattr(*key) for key in patched}
+    for (owner, name), value in patched.items():
+        setattr(owner, name, value)
+
+    config = ArtincamPiAgentConfig.model_validate(
+        {
+            "camera": {
+                "status": "ACTIVE",
+                "output_dir": "output",
+                "location": "benchmark",
+                "pi_id": 1,
+                **camera_config,
+            }
+        }
+    )
+    stop_event = threading.Event()
+    instance = camera_module.Camera(Queue(), stop_event)
+
+    try:
+        instance._set_config_update(config)
+        instance.setup()
+        instance.picam.start()
+        instance._use_pre_callback()
+        yield instance
+    finally:
+        stop_event.set()
+        instance.close()
+        for (owner, name), value in originals.items():
+            setattr(owner, name, value)
+
+
+def percentiles(samples: list[float], scale: float = 1000) -> dict:
+    """p50/p90/p99/max of `samples` (seconds), in milliseconds by default."""
+    if not samples:
+        return {}
+
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+
+    return {
+        "p50": round(cuts[49] * scale, 3),
+        "p90": round(cuts[89] * scale, 3),
+        "p99": round(cuts[98] * scale, 3),
+        "max": round(max(samples) * scale, 3),
+    }
+
+
+def environment() -> dict:
+    """What the results were measured on, runs are only comparable on the same machine."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=CAMERA_DIRECTORY, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision,
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "python": sys.version.split()[0],
+    }
+
+
+def write_results(results: dict, path: pathlib.Path | None = None) -> pathlib.Path:
+    if path is None:
+        stamp = results["environment"]["timestamp"].replace(":", "").replace("-", "")[:15]
+        path = RESULTS_DIRECTORY / f"{results['environment']['host']}-{stamp}.json"
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2) + "\n")
+    return path
+
+
+def _flatten(value, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+
+    if isinstance(value, list):
+        flat = {}
+        for i, item in enumerate(value):
+            # runs with parameters (bitrate, workers) are keyed by them so reordering doesn't break the comparison
+            key = item.get("name", i) if isinstance(item, dict) else i
+            flat.update(_flatten(item, f"{prefix}[{key}]"))
+        return flat
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+
+    return {}
+
+
+def compare(previous: dict, current: dict) -> list[str]:
+    """Lines listing every number of the benchmarks that changed by more than COMPARE_THRESHOLD percent."""
+    before = _flatten(previous.get("benchmarks", {}))
+    after = _flatten(current.get("benchmarks", {}))
+    lines = []
+
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+
+        if old == new:
+            continue
+
+        change = (new - old) / abs(old) * 100 if old else float("inf")
+        if abs(change) >= COMPARE_THRESHOLD:
+            lines.append(f"{key:<60} {old:>14g} -> {new:<14g} {change:+.1f}%")
+
+    for key in sorted(after.keys() - before.keys()):
+        lines.append(f"{key:<60} {'new':>14} -> {after[key]:<14g}")
+
+    return lines
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Timestamp overlay benchmark against the mock Picamera2.
+
+Compares the previous per-frame opencv overlay (rectangle + putText on every frame) with the cached
+TimestampOverlay tile, and the tile behind the frame timing analyzer (the camera's pre_callback). Run from the camera
+directory:
+
+    python -m benchmarks.overlay --width 1640 --height 1232 --frames 500
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from artincam.frame_timing import FrameTimingAnalyzer
+from artincam.mocks.picamera2 import CompletedRequest, MappedArray
+from artincam.overlay import TIMESTAMP_FORMAT, TimestampOverlay
+
+
+def legacy_timestamp_overlay(width: int, height: int):
+    """Overlay as it was applied before the tile cache, kept here as the baseline."""
+    text_color = (255, 255, 255)  # color - white
+    bg_color = (0, 0, 0)  # color - black
+    padding = 5
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = 1
+    thickness = 2
+
+    x_axis_location = width - 400
+    y_axis_location = height - 50
+    origin = (x_axis_location, y_axis_location)
+
+    (text_width, text_height), _ = cv2.getTextSize(time.strftime(TIMESTAMP_FORMAT), font, scale, thickness)
+
+    top_left = (x_axis_location - padding, y_axis_location - text_height - padding)
+    bottom_right = (x_axis_location + text_width + padding, y_axis_location + padding)
+
+    def apply_timestamp(request):
+        with MappedArray(request, "main") as m:
+            image = m.array
+            cv2.rectangle(image, top_left, bottom_right, bg_color, cv2.FILLED)
+            cv2.putText(image, time.strftime(TIMESTAMP_FORMAT), origin, font, scale, text_color, thickness)
+
+    return apply_timestamp
+
+
+def measure(pre_callback, requests: list[CompletedRequest], frames: int) -> float:
+    """Returns microseconds per frame spent in the pre_callback."""
+    # warm up, the cached overlay renders its first tile here
+    pre_callback(requests[0])
+
+    start = time.perf_counter()
+    for i in range(frames):
+        pre_callback(requests[i % len(requests)])
+    return (time.perf_counter() - start) / frames * 1_000_000
+
+
+def run(width: int = 1640, height: int = 1232, channels: int = 4, frames: int = 500) -> dict:
+    # a few distinct buffers so we are not always hitting the same cache lines, like the camera's buffer pool
+    rng = np.random.default_rng(0)
+    requests = [
+        CompletedRequest(
+            arrays={"main": rng.integers(0, 255, (height, width, channels), dtype=np.uint8)},
+            metadata={"SensorTimestamp": 0},
+        )
+        for _ in range(4)
+    ]
+
+    legacy = measure(legacy_timestamp_overlay(width, height), requests, frames)
+    overlay = TimestampOverlay(width, height)
+    cached = measure(overlay.apply, requests, frames)
+    # the camera's actual pre_callback, the overlay behind the frame timing analyzer
+    analyzed = measure(FrameTimingAnalyzer(1_000_000 // 24, [("overlay", overlay.apply)]), requests, frames)
+
+    return {
+        "frame": f"{width}x{height}x{channels}",
+        "frames": frames,
+        "legacy_us_per_frame": round(legacy, 1),
+        "cached_us_per_frame": round(cached, 1),
+        "analyzed_us_per_frame": round(analyzed, 1),
+        "speedup": round(legacy / cached, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the timestamp overlay pre_callback.")
+    parser.add_argument("--width", type=int, default=1640)
+    parser.add_argument("--height", type=int, default=1232)
+    parser.add_argument("--channels", type=int, default=4, help="4 for XBGR8888 (picamera2 default), 3 for BGR888")
+    parser.add_argument("--frames", type=int, default=500)
+    args = parser.parse_args()
+
+    results = run(args.width, args.height, args.channels, args.frames)
+
+    print(f"frame: {results['frame']}, frames: {results['frames']}")
+    print(f"legacy overlay: {results['legacy_us_per_frame']:10.1f} us/frame")
+    print(f"cached overlay: {results['cached_us_per_frame']:10.1f} us/frame")
+    print(f"with analyzer:  {results['analyzed_us_per_frame']:10.1f} us/frame")
+    print(f"speedup:        {results['speedup']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Continuous recording check against the mock outputs.
+
+Feeds a long run of encoded frames (keyframe every `iperiod`) through SegmentedOutput and checks that the files it
+cuts cover every frame exactly once: each file starts on a keyframe, and the first frame of each file is the frame
+right after the last frame of the previous one (no frame-time gap). Every file must also have been given the
+encoder's video stream before its first frame, the muxer can't write packets otherwise. Exits with 1 when a check
+fails. Run from the camera directory:
+
+    python -m benchmarks.segmented_video --framerate 24 --recording-time 10 --seconds 600
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from artincam import segmented_output
+from artincam.mocks.picamera2 import Output
+from artincam.segmented_output import SegmentedOutput, VideoSegment
+
+
+class RecordingOutput(Output):
+    """Stands in for PyavOutput, keeps what would have been written to each file."""
+
+    files: dict[str, list[tuple[int, bool]]] = {}
+    # files that got a frame before the video stream was added
+    streamless: set[str] = set()
+
+    def __init__(self, filename: str, format: str | None = None):
+        super().__init__()
+        self.filename = filename
+        self.streams = set()
+        RecordingOutput.files[filename] = []
+
+    def _add_stream(self, encoder_stream, codec_name, **kwargs):
+        self.streams.add(encoder_stream)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if "video" not in self.streams:
+            RecordingOutput.streamless.add(self.filename)
+        RecordingOutput.files[self.filename].append((timestamp, keyframe))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that continuous recording files have no gaps.")
+    parser.add_argument("--framerate", type=int, default=24)
+    parser.add_argument("--recording-time", type=int, default=10, help="seconds per file")
+    parser.add_argument("--seconds", type=int, default=600, help="length of the recording")
+    parser.add_argument("--jitter", type=float, default=0.1, help="frame time jitter, fraction of a frame")
+    args = parser.parse_args()
+
+    segmented_output.PyavOutput = RecordingOutput
+
+    names = (f"segment-{i:05d}.mkv" for i in range(sys.maxsize))
+    closed: list[VideoSegment] = []
+    output = SegmentedOutput(args.recording_time, lambda: next(names), closed.append)
+    # like the encoder: the output is started, then told about the stream
+    output.start()
+    output._add_stream("video", "h264", rate=args.framerate)
+
+    # sensor timestamps (microseconds) at the framerate with some jitter, the encoder's keyframe every framerate frames
+    rng = np.random.default_rng(0)
+    frame_time = 1_000_000 / args.framerate
+    count = args.seconds * args.framerate
+    jitter = rng.uniform(-args.jitter, args.jitter, count) * frame_time
+    timestamps = [int(i * frame_time + jitter[i]) + 1_000_000 for i in range(count)]
+
+    for i, timestamp in enumerate(timestamps):
+        output.outputframe(b"\0" * 16, keyframe=i % args.framerate == 0, timestamp=timestamp)
+    output.stop()
+
+    written = [frame for segment in closed for frame in RecordingOutput.files[segment.filename]]
+    failures = []
+
+    if [timestamp for timestamp, _ in written] != timestamps:
+        failures.append(f"{len(written)} frames written for {len(timestamps)} encoded, or out of order")
+
+    for previous, segment in zip(closed, closed[1:]):
+        expected = timestamps[timestamps.index(previous.last_timestamp) + 1]
+        if segment.first_timestamp != expected:
+            failures.append(f"gap between {previous.filename} and {segment.filename}")
+
+    for segment in closed:
+        if not RecordingOutput.files[segment.filename][0][1]:
+            failures.append(f"{segment.filename} doesn't start on a keyframe")
+        if segment.filename in RecordingOutput.streamless:
+            failures.append(f"{segment.filename} has no video stream")
+
+    durations = [segment.duration + 1 / args.framerate for segment in closed]
+    print(f"{len(timestamps)} frames in {len(closed)} files")
+    print(
+        f"file duration: min {min(durations):.3f}s, max {max(durations):.3f}s (recording_time {args.recording_time}s)"
+    )
+    print(f"frames written: {len(written)}, dropped: {len(timestamps) - len(written)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if failures:
+        sys.exit(1)
+
+    print("OK: no frame-time gaps between files, every file has the video stream")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Copy speed of the usb transfer engine (support/transfer_file.py).
+
+Generates a mix of capture-sized files (JPEG-sized images, 10s videos) and moves them with the TransferEngine for
+each worker count, with and without hash verification. Source and destination are temporary directories, pass
+`--destination` to measure a real usb stick (a directory on it, emptied afterwards). Run from the camera directory:
+
+    python -m benchmarks.transfer --images 200 --videos 4 --destination /media/pi/usb/benchmark
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+from support.transfer_file import ONE_MB, TransferEngine
+
+IMAGE_SIZE = 950_000
+VIDEO_SIZE = 10 * ONE_MB
+
+
+def _generate(directory: pathlib.Path, images: int, videos: int) -> list[tuple[pathlib.Path, int]]:
+    directory.mkdir(parents=True, exist_ok=True)
+    # random content, so nothing (filesystem, device) gets away with compressing or deduplicating it
+    chunk = os.urandom(ONE_MB)
+    files = []
+
+    for i in range(images + videos):
+        size = VIDEO_SIZE if i >= images else IMAGE_SIZE
+        path = directory / f"{i:06d}.{'mkv' if i >= images else 'jpg'}"
+
+        with open(path, "wb") as file:
+            for offset in range(0, size, ONE_MB):
+                file.write(chunk[: min(ONE_MB, size - offset)])
+
+        files.append((path, size))
+
+    return files
+
+
+def _transfer(
+    source: pathlib.Path, destination: pathlib.Path, images: int, videos: int, workers: int, verify: str
+) -> dict:
+    files = _generate(source, images, videos)
+    destination.mkdir(parents=True, exist_ok=True)
+    engine = TransferEngine(destination, workers=workers, verify=verify)
+
+    # the engine reports every batch on stdout for the interactive script
+    with contextlib.redirect_stdout(io.StringIO()):
+        interrupted = engine.transfer(files, shutil.disk_usage(destination).free)
+
+    for path in destination.iterdir():
+        if path.is_file():
+            path.unlink()
+
+    elapsed = max(engine.elapsed, 1e-9)
+
+    return {
+        "name": f"workers-{workers}-{verify}",
+        "workers": workers,
+        "verify": verify,
+        "files": engine.files,
+        "failed": engine.failed,
+        "interrupted": interrupted,
+        "mb_per_s": round(engine.bytes / ONE_MB / elapsed, 1),
+        "files_per_s": round(engine.files / elapsed, 1),
+    }
+
+
+def run(
+    images: int = 200,
+    videos: int = 4,
+    workers: tuple[int, ...] = (1, 4),
+    verify: tuple[str, ...] = ("size", "hash"),
+    destination: pathlib.Path | None = None,
+) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        destination = destination or directory / "destination"
+
+        runs = [
+            _transfer(directory / "source", destination, images, videos, count, mode)
+            for count in workers
+            for mode in verify
+        ]
+
+    return {
+        "images": images,
+        "videos": videos,
+        "total_mb": round((images * IMAGE_SIZE + videos * VIDEO_SIZE) / ONE_MB, 1),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the usb transfer engine.")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--videos", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--verify", nargs="+", choices=["size", "hash"], default=["size", "hash"])
+    parser.add_argument("--destination", type=pathlib.Path, help="directory to copy to, a temporary one by default")
+    args = parser.parse_args()
+
+    results = run(args.images, args.videos, tuple(args.workers), tuple(args.verify), args.destination)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import asyncio
 import signal
 
-from artincam.agent import ArtincamAgent
-from artincam.constants import ARTINCAM_AGENT_ID
+from artincam import startup_trace
+from artincam.constants import ARTINCAM_AGENT_ID, STARTUP_TRACE
+
+if STARTUP_TRACE:
+    # before the agent is imported, so its imports are timed
+    startup_trace.install()
+
+from artincam.agent import ArtincamAgent  # noqa: E402
 
 
 async def main():
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import argparse
+import pathlib
+import sys
+from datetime import datetime, timezone
+
+CAMERA_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CAMERA_DIRECTORY))
+
+from artincam.segments import SegmentReader  # noqa: E402
+
+
+def parse_timestamp(value: str) -> float:
+    """ISO timestamp, UTC unless it says otherwise."""
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or extract the images stored in an image segment.")
+    parser.add_argument("segment", type=pathlib.Path, help="segment file (.seg), its .idx must be next to it")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--list", action="store_true", help="list the images in the segment")
+    selection.add_argument("--unique-id", help="extract the image with this unique id")
+    selection.add_argument("--at", help="extract the image captured closest to this ISO timestamp (UTC by default)")
+    selection.add_argument("--all", action="store_true", help="extract every image")
+    parser.add_argument("--output", type=pathlib.Path, default=pathlib.Path("."), help="directory to extract to")
+    args = parser.parse_args()
+
+    reader = SegmentReader(args.segment)
+
+    if args.list:
+        for record in reader.records:
+            print(f"{reader.file_name(record)}\t{record.length} bytes")
+        print(f"{len(reader.records)} image(s), {'closed' if reader.closed() else 'still being written'}")
+        return
+
+    if args.all:
+        records = reader.records
+    elif args.unique_id:
+        records = [reader.find(args.unique_id)]
+    else:
+        records = [reader.find_at(parse_timestamp(args.at))]
+
+    if not records or records[0] is None:
+        print("No matching image in the segment.")
+        sys.exit(1)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+
+    for record in records:
+        destination = args.output / reader.file_name(record)
+        destination.write_bytes(reader.read(record))
+        print(destination)
+
+
+if __name__ == "__main__":
+    main()
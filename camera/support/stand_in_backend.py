@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Minimal stand-in for the Go backend, to run the agent's backend traffic (asset files, action logs, uploads, agents
+and their websocket) without it. Everything is kept in memory except uploads, which are written like the backend does:
+<upload-dir>/<agent_id>/<unique_id>.part while in progress, renamed to the file name once complete.
+
+Agents are created and updated through /api/v1/agents like on the backend, a connected agent gets its configuration
+when it connects to /ws/v1/agent/<id> and whenever it is updated.
+
+    ./support/stand_in_backend.py --port 8080 --upload-dir /tmp/uploads --fail-rate 0.1
+
+then run the agent with BACKEND_HOST=localhost:8080.
+"""
+
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+UPLOAD_PATH = re.compile(r"^/api/v1/asset-files/uploads/([A-Za-z0-9-]+)/([A-Za-z0-9-]+)$")
+AGENT_PATH = re.compile(r"^/api/v1/agents/([A-Za-z0-9_-]+)(/ws-message)?$")
+WS_PATH = re.compile(r"^/ws/v1/agent/([A-Za-z0-9_-]+)$")
+# RFC 6455 handshake key suffix
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class StandInBackend(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], upload_dir: pathlib.Path, fail_rate: float = 0.0, latency: float = 0.0
+    ):
+        super().__init__(address, StandInHandler)
+        self.upload_dir = upload_dir
+        # fraction of upload chunks answered with a 503 after storing only part of the body, to exercise resuming
+        self.fail_rate = fail_rate
+        # seconds added to every request, the round trip and database time of the real backend
+        self.latency = latency
+
+        self.ids = itertools.count(1)
+        self.asset_files: dict[str, dict] = {}
+        self.action_logs: list[dict] = []
+        self.agents: dict[str, dict] = {}
+        # agent id -> its open websocket
+        self.connections: dict[str, "WebSocket"] = {}
+        self.requests: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def push_config(self, agent_id: str) -> bool:
+        """Sends the agent its configuration, like the backend after an update. False if it isn't connected."""
+        with self.lock:
+            connection = self.connections.get(agent_id)
+            config = self.agents[agent_id]["config"]
+
+        if connection is None:
+            return False
+
+        message = {"type": "config-update", "mode": config["camera"]["mode"], "config": config}
+        return connection.send(json.dumps(message))
+
+
+class WebSocket:
+    """Server side of a websocket, just enough for the agent: text messages out, close and ping handled."""
+
+    def __init__(self, handler: BaseHTTPRequestHandler):
+        self._rfile = handler.rfile
+        self._wfile = handler.wfile
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def send(self, text: str, opcode: int = 0x1) -> bool:
+        payload = text.encode() if isinstance(text, str) else text
+        length = len(payload)
+
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 2**16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+
+        with self._lock:
+            if self.closed:
+                return False
+            try:
+                self._wfile.write(header + payload)
+            except OSError:
+                self.closed = True
+                return False
+
+        return True
+
+    def serve(self):
+        """Reads frames until the client closes, nothing the agent sends is used."""
+        while not self.closed:
+            try:
+                opcode, payload = self._read_frame()
+            except (OSError, struct.error, ValueError):
+                break
+
+            if opcode == 0x8:
+                self.send(payload[:2], opcode=0x8)
+                break
+            if opcode == 0x9:
+                self.send(payload, opcode=0xA)
+
+        self.closed = True
+
+    def _read_frame(self) -> tuple[int, bytes]:
+        first, second = struct.unpack("!BB", self._read(2))
+        length = second & 0x7F
+
+        if length == 126:
+            (length,) = struct.unpack("!H", self._read(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", self._read(8))
+
+        # client frames are always masked
+        mask = self._read(4) if second & 0x80 else bytes(4)
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(self._read(length)))
+        return first & 0x0F, payload
+
+    def _read(self, size: int) -> bytes:
+        data = self._rfile.read(size)
+        if len(data) != size:
+            raise ValueError("connection closed")
+        return data
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInBackend
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._count()
+        match = WS_PATH.match(self.path)
+
+        if match is None or self.headers.get("Upgrade", "").lower() != "websocket":
+            self._send_json(404, {"error": "Not found."})
+            return
+
+        self._serve_websocket(match.group(1))
+
+    def do_POST(self):
+        self._count()
+        body = self._json_body()
+        url = urlsplit(self.path)
+        agent_match = AGENT_PATH.match(url.path)
+
+        if self.path == "/api/v1/agents":
+            with self.server.lock:
+                self.server.agents[body["id"]] = body
+            self._send_json(201, {"data": body})
+        elif agent_match is not None and agent_match.group(2):
+            self._agent_ws_message(agent_match.group(1), parse_qs(url.query).get("type", [""])[0])
+        elif self.path == "/api/v1/asset-files":
+            self._send_json(201, {"data": self._create_asset_file(body)})
+        elif self.path == "/api/v1/asset-files/bulk":
+            self._send_json(201, {"data": [self._create_asset_file(asset_file) for asset_file in body]})
+        elif self.path == "/api/v1/action-logs":
+            with self.server.lock:
+                self.server.action_logs.append(body)
+            self._send_json(201, {"data": body})
+        else:
+            self._send_json(404, {"error": "Not found."})
+
+    def do_HEAD(self):
+        self._count()
+        match = UPLOAD_PATH.match(self.path)
+
+        if match is None:
+            self._send_status(404)
+            return
+
+        part_path, complete_path = self._upload_paths(*match.groups())
+        offset = 0
+
+        if part_path.exists():
+            offset = part_path.stat().st_size
+        elif complete_path is not None and complete_path.exists():
+            offset = complete_path.stat().st_size
+
+        self._send_status(200, {"Upload-Offset": offset})
+
+    def do_PATCH(self):
+        self._count()
+        match = UPLOAD_PATH.match(self.path)
+        agent_match = AGENT_PATH.match(self.path)
+
+        if agent_match is not None and not agent_match.group(2):
+            self._patch_agent(agent_match.group(1), self._json_body())
+            return
+
+        if match is None:
+            # asset file update, only the size is ever patched
+            self._json_body()
+            self._send_json(200, {"data": {}})
+            return
+
+        length = int(self.headers["Content-Length"])
+        data = self.rfile.read(length)
+        part_path, complete_path = self._upload_paths(*match.groups())
+        offset = int(self.headers["Upload-Offset"])
+        total = int(self.headers["Upload-Length"])
+
+        if complete_path is None:
+            self._send_status(400)
+            return
+
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(part_path, "ab") as file:
+            current = file.tell()
+
+            if current != offset:
+                self._send_status(409, {"Upload-Offset": current})
+                return
+
+            if random.random() < self.server.fail_rate:
+                # pretend the connection dropped half way through the chunk
+                file.write(data[: len(data) // 2])
+                self._send_status(503, {"Upload-Offset": current + len(data) // 2})
+                return
+
+            file.write(data[: total - offset])
+            current = file.tell()
+
+        if current == total:
+            os.replace(part_path, complete_path)
+
+        self._send_status(204, {"Upload-Offset": current})
+
+    def _patch_agent(self, agent_id: str, changes: dict):
+        with self.server.lock:
+            agent = self.server.agents.get(agent_id)
+            if agent is not None:
+                agent.update({key: value for key, value in changes.items() if value is not None and key != "id"})
+
+        if agent is None:
+            self._send_json(404, {"error": "Agent not found."})
+            return
+
+        if changes.get("config") is not None:
+            self.server.push_config(agent_id)
+
+        self._send_json(200, {"data": agent})
+
+    def _agent_ws_message(self, agent_id: str, message_type: str):
+        with self.server.lock:
+            connection = self.server.connections.get(agent_id)
+
+        if connection is None:
+            self._send_json(404, {"error": "Agent is not connected."})
+        elif message_type == "config-update":
+            self.server.push_config(agent_id)
+            self._send_status(204)
+        elif message_type == "capture-trigger":
+            connection.send(json.dumps({"type": "capture-trigger"}))
+            self._send_status(204)
+        else:
+            self._send_json(400, {"error": "Invalid message type."})
+
+    def _serve_websocket(self, agent_id: str):
+        with self.server.lock:
+            known = agent_id in self.server.agents
+
+        if not known:
+            self._send_json(404, {"error": "Agent not found"})
+            return
+
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        # websocket clients refuse an HTTP/1.0 upgrade, the default of the other responses
+        self.protocol_version = "HTTP/1.1"
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        connection = WebSocket(self)
+        with self.server.lock:
+            self.server.connections[agent_id] = connection
+
+        # like the backend, the configuration is sent as soon as the agent connects
+        self.server.push_config(agent_id)
+        connection.serve()
+
+        with self.server.lock:
+            # a reconnect may have replaced this connection already
+            if self.server.connections.get(agent_id) is connection:
+                del self.server.connections[agent_id]
+
+        self.close_connection = True
+
+    def _create_asset_file(self, asset_file: dict) -> dict:
+        # unique_id is the idempotency key, like the backend's upsert
+        with self.server.lock:
+            existing = self.server.asset_files.get(asset_file["unique_id"])
+            asset_file["id"] = existing["id"] if existing else next(self.server.ids)
+            self.server.asset_files[asset_file["unique_id"]] = asset_file
+            return asset_file
+
+    def _upload_paths(self, agent_id: str, unique_id: str) -> tuple[pathlib.Path, pathlib.Path | None]:
+        directory = self.server.upload_dir / agent_id
+        name = os.path.basename(self.headers.get("Upload-Name", ""))
+        return directory / f"{unique_id}.part", (directory / name) if name not in ("", ".", "..") else None
+
+    def _count(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        path = UPLOAD_PATH.sub("/api/v1/asset-files/uploads/{id}", urlsplit(self.path).path)
+        path = WS_PATH.sub("/ws/v1/agent/{id}", AGENT_PATH.sub(r"/api/v1/agents/{id}\2", path))
+        endpoint = f"{self.command} {path}"
+
+        with self.server.lock:
+            self.server.requests[endpoint] = self.server.requests.get(endpoint, 0) + 1
+
+    def _json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_status(self, status: int, headers: dict | None = None):
+        self.send_response(status)
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def start(
+    port: int = 0, upload_dir: pathlib.Path = pathlib.Path("uploads"), fail_rate: float = 0.0, latency: float = 0.0
+) -> StandInBackend:
+    """Starts the stand-in in a background thread, port 0 picks a free one (server.server_port)."""
+    server = StandInBackend(("127.0.0.1", port), upload_dir, fail_rate, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for the artincam backend.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--upload-dir", type=pathlib.Path, default=pathlib.Path("uploads"))
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of upload chunks that fail half way")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+
+    server = StandInBackend(("0.0.0.0", args.port), args.upload_dir, args.fail_rate, args.latency)
+    print(f"Stand-in backend listening on :{args.port}, uploads in {args.upload_dir}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.requests, indent=2))
@@ -1,21 +1,36 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
 import json
 import os
 import pathlib
 import select
 import shutil
-import subprocess
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 import psutil
 from colorama import Fore, Style, init
 
+CAMERA_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent
+# the asset catalog is shared with the agent
+sys.path.insert(0, str(CAMERA_DIRECTORY))
+
+from artincam.catalog import AssetCatalog  # noqa: E402
+from artincam.schemas import AssetStateEnum  # noqa: E402
+from artincam.segments import INDEX_SUFFIX, SEGMENT_SUFFIX, index_path, segment_closed  # noqa: E402
+
 # Initialize colorama for cross-platform support
 init(autoreset=True)
 
-CAMERA_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent
+CATALOG_PATH = CAMERA_DIRECTORY / "artincam" / "config" / "catalog.db"
+ONE_MB = 2**20
+ONE_GB = 2**30
+COPY_CHUNK_SIZE = 8 * ONE_MB
+MANIFEST_NAME = ".transfer_manifest"
 
 
 class Color:
@@ -48,6 +63,217 @@ class Color:
         return f"{Color.GREEN}{text}{Color.RESET}"
 
 
+class TransferManifest:
+    """Files already copied, synced and verified on the device, one JSON line per file.
+
+    An interrupted transfer restarts from it: a file listed here whose source is still around (the program stopped
+    before deleting it) is not copied again, only its source is deleted.
+    """
+
+    def __init__(self, directory: pathlib.Path):
+        self.path = directory / MANIFEST_NAME
+        self.done: dict[str, int] = {}
+
+        if self.path.exists():
+            with open(self.path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # last line cut short by a crash, that file simply gets copied again
+                        continue
+                    self.done[entry["name"]] = entry["size"]
+
+        self._file = open(self.path, "a")
+
+    def add(self, entries: list[tuple[str, int]]):
+        for name, size in entries:
+            self._file.write(json.dumps({"name": name, "size": size}) + "\n")
+            self.done[name] = size
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class TransferEngine:
+    """Copies files to a directory in-process with a pool of threads.
+
+    Files are copied in batches of `fsync_batch`: every file of a batch is copied (copy_file_range, sendfile or a
+    plain read/write depending on what the filesystems support) under a temporary name, the whole batch is flushed
+    to the device with a single sync, each copy is verified (size, and content hash unless `verify` is "size"),
+    recorded in the manifest and only then its source is deleted. `on_transferred(source, destination)` is called for
+    each file moved.
+    """
+
+    def __init__(
+        self,
+        destination: pathlib.Path,
+        workers: int = 4,
+        fsync_batch: int = 64,
+        verify: str = "hash",
+        stop_event: threading.Event | None = None,
+        on_transferred: Callable[[pathlib.Path, pathlib.Path], None] | None = None,
+    ):
+        self.destination = destination
+        self.workers = workers
+        self.fsync_batch = max(fsync_batch, 1)
+        self.verify = verify
+        self.stop_event = stop_event or threading.Event()
+        self.on_transferred = on_transferred
+
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def transfer(self, files: list[tuple[pathlib.Path, int]], free_space: int) -> str | None:
+        """Transfers (path, size) files in order. Returns why the transfer stopped early, None if it completed."""
+        manifest = TransferManifest(self.destination)
+        start_time = time.monotonic()
+        interrupted = None
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for batch_start in range(0, len(files), self.fsync_batch):
+                    if self.stop_event.is_set():
+                        interrupted = "⚠️  Transfer was interrupted."
+                        break
+
+                    batch = []
+                    for source, size in files[batch_start : batch_start + self.fsync_batch]:
+                        if manifest.done.get(source.name) == size and self._on_device(source.name, size):
+                            # copied and verified by a previous run that stopped before deleting the source
+                            source.unlink(missing_ok=True)
+                            self._transferred(source)
+                            continue
+
+                        # free space is only read once, then estimated from what was copied
+                        if free_space - size < ONE_GB:
+                            interrupted = "❌ Not enough space on the selected USB device for transfer."
+                            break
+
+                        free_space -= size
+                        batch.append((source, size))
+
+                    self._transfer_batch(pool, batch, manifest)
+                    self.elapsed = time.monotonic() - start_time
+                    print(Color.green(f"✅ Transferred {self.files}/{len(files)} file(s) ({self.rates()})"))
+
+                    if interrupted:
+                        break
+        finally:
+            manifest.close()
+            self.elapsed = time.monotonic() - start_time
+
+        return interrupted
+
+    def rates(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return f"{self.bytes / ONE_MB / elapsed:.2f} MB/s, {self.files / elapsed:.2f} files/s"
+
+    def _transfer_batch(self, pool: ThreadPoolExecutor, batch: list[tuple[pathlib.Path, int]], manifest):
+        copied = [item for item, ok in zip(batch, pool.map(self._copy_file, batch)) if ok]
+
+        # one sync for the whole batch instead of an fsync per file
+        os.sync()
+
+        verified = [item for item, ok in zip(copied, pool.map(self._verify_file, copied)) if ok]
+        manifest.add([(source.name, size) for source, size in verified])
+
+        for source, size in verified:
+            source.unlink(missing_ok=True)
+            self._transferred(source)
+            self.files += 1
+            self.bytes += size
+
+        self.failed += len(batch) - len(verified)
+
+    def _on_device(self, name: str, size: int) -> bool:
+        try:
+            return (self.destination / name).stat().st_size == size
+        except OSError:
+            return False
+
+    def _transferred(self, source: pathlib.Path):
+        if self.on_transferred is not None:
+            self.on_transferred(source, self.destination / source.name)
+
+    def _copy_file(self, item: tuple[pathlib.Path, int]) -> bool:
+        source, size = item
+        destination = self.destination / source.name
+        partial = destination.with_name(destination.name + ".part")
+
+        try:
+            with open(source, "rb") as src, open(partial, "wb") as dst:
+                self._copy_data(src, dst, size)
+
+            os.replace(partial, destination)
+        except OSError as e:
+            print(Color.red(f"❌ Failed to copy {source.name}: {e}"))
+            partial.unlink(missing_ok=True)
+            return False
+
+        return True
+
+    def _copy_data(self, src, dst, size: int):
+        """Kernel-side copy when possible, the data never goes through python. Raises OSError on a short copy."""
+        copied = 0
+        copies = (
+            lambda count: os.copy_file_range(src.fileno(), dst.fileno(), count, None, copied),
+            # reads the source at `copied`, writes at the destination's position like copy_file_range
+            lambda count: os.sendfile(dst.fileno(), src.fileno(), copied, count),
+        )
+
+        for copy in copies:
+            try:
+                while copied < size:
+                    sent = copy(min(COPY_CHUNK_SIZE, size - copied))
+                    if sent == 0:
+                        break
+                    copied += sent
+                break
+            except (AttributeError, OSError):
+                # not supported between these filesystems (e.g. EXDEV from ext4 to vfat/exfat), try the next one
+                if copied:
+                    raise
+        else:
+            while copied < size and (chunk := src.read(min(COPY_CHUNK_SIZE, size - copied))):
+                dst.write(chunk)
+                copied += len(chunk)
+
+        if copied != size:
+            # the source got shorter than listed, or the device stopped taking data
+            raise OSError(f"copied {copied} of {size} bytes")
+
+    def _verify_file(self, item: tuple[pathlib.Path, int]) -> bool:
+        source, size = item
+        destination = self.destination / source.name
+
+        try:
+            valid = destination.stat().st_size == size
+            if valid and self.verify == "hash":
+                valid = self._hash(source) == self._hash(destination)
+        except OSError:
+            valid = False
+
+        if not valid:
+            print(Color.red(f"❌ Verification failed for {source.name}, source kept"))
+
+        return valid
+
+    def _hash(self, path: pathlib.Path) -> bytes:
+        digest = hashlib.blake2b()
+
+        with open(path, "rb") as file:
+            while chunk := file.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+
+        return digest.digest()
+
+
 class USBDeviceManager:
     _stop_event: threading.Event
 
@@ -113,12 +339,17 @@ class USBDeviceManager:
             if p.device.startswith("/dev/sd") and p.mountpoint and os.path.exists(p.mountpoint):
                 self.usb_devices.append({"device": p.device, "mount_point": p.mountpoint})
 
-    def perform_data_transfer(self, selected_device):
+    def perform_data_transfer(
+        self,
+        selected_device,
+        workers: int = 4,
+        fsync_batch: int = 64,
+        verify: str = "hash",
+        scan: bool = False,
+    ):
         """
         Method for performing the data transfer to the selected device.
         """
-        one_GB = 2 * 30
-
         if selected_device:
             print(f"{Color.cyan('🚀 Transferring data to:')} {selected_device['mount_point']}")
             config = self._get_json_config()
@@ -129,37 +360,90 @@ class USBDeviceManager:
             final_transfer_path = pathlib.Path(selected_device["mount_point"] + "/data/" + str(pi_id) + "/")
             final_transfer_path.mkdir(parents=True, exist_ok=True)
 
-            transfer_count = 0
-            start_time = time.time()
-            interrupted = ""
+            catalog = None
+            # unique ids of the assets stored in each file, a segment holds many images
+            unique_ids: dict[str, list[str]] = {}
+            # unique id of the asset each thumbnail/proxy clip belongs to
+            previews: dict[str, str] = {}
 
-            for file in sorted(filter(lambda f: f.is_file(), assets_dir.iterdir()))[:-2]:
-                available_space = shutil.disk_usage(selected_device["mount_point"]).free
-                if self._stop_event.is_set():
-                    interrupted = "⚠️  Transfer was interrupted."
-                    break
-                elif available_space < file.stat().st_size or available_space < one_GB:
-                    interrupted = "❌ Not enough space on the selected USB device for transfer."
-                self._transfer_file(file, final_transfer_path)
-                transfer_count += 1
-                print(Color.green(f"✅ Transferred: {file.name}\n"))
+            if CATALOG_PATH.exists() and not scan:
+                # the catalog only lists files fully written, nothing to guess
+                catalog = AssetCatalog(CATALOG_PATH)
+                local_directory = os.path.normpath(assets_dir)
+                files = []
+
+                for asset in catalog.untransferred():
+                    if os.path.dirname(os.path.normpath(asset["path"])) != local_directory:
+                        continue
 
-            elapsed_time = time.time() - start_time
-            transfer_message = interrupted if len(interrupted) > 0 else "📦 Transfer complete."
-            summary = f"{transfer_message} {transfer_count} file(s) transferred in {elapsed_time:.2f} seconds (avg: {(elapsed_time / transfer_count):.2f} s per file)."
+                    if asset["segment_offset"] is None:
+                        files.append((pathlib.Path(asset["path"]), asset["file_size"]))
+                    unique_ids.setdefault(asset["path"], []).append(asset["unique_id"])
+
+                    if asset["preview_path"] and os.path.exists(asset["preview_path"]):
+                        files.append((pathlib.Path(asset["preview_path"]), os.path.getsize(asset["preview_path"])))
+                        previews[asset["preview_path"]] = asset["unique_id"]
+
+                # segments move whole (index then data) once the agent stopped appending to them
+                for path in unique_ids:
+                    if path.endswith(SEGMENT_SUFFIX) and segment_closed(path):
+                        files += self._segment_files(pathlib.Path(path))
+
+                files.sort(key=lambda item: item[0].name)
+            else:
+                # files from before the catalog existed. Names start with the capture timestamp, the last two are
+                # skipped as they may still be written, so are segments still appended to
+                with os.scandir(assets_dir) as entries:
+                    files = sorted((entry.name, entry.stat().st_size) for entry in entries if entry.is_file())
+                files = [
+                    (assets_dir / name, size)
+                    for name, size in files[:-2]
+                    if not name.endswith((SEGMENT_SUFFIX, INDEX_SUFFIX)) or segment_closed(assets_dir / name)
+                ]
+
+            def on_transferred(source: pathlib.Path, destination: pathlib.Path):
+                if catalog is not None and str(source) in unique_ids:
+                    catalog.set_state(unique_ids[str(source)], AssetStateEnum.TRANSFERRED, path=str(destination))
+                elif catalog is not None and str(source) in previews:
+                    catalog.set_preview_path(previews[str(source)], str(destination))
+
+            engine = TransferEngine(
+                final_transfer_path,
+                workers=workers,
+                fsync_batch=fsync_batch,
+                verify=verify,
+                stop_event=self._stop_event,
+                on_transferred=on_transferred,
+            )
+            interrupted = engine.transfer(files, shutil.disk_usage(selected_device["mount_point"]).free)
+
+            if catalog is not None:
+                catalog.close()
+
+            transfer_message = interrupted or "📦 Transfer complete."
+            summary = (
+                f"{transfer_message} {engine.files} file(s) ({engine.bytes / ONE_MB:.2f} MB) transferred in "
+                f"{engine.elapsed:.2f} seconds ({engine.rates()})."
+            )
+            if engine.failed:
+                summary += f" {engine.failed} file(s) failed and were kept."
 
             print(Color.cyan(summary))
             self._stop_event.set()
 
-    def _transfer_file(self, source, destination_directory):  # 4MB buffer
+    def _segment_files(self, segment: pathlib.Path) -> list[tuple[pathlib.Path, int]]:
+        """The index (if still there) and the data of a segment, the index first so the data is never left without
+        it on the usb stick.
         """
-        Transfer source file to destination and delete file once completed.
-        """
-        # Create the destination file path by combining the directory and filename
-        destination = os.path.join(destination_directory, os.path.basename(source))
-        subprocess.run(
-            ["rsync", "--progress", "--remove-source-files", source, destination], check=True
-        )  # Blocks until the rsync process completes
+        files = []
+
+        for path in (index_path(segment), segment):
+            try:
+                files.append((path, path.stat().st_size))
+            except FileNotFoundError:
+                continue
+
+        return files
 
     def _get_json_config(self):
         return json.load(open(CAMERA_DIRECTORY / "artincam" / "config" / "config.json", "r"))
@@ -178,7 +462,7 @@ class USBDeviceManager:
                 if user_input == "stop":
                     print(
                         Color.red(
-                            "\nStop command found. Gracefully exiting: once the current file is finished transfering the program will stop."
+                            "\nStop command found. Gracefully exiting: once the current batch of files is finished transfering the program will stop."
                         )
                     )
                     self._stop_event.set()
@@ -186,12 +470,31 @@ class USBDeviceManager:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move captured assets to a USB storage device.")
+    parser.add_argument("--workers", type=int, default=4, help="number of files copied at the same time")
+    parser.add_argument("--fsync-batch", type=int, default=64, help="number of files flushed to the device at once")
+    parser.add_argument(
+        "--verify",
+        choices=["hash", "size"],
+        default="hash",
+        help="check applied to each copy before its source is deleted",
+    )
+    parser.add_argument(
+        "--scan",
+        action="store_true",
+        help="list the output directory instead of reading the asset catalog (files captured before the catalog)",
+    )
+    args = parser.parse_args()
+
     usb_manager = USBDeviceManager()
 
     selected_device = usb_manager.choose_device()
     if selected_device:
         # Perform the data transfer with the selected device
-        transfer_thread = threading.Thread(target=usb_manager.perform_data_transfer, args=(selected_device,))
+        transfer_thread = threading.Thread(
+            target=usb_manager.perform_data_transfer,
+            args=(selected_device, args.workers, args.fsync_batch, args.verify, args.scan),
+        )
         monitor_thread = threading.Thread(target=usb_manager._key_listener)
     else:
         print(Color.red("❌ No valid device selected."))
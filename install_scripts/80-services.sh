@@ -19,6 +19,8 @@ if ! systemd_unit_exists "$BE_SERVICE"; then
 GOOSE_DRIVER=sqlite3
 GOOSE_DBSTRING=src/db/zacpi-be.db
 GOOSE_MIGRATION_DIR=src/db/migrations
+# Optional: where the files uploaded by the agents are stored
+# UPLOAD_DIR=uploads
 EOF
     sudo_if_needed chmod 600 "$BE_ENV"
     log "Created: $BE_ENV"
@@ -67,6 +69,32 @@ if ! systemd_unit_exists "$AG_SERVICE"; then
 # Artincam Pi Agent Environment Variables
 BACKEND_HOST="localhost:8080"
 ARTINCAM_AGENT_ID="dbc44ea8-1854-4a11-8359-01ca2e0d8e76"
+# Optional: asset files are registered in batches of up to ASSET_BATCH_SIZE records,
+# a record waits at most ASSET_BATCH_LATENCY seconds before its batch is sent
+# ASSET_BATCH_SIZE=20
+# ASSET_BATCH_LATENCY=5
+# Optional: number of threads running backend calls (health logs, registrations, ...)
+# BACKEND_WORKERS=3
+# Optional: upload the captured files to the backend in the background (1 to enable),
+# UPLOAD_WORKERS files at a time, sharing UPLOAD_BANDWIDTH_KBPS KB/s, in UPLOAD_CHUNK_SIZE_KB KB chunks
+# UPLOAD_ENABLED=1
+# UPLOAD_WORKERS=2
+# UPLOAD_BANDWIDTH_KBPS=1024
+# UPLOAD_CHUNK_SIZE_KB=256
+# Optional: keep the local output directory under RETENTION_HIGH_WATERMARK percent used by evicting
+# assets down to RETENTION_LOW_WATERMARK, in RETENTION_POLICY order (age, size, type:image, type:video).
+# Only uploaded assets are evicted unless RETENTION_EVICT_UNSAVED=1
+# RETENTION_HIGH_WATERMARK=90
+# RETENTION_LOW_WATERMARK=80
+# RETENTION_POLICY=age
+# RETENTION_EVICT_UNSAVED=0
+# Optional: log how long every import and the first frame/capture took (1 to enable),
+# also written to artincam/config/startup_trace.json
+# STARTUP_TRACE=1
+# Optional: Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics (0 disables),
+# METRICS_HOST=0.0.0.0 to scrape from another machine
+# METRICS_HOST=127.0.0.1
+# METRICS_PORT=9464
 EOF
     sudo_if_needed chmod 600 "$AG_ENV"
     log "Created: $AG_ENV"